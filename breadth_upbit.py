@@ -0,0 +1,188 @@
+# breadth_upbit.py - 원화시장 등락 분포(breadth) 스트리밍 집계
+# created : 2026-10-19
+# 감시 주기마다 전종목 등락 구간별 종목 수를 받아 구간(기본 1시간)별로
+# 구간별 시가/고가/저가/종가(OHLC), 최악 시점(상승-하락 순수치 최저), -15% 이하 최대 종목 수를 누적한다.
+# 구간 수는 보관 기간(기본 24시간)으로 고정 → 메모리 일정.
+
+import time
+from collections import deque
+
+BANDS = ("rise_15", "rise_10", "rise_5", "neutral", "fall_5", "fall_10", "fall_15")
+BREADTH_INTERVAL = 3600  # 집계 구간(초)
+BREADTH_HORIZON = 86400  # 보관 기간(초)
+
+
+def summarize_breadth(snapshot):
+    """시세 스냅샷 { market: {price, prev_close, ...} } → 등락 구간별 종목 수 (analyze()와 같은 구간)"""
+    out = dict.fromkeys(("total",) + BANDS, 0)
+    for tick in snapshot.values():
+        prev = tick.get("prev_close")
+        if not prev:
+            continue
+        rate = (tick["price"] - prev) / prev * 100
+        out["total"] += 1
+        if rate >= 15:
+            out["rise_15"] += 1
+        if rate >= 10:
+            out["rise_10"] += 1
+        if rate >= 5:
+            out["rise_5"] += 1
+        if -5 < rate < 5:
+            out["neutral"] += 1
+        if rate <= -5:
+            out["fall_5"] += 1
+        if rate <= -10:
+            out["fall_10"] += 1
+        if rate <= -15:
+            out["fall_15"] += 1
+    return out
+
+
+def _new_bucket(start, breadth, ts):
+    net = breadth["rise_5"] - breadth["fall_5"]
+    return {
+        "start": start,
+        "end": ts,
+        "samples": 1,
+        "ohlc": {b: [breadth[b]] * 4 for b in BANDS},  # 밴드 → [시, 고, 저, 종]
+        "total": breadth.get("total", 0),
+        "worst_net": net,  # 상승(+5%↑) - 하락(-5%↓) 최저값
+        "worst_at": ts,
+        "worst": dict(breadth),
+        "fall15_peak": breadth["fall_15"],
+        "fall15_at": ts,
+    }
+
+
+def _fold(bucket, breadth, ts):
+    """표본 1개 반영 (O(밴드 수))"""
+    bucket["end"] = ts
+    bucket["samples"] += 1
+    bucket["total"] = breadth.get("total", bucket["total"])
+    for b in BANDS:
+        v = breadth[b]
+        o = bucket["ohlc"][b]
+        if v > o[1]:
+            o[1] = v
+        if v < o[2]:
+            o[2] = v
+        o[3] = v
+    net = breadth["rise_5"] - breadth["fall_5"]
+    if net < bucket["worst_net"]:
+        bucket["worst_net"], bucket["worst_at"], bucket["worst"] = net, ts, dict(breadth)
+    if breadth["fall_15"] > bucket["fall15_peak"]:
+        bucket["fall15_peak"], bucket["fall15_at"] = breadth["fall_15"], ts
+
+
+def _merge(a, b):
+    """구간 두 개 합치기 (a가 앞 구간)"""
+    out = dict(a)
+    out["end"] = b["end"]
+    out["samples"] = a["samples"] + b["samples"]
+    out["total"] = b["total"]
+    out["ohlc"] = {
+        band: [a["ohlc"][band][0], max(a["ohlc"][band][1], b["ohlc"][band][1]), min(a["ohlc"][band][2], b["ohlc"][band][2]), b["ohlc"][band][3]]
+        for band in BANDS
+    }
+    if b["worst_net"] < a["worst_net"]:
+        out["worst_net"], out["worst_at"], out["worst"] = b["worst_net"], b["worst_at"], b["worst"]
+    if b["fall15_peak"] > a["fall15_peak"]:
+        out["fall15_peak"], out["fall15_at"] = b["fall15_peak"], b["fall15_at"]
+    return out
+
+
+class BreadthAggregator:
+    """등락 분포 구간별 집계. add()로 표본 반영, window()로 기간 합산"""
+
+    def __init__(self, interval=BREADTH_INTERVAL, horizon=BREADTH_HORIZON):
+        self.interval = interval
+        self.buckets = deque(maxlen=max(1, horizon // interval) + 1)
+        self.last = None  # 마지막 표본
+        self.last_at = None
+
+    def add(self, breadth, ts=None):
+        """표본 1개 반영. 반환: 해당 구간 dict"""
+        ts = time.time() if ts is None else ts
+        start = ts - ts % self.interval
+        if self.buckets and self.buckets[-1]["start"] == start:
+            _fold(self.buckets[-1], breadth, ts)
+        else:
+            self.buckets.append(_new_bucket(start, breadth, ts))
+        self.last, self.last_at = breadth, ts
+        return self.buckets[-1]
+
+    def current(self):
+        return self.buckets[-1] if self.buckets else None
+
+    def intervals(self, since=None):
+        """since(초) 이후 끝난/진행 중 구간 목록"""
+        return [b for b in self.buckets if since is None or b["end"] >= since]
+
+    def window(self, since=None):
+        """since 이후 구간 합산 (표본 없으면 None)"""
+        out = None
+        for b in self.intervals(since):
+            out = b if out is None else _merge(out, b)
+        return out
+
+
+def _hm(ts):
+    return time.strftime("%H:%M", time.localtime(ts))
+
+
+def format_breadth_headline(agg, fallback=None):
+    """리포트 첫 줄들: 기간 마지막 값 + 괄호 안 기간 중 최대 (상승/하락 밴드).
+    집계 표본이 없으면 fallback(analyze() 결과 등 밴드별 종목 수 dict)으로 같은 형식"""
+    if agg:
+        o = agg["ohlc"]
+
+        def band(b):
+            return f"{o[b][3]}개(최대 {o[b][1]})"
+
+        return (
+            f"전체 종목: {agg['total']}개 ({_hm(agg['start'])}~{_hm(agg['end'])} 마지막 값, 괄호는 기간 최대)\n"
+            f"상승: +5%↑ {band('rise_5')} (+10%↑ {band('rise_10')} | +15%↑ {band('rise_15')})\n"
+            f"보합(-5%~+5%): {o['neutral'][3]}개\n"
+            f"하락: -5%↓ {band('fall_5')} (-10%↓ {band('fall_10')} | -15%↓ {band('fall_15')})"
+        )
+    if not fallback:
+        return "전체 종목: 집계 없음"
+    f = fallback
+    return (
+        f"전체 종목: {f['total']}개\n"
+        f"상승: +5%↑ {f['rise_5']}개 (+10%↑ {f['rise_10']}개 | +15%↑ {f['rise_15']}개)\n"
+        f"보합(-5%~+5%): {f['neutral']}개\n"
+        f"하락: -5%↓ {f['fall_5']}개 (-10%↓ {f['fall_10']}개 | -15%↓ {f['fall_15']}개)"
+    )
+
+
+def format_breadth_summary(agg):
+    """텔레그램 리포트용 흐름 요약 (여러 줄 문자열)"""
+    if not agg:
+        return "흐름: 표본 없음"
+    o = agg["ohlc"]
+    worst = agg["worst"]
+    return (
+        f"흐름 ({_hm(agg['start'])}~{_hm(agg['end'])}, 표본 {agg['samples']}회)\n"
+        f"+5%↑ {o['rise_5'][2]}~{o['rise_5'][1]}개 | -5%↓ {o['fall_5'][2]}~{o['fall_5'][1]}개\n"
+        f"-15%↓ 최대 {agg['fall15_peak']}개 ({_hm(agg['fall15_at'])})\n"
+        f"최악 시점 {_hm(agg['worst_at'])}: +5%↑ {worst['rise_5']}개 / -5%↓ {worst['fall_5']}개"
+    )
+
+
+def format_breadth_markdown(buckets):
+    """Markdown 리포트용 구간별 표 (행 목록)"""
+    lines = ["\n## 🕒 구간별 등락 분포 (시/고/저/종)"]
+    if not buckets:
+        lines.append("- 없음")
+        return lines
+    lines.append("| 구간 | 표본 | +5% 이상 | -5% 이하 | -15% 이하 | -15% 최대 시각 | 최악 시각 |")
+    lines.append("|------|------|----------|----------|-----------|----------------|-----------|")
+    for b in buckets:
+        r5, f5, f15 = (b["ohlc"][k] for k in ("rise_5", "fall_5", "fall_15"))
+        lines.append(
+            f"| {_hm(b['start'])}~{_hm(b['end'])} | {b['samples']} | "
+            f"{r5[0]}/{r5[1]}/{r5[2]}/{r5[3]} | {f5[0]}/{f5[1]}/{f5[2]}/{f5[3]} | "
+            f"{f15[0]}/{f15[1]}/{f15[2]}/{f15[3]} | {_hm(b['fall15_at'])} | {_hm(b['worst_at'])} |"
+        )
+    return lines
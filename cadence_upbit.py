@@ -0,0 +1,349 @@
+# cadence_upbit.py - 마켓별 조회 주기 자동 조절 (발동가까지 거리 ÷ 변동성)
+# created : 2026-10-19
+# 전종목 조회(LIST_MA_INTERVAL) 사이에 발동 가능성이 쌓이면 가격 규칙이 있는 마켓만 /v1/ticker로 추가 조회한다.
+# 마켓별 도달 확률 = 마지막 시세 이후 경과 시간 동안 거리만큼 움직였을 확률 (랜덤워크: erfc(거리 / (σ√(2·경과))))
+# 마켓별 합(= 마지막 조회 이후 새로 발동했을 것으로 기대되는 마켓 수)이 HAZARD_THRESHOLD를 넘으면 추가 조회 1회.
+# 요청 1회 비용은 마켓 수와 무관하므로 추가 조회에는 가격 규칙이 있는 마켓을 모두 넣는다 (확률 높은 순).
+# 분당 예산(토큰 버킷)은 전종목 조회까지 포함한 총 요청 수다. 근접 마켓이 있는 동안은 전종목 조회를
+# LIST_MA_INTERVAL × SWEEP_STRETCH까지 미루고, 아낀 요청(한산할 때 모은 것 포함)을 추가 조회에 쓴다.
+# 총 요청 수는 (최대로 미룬 전종목 조회 1회분을 빼면) 같은 예산의 고정 주기 조회(60/예산 초마다 전종목)를 넘지 않는다.
+# 거래량급증 규칙이 있으면 주기 거래량 비교를 위해 전종목 조회는 미루지 않는다.
+#
+# 시뮬레이션: python cadence_upbit.py --markets 100 --hours 4 --seeds 4
+
+import math
+import time
+import random
+
+SWEEP_STRETCH = 20  # 근접 마켓 추가 조회 중 전종목 조회를 미룰 수 있는 최대 배수 (slow × 이 값)
+HAZARD_THRESHOLD = 0.7  # 추가 조회 기준: 마지막 조회 이후 발동 기대 마켓 수
+DEFAULT_VOL_PER_MIN = 0.005  # 시세 이력이 없을 때 가정하는 분당 변동성 (0.5%)
+VOL_EWMA_ALPHA = 0.1
+Z_SCORE = 3.0
+
+
+def _is_volume(rule):
+    return getattr(rule, "kind", None) == "거래량급증"
+
+
+class AdaptiveScheduler:
+    """마켓별 도달 확률 기반 조회 관리.
+
+    index(rule_book) : 규칙 변경 시 마켓 → 규칙 목록 재구성 (1건 변경은 add_rule / remove_rule)
+    observe(snapshot, ts) : 조회 결과 반영 (변동성 + 가장 가까운 발동가까지 거리 갱신)
+    sweep_due(now) : 전종목 조회 차례인지 (근접 마켓이 있으면 최대 slow × stretch까지 미룸)
+    charge(now) : 전종목 조회 1회를 예산에서 차감
+    plan(now) : 지금 추가 조회할 마켓 목록 (도달 확률 합이 기준 미만이거나 예산 없으면 빈 목록)
+    reach(market, now) : 마지막 시세 이후 발동가에 닿았을 확률
+    """
+
+    def __init__(self, fast_interval, slow_interval, budget_per_min, z=Z_SCORE, stretch=SWEEP_STRETCH,
+                 threshold=HAZARD_THRESHOLD):
+        self.fast = float(fast_interval)
+        self.slow = float(slow_interval)
+        self.budget = float(budget_per_min)
+        self.z = z
+        self.stretch = max(1.0, float(stretch))
+        self.threshold = float(threshold)
+        self.capacity = max(1.0, self.budget * self.slow * self.stretch / 60)  # 한산할 때 아낀 요청을 모아 둘 수 있는 양
+        self._by_market = {}  # market → [WatchRule]
+        self._last = {}  # market → (가격, 시각)
+        self._var = {}  # market → 초당 로그수익률 분산 (EWMA)
+        self._dist = {}  # market → 마지막 시세 기준 가장 가까운 발동가까지 로그 거리 (감시 중인 가격 규칙이 있는 마켓만)
+        self._near = set()  # 다음 전종목 조회(slow) 전에 발동가에 닿을 수 있는 마켓 (Z 기준)
+        self._volume_rules = 0  # 거래량급증 규칙 수 (있으면 전종목 조회 간격 고정)
+        self._tokens = 1.0  # 첫 전종목 조회분만
+        self._token_time = None
+        self._last_sweep = None
+        self._last_plan = None
+        self.requests = 0  # 추가 조회 요청 수
+        self.sweeps = 0  # 전종목 조회 요청 수
+
+    def index(self, rule_book):
+        by_market = {}
+        for rule in rule_book.rules.values():
+            by_market.setdefault(rule.market, []).append(rule)
+        self._by_market = by_market
+        self._volume_rules = sum(1 for rule in rule_book.rules.values() if _is_volume(rule))
+        for m in [m for m in self._dist if m not in by_market]:
+            self._forget(m)
+
+    def add_rule(self, rule):
+        """규칙 1건 추가 (텔레그램 명령 등, 전체 index() 없이)"""
+        self._by_market.setdefault(rule.market, []).append(rule)
+        self._volume_rules += _is_volume(rule)
+
+    def remove_rule(self, rule):
+        rules = self._by_market.get(rule.market)
+        if rules and rule in rules:
+            rules.remove(rule)
+            self._volume_rules -= _is_volume(rule)
+            if not rules:
+                del self._by_market[rule.market]
+                self._forget(rule.market)
+
+    def _forget(self, market):
+        self._dist.pop(market, None)
+        self._near.discard(market)
+
+    def sigma(self, market):
+        """초당 변동성 (로그수익률 표준편차)"""
+        var = self._var.get(market)
+        if var is None:
+            return DEFAULT_VOL_PER_MIN / math.sqrt(60)
+        return max(math.sqrt(var), 1e-6)
+
+    def distance(self, market, price):
+        """가격 감시 중인 규칙 중 가장 가까운 발동가까지 로그 거리. 없으면 None
+        규칙 상태(발동/재감시/트레일링 고점)는 병렬 평가 시에도 워커가 돌려준 값이 부모 사본에 반영되어 있음"""
+        best = None
+        for rule in self._by_market.get(market, ()):
+            if rule.done or not rule.armed:
+                continue
+            trigger = rule.trigger_price
+            if trigger is None and getattr(rule, "kind", None) == "트레일링":
+                trigger = price * (1 - abs(rule.ratio) / 100)  # 고점 기록 전: 현재가를 고점으로 간주
+            if trigger is None or trigger <= 0:
+                continue
+            d = abs(math.log(trigger / price))
+            if best is None or d < best:
+                best = d
+        return best
+
+    def interval(self, market, price):
+        """Z 기준 안전 간격(초): fast ~ slow × stretch (근접 마켓 판정용)"""
+        d = self.distance(market, price)
+        if d is None:
+            return self.slow * self.stretch
+        t = (d / (self.z * self.sigma(market))) ** 2
+        return min(self.slow * self.stretch, max(self.fast, t))
+
+    def observe(self, snapshot, ts):
+        for market, tick in snapshot.items():
+            price = tick.get("price")
+            if not price or price <= 0:
+                continue
+            prev = self._last.get(market)
+            if prev is not None and ts > prev[1] and prev[0] > 0:
+                r = math.log(price / prev[0])
+                sample = r * r / (ts - prev[1])
+                var = self._var.get(market)
+                self._var[market] = sample if var is None else var + VOL_EWMA_ALPHA * (sample - var)
+            self._last[market] = (price, ts)
+            if market not in self._by_market:
+                continue
+            d = self.distance(market, price)
+            if d is None:
+                self._forget(market)
+                continue
+            self._dist[market] = d
+            if self.interval(market, price) < self.slow:
+                self._near.add(market)
+            else:
+                self._near.discard(market)
+
+    def reach(self, market, now):
+        """마지막 시세 이후 지금까지 가장 가까운 발동가에 닿았을 확률 (랜덤워크 최대값 근사). 아직 시세가 없으면 1"""
+        if market not in self._last:
+            return 1.0
+        d = self._dist.get(market)
+        if d is None:
+            return 0.0
+        elapsed = now - self._last[market][1]
+        if elapsed <= 0:
+            return 0.0
+        return math.erfc(d / (self.sigma(market) * math.sqrt(2 * elapsed)))
+
+    def _refill(self, now):
+        if self._token_time is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._token_time) * self.budget / 60)
+        self._token_time = now
+
+    def sweep_due(self, now=None):
+        """전종목 조회 차례인지. 근접 마켓이 있는 동안은 slow × stretch까지 미뤄 그 요청을 추가 조회에 씀"""
+        now = time.time() if now is None else now
+        if self._last_sweep is None:
+            return True
+        elapsed = now - self._last_sweep
+        if elapsed >= self.slow * self.stretch - 0.5:
+            return True  # 최대로 미룬 경우 예산과 관계없이 조회
+        if elapsed < self.slow - 0.5 or (self._near and not self._volume_rules):
+            return False
+        self._refill(now)
+        return self._tokens >= 1
+
+    def charge(self, now=None):
+        """전종목 조회 1회 차감 (최대로 미룬 조회는 토큰이 모자라도 실행, 음수면 그만큼 추가 조회를 쉼)"""
+        now = time.time() if now is None else now
+        self._refill(now)
+        self._tokens -= 1
+        self.sweeps += 1
+        self._last_sweep = now
+
+    def plan(self, now=None):
+        """도달 확률 합이 기준 이상이면 조회할 마켓 (확률 높은 순). 예산이 있으면 토큰 1개 사용"""
+        now = time.time() if now is None else now
+        if self._last_plan is not None and now - self._last_plan < self.fast:
+            return []
+        self._refill(now)
+        if self._tokens < 1:
+            return []
+        reach = {m: self.reach(m, now) for m in self._by_market if m in self._dist or m not in self._last}
+        if sum(reach.values()) < self.threshold:
+            return []
+        self._tokens -= 1
+        self.requests += 1
+        self._last_plan = now
+        return sorted(reach, key=reach.get, reverse=True)
+
+
+# ---------------------------------------------------------------------------
+# 시뮬레이션: 고정 주기 vs 자동 조절 (요청 수, 조회 종목 수, 알림 지연)
+# ---------------------------------------------------------------------------
+class _SimRule:
+    __slots__ = ("market", "trigger_price", "rising", "armed", "done", "crossed_at")
+
+    def __init__(self, market, trigger, rising):
+        self.market = market
+        self.trigger_price = trigger
+        self.rising = rising
+        self.armed = True
+        self.done = False
+        self.crossed_at = None
+
+
+class _SimBook:
+    def __init__(self, rules):
+        self.rules = {i: r for i, r in enumerate(rules)}
+
+
+def simulate(n_markets=200, hours=6.0, sweep=60, fast=5, budget=None, seeds=1):
+    """고정 sweep초 / 같은 총 예산의 고정 주기(60/budget초) / 자동 조절(전종목 포함 budget회/분) 비교.
+    budget 기본값은 60/sweep (고정 sweep초 조회와 같은 요청 수). 시드별 결과 + 전체 요약 출력"""
+    budget = 60 / sweep if budget is None else budget
+    fixed_fast = max(1, round(60 / budget))
+    policies = [("fixed", f"고정 {sweep}s")]
+    if fixed_fast != sweep:
+        policies.append(("fixed_fast", f"고정 {fixed_fast}s"))
+    policies.append(("adaptive", "자동 조절"))
+    print(f"[시뮬레이션] 마켓 {n_markets} | 규칙 {n_markets * 3} | {hours:g}시간 | 전종목 {sweep}s, 빠른 조회 {fast}s, 총 예산 {budget:g}회/분")
+    totals = {name: [0, 0, [], 0] for name, _ in policies}  # 요청 수, 지연 목록, 시드별 최대 합, 미감지
+
+    for seed in range(1, seeds + 1):
+        rng = random.Random(seed)
+        steps = int(hours * 3600)
+        sig = {f"M{i}": rng.uniform(0.0002, 0.002) for i in range(n_markets)}  # 초당 변동성
+        price0 = {m: 100.0 for m in sig}
+        paths = {}
+        for m, s in sig.items():
+            p, path = price0[m], []
+            for _ in range(steps):
+                p *= math.exp(rng.gauss(0, s))
+                path.append(p)
+            paths[m] = path
+
+        def make_rules():
+            r = random.Random(seed + 1)
+            out = []
+            for m in sig:
+                for _ in range(3):
+                    k = r.uniform(0.01, 0.15)
+                    rising = r.random() < 0.5
+                    out.append(_SimRule(m, price0[m] * (1 + k if rising else 1 - k), rising))
+            return out
+
+        def crossed(rule, p):
+            return p >= rule.trigger_price if rule.rising else p <= rule.trigger_price
+
+        def run(policy):
+            rules = make_rules()
+            for rule in rules:  # 실제 도달 시각: fast초 이상 유지된 첫 도달 (그보다 짧은 순간 도달은 어떤 조회 주기로도 보장 불가)
+                streak = 0
+                for t, p in enumerate(paths[rule.market]):
+                    streak = streak + 1 if crossed(rule, p) else 0
+                    if streak >= fast:
+                        rule.crossed_at = t - fast + 1
+                        break
+            by_market = {}
+            for rule in rules:
+                by_market.setdefault(rule.market, []).append(rule)
+            detected = {}
+            requests = quotes = 0
+            sched = AdaptiveScheduler(fast, sweep, budget) if policy == "adaptive" else None
+            if sched:
+                sched.index(_SimBook(rules))
+
+            def poll(markets, t, full):
+                nonlocal requests, quotes
+                if sched and full:
+                    sched.charge(t)
+                requests += 1
+                quotes += len(markets)
+                snap = {}
+                for m in markets:
+                    p = paths[m][t]
+                    snap[m] = {"price": p}
+                    for rule in by_market[m]:
+                        if not rule.done and crossed(rule, p):
+                            rule.done = True
+                            detected[id(rule)] = t
+                if sched:
+                    sched.observe(snap, t)
+
+            interval = fixed_fast if policy == "fixed_fast" else sweep
+            for t in range(steps):
+                if t % interval == 0 and (sched is None or sched.sweep_due(t)):
+                    poll(list(sig), t, True)
+                elif sched:
+                    due = sched.plan(t)
+                    if due:
+                        poll(due, t, False)
+            lat = sorted(max(0, detected[id(r)] - r.crossed_at) for r in rules if r.crossed_at is not None and id(r) in detected)
+            missed = sum(1 for r in rules if r.crossed_at is not None and id(r) not in detected)
+            return requests, quotes, lat, missed
+
+        for name, label in policies:
+            requests, quotes, lat, missed = run(name)
+            med = lat[len(lat) // 2] if lat else 0
+            p90 = lat[min(len(lat) - 1, int(len(lat) * 0.9))] if lat else 0
+            worst = lat[-1] if lat else 0
+            tot = totals[name]
+            tot[0] += requests
+            tot[1] += worst
+            tot[2].extend(lat)
+            tot[3] += missed
+            print(
+                f"  #{seed} {label:<8}: 요청 {requests / hours / 60:5.2f}회/분 | 조회 종목 {quotes / hours / 60:7.1f}개/분 | "
+                f"알림 {len(lat)}건 지연 중앙값 {med:3d}s p90 {p90:4d}s 최대 {worst:5d}s | 미감지 {missed}"
+            )
+    if seeds > 1:
+        print(f"[요약] 시드 {seeds}개")
+        for name, label in policies:
+            requests, worst_sum, lat, missed = totals[name]
+            lat.sort()
+            p90 = lat[min(len(lat) - 1, int(len(lat) * 0.9))] if lat else 0
+            p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))] if lat else 0
+            print(
+                f"  {label:<10}: 요청 {requests / seeds / hours / 60:5.2f}회/분 | 지연 p90 {p90:4d}s p99 {p99:5d}s "
+                f"최대(시드 평균) {worst_sum / seeds:7.0f}s | 미감지 {missed}"
+            )
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    if sys.platform == "win32":
+        try:
+            sys.stdout.reconfigure(encoding="utf-8")
+        except Exception:
+            pass
+    parser = argparse.ArgumentParser(description="조회 주기 자동 조절 시뮬레이션")
+    parser.add_argument("--markets", type=int, default=200)
+    parser.add_argument("--hours", type=float, default=6.0)
+    parser.add_argument("--sweep", type=int, default=60, help="전종목 조회 주기(초)")
+    parser.add_argument("--fast", type=int, default=5, help="최소 조회 간격(초)")
+    parser.add_argument("--budget", type=float, help="총 요청 예산(회/분, 전종목 조회 포함, 기본: 60/전종목 조회 주기)")
+    parser.add_argument("--seeds", type=int, default=1, help="시드 수 (여러 시드 결과 요약)")
+    args = parser.parse_args()
+    simulate(args.markets, args.hours, args.sweep, args.fast, args.budget, args.seeds)
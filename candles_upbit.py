@@ -0,0 +1,731 @@
+# candles_upbit.py - 체결 스트림으로 분봉(1/5/15/60분) 직접 생성
+# created : 2026-10-19
+# /v1/candles/minutes를 마켓마다 조회하지 않고, 업비트 체결(trade) 웹소켓을 구독해 분봉을 만든다.
+# 웹소켓 연결이 안 되면 /v1/trades/ticks 조회로 대신 채우고, 주기적으로 웹소켓 재연결을 시도한다.
+# 체결 1건당 분봉 종류 수만큼 O(1) 갱신. 봉이 끝나면(다음 구간 체결 또는 스트림 시각 경과) subscribe() 콜백으로 전달.
+# 업비트 분봉과 같이 체결 없는 구간은 봉을 만들지 않는다.
+#
+# 녹화: python candles_upbit.py --record trades.jsonl --markets KRW-BTC,KRW-ETH --seconds 600
+# 재생: python candles_upbit.py --replay trades.jsonl [--rest]   (로컬 대체 서버로 같은 프레임 전송 후 분봉 검증)
+# 샘플: python candles_upbit.py --synthetic trades.jsonl --markets 20 --minutes 90
+
+import os
+import ssl
+import json
+import time
+import base64
+import random
+import socket
+import struct
+import hashlib
+import threading
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+FRAMES = (1, 5, 15, 60)  # 분
+UPBIT_WS_URL = "wss://api.upbit.com/websocket/v1"
+UPBIT_API_URL = "https://api.upbit.com"
+CLOSE_GRACE_MS = 2000  # 구간이 끝나고 늦게 도착하는 체결 대기
+DEDUP_WINDOW = 512  # 마켓별 최근 체결번호 보관 수 (웹소켓 스냅샷/조회 중복 제거)
+HISTORY = 30  # 마켓·분봉별 보관하는 완성 봉 수
+REST_MAX_PER_SEC = 4  # /v1/trades/ticks 초당 요청 상한 (업비트 시세 API 초당 10회를 감시 루프의 /v1/ticker 조회와 나눠 씀)
+WS_RETRY_MAX = 60  # 웹소켓 재연결 대기 상한(초)
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def parse_trade(msg):
+    """웹소켓 체결 프레임 / trades/ticks 응답 1건 → (market, 체결시각 ms, 가격, 수량, 체결번호). 체결 아니면 None"""
+    if msg.get("type", "trade") != "trade":
+        return None
+    market = msg.get("code") or msg.get("market")
+    price = msg.get("trade_price")
+    volume = msg.get("trade_volume")
+    ts = msg.get("trade_timestamp") or msg.get("timestamp")
+    if not market or price is None or volume is None or ts is None:
+        return None
+    return market, int(ts), float(price), float(volume), msg.get("sequential_id")
+
+
+class Bar:
+    """분봉 1개 (시각은 구간 시작 ms, UTC 기준 정렬)"""
+
+    __slots__ = ("market", "minutes", "start", "open", "high", "low", "close", "volume", "value", "trades")
+
+    def __init__(self, market, minutes, start, price, volume):
+        self.market = market
+        self.minutes = minutes
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = volume
+        self.value = price * volume
+        self.trades = 1
+
+    @property
+    def end(self):
+        return self.start + self.minutes * 60000
+
+    def add(self, price, volume):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.value += price * volume
+        self.trades += 1
+
+    def view(self):
+        """조회 API/녹화용 dict (/v1/candles/minutes와 비슷한 필드)"""
+        return {
+            "market": self.market,
+            "unit": self.minutes,
+            "start": self.start,
+            "opening_price": self.open,
+            "high_price": self.high,
+            "low_price": self.low,
+            "trade_price": self.close,
+            "candle_acc_trade_volume": self.volume,
+            "candle_acc_trade_price": self.value,
+            "trades": self.trades,
+        }
+
+
+class CandleBuilder:
+    """체결 → 분봉. add_trade() 1회 = 분봉 종류별 O(1). 완성 봉은 subscribe() 콜백(market, minutes, Bar)으로 전달"""
+
+    def __init__(self, frames=FRAMES, history=HISTORY, dedup=DEDUP_WINDOW):
+        self.frames = tuple(frames)
+        self.history = history
+        self.dedup = dedup
+        self._open = {}  # (market, minutes) → 진행 중 Bar
+        self._closed = {}  # (market, minutes) → deque(완성 Bar)
+        self._seen = {}  # market → (deque, set) 최근 체결번호
+        self._subscribers = []
+        self.clock = 0  # 스트림 시각: 지금까지 본 최신 체결시각(ms)
+        self._clock_wall = None
+        self.trades = 0
+        self.duplicates = 0
+        self.late = 0
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def _duplicate(self, market, seq):
+        if seq is None:
+            return False
+        seen = self._seen.get(market)
+        if seen is None:
+            seen = self._seen[market] = (deque(), set())
+        order, ids = seen
+        if seq in ids:
+            return True
+        order.append(seq)
+        ids.add(seq)
+        if len(order) > self.dedup:
+            ids.discard(order.popleft())
+        return False
+
+    def add_trade(self, market, ts, price, volume, seq=None):
+        """체결 1건 반영. 반환: 반영 여부 (중복 체결이면 False)"""
+        if self._duplicate(market, seq):
+            self.duplicates += 1
+            return False
+        self.trades += 1
+        if ts > self.clock:
+            self.clock = ts
+            self._clock_wall = time.time()
+        for minutes in self.frames:
+            span = minutes * 60000
+            start = ts - ts % span
+            key = (market, minutes)
+            bar = self._open.get(key)
+            if bar is None:
+                self._open[key] = Bar(market, minutes, start, price, volume)
+            elif start == bar.start:
+                bar.add(price, volume)
+            elif start > bar.start:
+                self._close(key, bar)
+                self._open[key] = Bar(market, minutes, start, price, volume)
+            else:
+                self.late += 1  # 이미 지난 구간 (닫힌 봉은 고치지 않음)
+        return True
+
+    def add_message(self, msg):
+        trade = parse_trade(msg)
+        return trade is not None and self.add_trade(*trade)
+
+    def now(self, wall=None):
+        """스트림 기준 현재 시각(ms): 최신 체결시각 + 그 뒤 경과한 실제 시간"""
+        if self._clock_wall is None:
+            return self.clock
+        wall = time.time() if wall is None else wall
+        return self.clock + max(0, int((wall - self._clock_wall) * 1000))
+
+    def flush(self, now_ms=None):
+        """구간이 끝난 진행 중 봉 닫기 (체결이 뜸한 마켓용). 반환: 닫은 봉 수"""
+        now_ms = self.now() if now_ms is None else now_ms
+        done = [(k, b) for k, b in self._open.items() if b.end + CLOSE_GRACE_MS <= now_ms]
+        for key, bar in done:
+            del self._open[key]
+            self._close(key, bar)
+        return len(done)
+
+    def _close(self, key, bar):
+        closed = self._closed.get(key)
+        if closed is None:
+            closed = self._closed[key] = deque(maxlen=self.history)
+        closed.append(bar)
+        for callback in self._subscribers:
+            try:
+                callback(bar.market, bar.minutes, bar)
+            except Exception as e:
+                print(f"[분봉] 콜백 오류: {e}")
+
+    def current(self, market, minutes):
+        return self._open.get((market, minutes))
+
+    def recent(self, market, minutes, count=None):
+        """완성 봉 목록 (오래된 순)"""
+        bars = list(self._closed.get((market, minutes), ()))
+        return bars if count is None else bars[-count:]
+
+    def latest(self, minutes=1):
+        """마켓별 마지막 완성 봉 view (조회 API용)"""
+        return {m: q[-1].view() for (m, unit), q in self._closed.items() if unit == minutes and q}
+
+    def drop(self, markets):
+        """구독 해제된 마켓 상태 정리"""
+        for key in [k for k in self._open if k[0] in markets]:
+            del self._open[key]
+        for key in [k for k in self._closed if k[0] in markets]:
+            del self._closed[key]
+        for m in markets:
+            self._seen.pop(m, None)
+
+
+# ---------------------------------------------------------------------------
+# 최소 웹소켓 (RFC 6455) - 클라이언트 + 재생 서버 공용. 외부 패키지 없이 동작
+# ---------------------------------------------------------------------------
+def _ws_accept(key):
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+
+
+def _ws_frame(opcode, payload, mask):
+    head = bytearray([0x80 | opcode])
+    n = len(payload)
+    bit = 0x80 if mask else 0
+    if n < 126:
+        head.append(bit | n)
+    elif n < 65536:
+        head.append(bit | 126)
+        head += struct.pack(">H", n)
+    else:
+        head.append(bit | 127)
+        head += struct.pack(">Q", n)
+    if not mask:
+        return bytes(head) + payload
+    key = os.urandom(4)
+    return bytes(head) + key + bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+
+
+def _ws_parse(buf):
+    """버퍼 앞의 완성 프레임 1개 → (fin, opcode, payload, 사용 바이트). 미완성이면 None"""
+    if len(buf) < 2:
+        return None
+    fin, opcode = buf[0] & 0x80, buf[0] & 0x0F
+    masked, n = buf[1] & 0x80, buf[1] & 0x7F
+    pos = 2
+    if n == 126:
+        if len(buf) < 4:
+            return None
+        n = struct.unpack_from(">H", buf, 2)[0]
+        pos = 4
+    elif n == 127:
+        if len(buf) < 10:
+            return None
+        n = struct.unpack_from(">Q", buf, 2)[0]
+        pos = 10
+    key = None
+    if masked:
+        if len(buf) < pos + 4:
+            return None
+        key = buf[pos:pos + 4]
+        pos += 4
+    if len(buf) < pos + n:
+        return None
+    payload = bytes(buf[pos:pos + n])
+    if key:
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return fin, opcode, payload, pos + n
+
+
+class WebSocketClient:
+    """웹소켓 클라이언트. recv()는 시간 초과 시 None (받던 프레임은 버퍼에 유지)"""
+
+    def __init__(self, url, timeout=10):
+        u = urlparse(url)
+        secure = u.scheme == "wss"
+        port = u.port or (443 if secure else 80)
+        sock = socket.create_connection((u.hostname, port), timeout=timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=u.hostname)
+        self.sock = sock
+        self._buf = bytearray()
+        self._parts = []
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        sock.sendall((
+            f"GET {path} HTTP/1.1\r\nHost: {u.hostname}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        while b"\r\n\r\n" not in self._buf:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("웹소켓 핸드셰이크 중 연결 종료")
+            self._buf += chunk
+        head, _, rest = bytes(self._buf).partition(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in lines[1:])}
+        if lines[0].split()[1:2] != ["101"] or headers.get("sec-websocket-accept") != _ws_accept(key):
+            raise ConnectionError(f"웹소켓 핸드셰이크 실패: {lines[0]}")
+        self._buf = bytearray(rest)
+
+    def send_text(self, text):
+        self.sock.sendall(_ws_frame(0x1, text.encode("utf-8"), True))
+
+    def ping(self):
+        self.sock.sendall(_ws_frame(0x9, b"", True))
+
+    def recv(self, timeout=None):
+        """데이터 프레임 1개(bytes) 반환. 시간 초과 None, 서버 종료 시 ConnectionError"""
+        self.sock.settimeout(timeout)
+        while True:
+            frame = _ws_parse(self._buf)
+            if frame is None:
+                try:
+                    chunk = self.sock.recv(65536)
+                except socket.timeout:
+                    return None
+                if not chunk:
+                    raise ConnectionError("웹소켓 연결 종료")
+                self._buf += chunk
+                continue
+            fin, opcode, payload, used = frame
+            del self._buf[:used]
+            if opcode == 0x8:
+                raise ConnectionError("웹소켓 종료 프레임 수신")
+            if opcode == 0x9:
+                self.sock.sendall(_ws_frame(0xA, payload, True))
+                continue
+            if opcode == 0xA:
+                continue
+            self._parts.append(payload)
+            if fin:
+                data, self._parts = b"".join(self._parts), []
+                return data
+
+    def close(self):
+        try:
+            self.sock.sendall(_ws_frame(0x8, b"", True))
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def subscribe_message(markets, ticket="upbitMA"):
+    return json.dumps([{"ticket": ticket}, {"type": "trade", "codes": list(markets)}, {"format": "DEFAULT"}])
+
+
+# ---------------------------------------------------------------------------
+# 체결 수신: 웹소켓 우선, 실패 시 /v1/trades/ticks
+# ---------------------------------------------------------------------------
+class CandleFeed:
+    """백그라운드 스레드에서 체결을 받아 CandleBuilder에 반영. set_markets()로 구독 마켓 교체"""
+
+    def __init__(self, builder, markets=(), ws_url=UPBIT_WS_URL, rest_url=UPBIT_API_URL):
+        self.builder = builder
+        self.ws_url = ws_url
+        self.rest_url = rest_url.rstrip("/")
+        self._markets = tuple(sorted(set(markets)))
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()  # builder 접근 (조회 스레드와 공유)
+        self._ws = None
+        self._thread = None
+        self._poll_pos = 0  # 체결 조회를 이어서 시작할 위치 (대체 조회가 짧게 끝나도 모든 마켓을 돌아가며 조회)
+        self.mode = "대기"
+        self.frames = 0
+        self.reconnects = 0
+
+    def set_markets(self, markets):
+        markets = tuple(sorted(set(markets)))
+        if markets == self._markets:
+            return
+        removed = set(self._markets) - set(markets)
+        self._markets = markets
+        if removed:
+            with self._lock:
+                self.builder.drop(removed)
+        self._changed.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="candle-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def latest(self, minutes=1):
+        with self._lock:
+            return self.builder.latest(minutes)
+
+    def _run(self):
+        delay = 1
+        while not self._stop.is_set():
+            if not self._markets:
+                self._changed.wait(1)
+                continue
+            try:
+                self._stream()
+                delay = 1
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                self.reconnects += 1
+                print(f"[분봉] 웹소켓 오류: {e} → {delay}초간 체결 조회로 대체")
+                self._poll_for(delay)
+                delay = min(WS_RETRY_MAX, delay * 2)
+
+    def _stream(self):
+        self._changed.clear()
+        ws = self._ws = WebSocketClient(self.ws_url)
+        try:
+            ws.send_text(subscribe_message(self._markets))
+            self.mode = "웹소켓"
+            last_flush = last_frame = time.time()
+            while not self._stop.is_set() and not self._changed.is_set():
+                data = ws.recv(timeout=1)
+                now = time.time()
+                if data is not None:
+                    last_frame = now
+                    self.frames += 1
+                    msg = json.loads(data)
+                    with self._lock:
+                        self.builder.add_message(msg)
+                elif now - last_frame >= 60:
+                    ws.ping()  # 업비트는 120초 무응답 연결을 끊는다
+                    last_frame = now
+                if now - last_flush >= 1:
+                    with self._lock:
+                        self.builder.flush()
+                    last_flush = now
+        finally:
+            self._ws = None
+            ws.close()
+
+    def poll_once(self, markets=None, deadline=None):
+        """마켓별 최근 체결 조회 → 반영 (오래된 순). deadline(초)이 지나면 남은 마켓은 다음 호출에서 이어서 조회.
+        반환: 새 체결 수"""
+        added = 0
+        if markets is None:
+            markets = self._markets
+            start = self._poll_pos % len(markets) if markets else 0
+            markets = markets[start:] + markets[:start]
+        for market in markets:
+            if self._stop.is_set() or (deadline is not None and time.time() >= deadline):
+                break
+            self._poll_pos += 1
+            t0 = time.time()
+            try:
+                resp = requests.get(f"{self.rest_url}/v1/trades/ticks", params={"market": market, "count": 200}, timeout=10)
+                ticks = resp.json() if resp.status_code == 200 else []
+            except Exception:
+                ticks = []
+            with self._lock:
+                for tick in reversed(ticks):
+                    added += bool(self.builder.add_message(tick))
+            self._stop.wait(max(0.0, 1 / REST_MAX_PER_SEC - (time.time() - t0)))
+        with self._lock:
+            self.builder.flush()
+        return added
+
+    def _poll_for(self, seconds):
+        self.mode = "체결 조회"
+        deadline = time.time() + seconds
+        while not self._stop.is_set() and time.time() < deadline:
+            self.poll_once(deadline=deadline)
+
+    def close(self):
+        self._stop.set()
+        self._changed.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+# ---------------------------------------------------------------------------
+# 녹화 / 재생 (로컬 대체 서버)
+# ---------------------------------------------------------------------------
+def record(path, markets, seconds, url=UPBIT_WS_URL):
+    """실제 웹소켓 체결 프레임을 JSONL로 저장. 반환: 프레임 수"""
+    ws = WebSocketClient(url)
+    n = 0
+    try:
+        ws.send_text(subscribe_message(markets))
+        deadline = time.time() + seconds
+        with open(path, "w", encoding="utf-8") as f:
+            while time.time() < deadline:
+                data = ws.recv(timeout=1)
+                if data is not None:
+                    f.write(data.decode("utf-8").strip() + "\n")
+                    n += 1
+    finally:
+        ws.close()
+    return n
+
+
+def load_frames(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayServer:
+    """녹화한 체결 프레임을 웹소켓(/websocket/v1)과 /v1/trades/ticks로 돌려주는 로컬 업비트 대체 서버.
+    speed: 0이면 즉시 전송, 1이면 녹화 간격 그대로, 60이면 60배속
+    hold: 다 보낸 뒤 연결 유지 (True) / 종료 프레임 전송 (False)"""
+
+    def __init__(self, frames, speed=0.0, hold=True, port=0, host="127.0.0.1"):
+        self.frames = frames
+        self.speed = speed
+        self.hold = hold
+        self.sent = 0
+        self.connections = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if self.headers.get("Upgrade", "").lower() == "websocket":
+                    return server._serve_ws(self)
+                if url.path == "/v1/trades/ticks":
+                    q = parse_qs(url.query)
+                    body = json.dumps(server.ticks(q.get("market", [""])[0], int(q.get("count", ["200"])[0]))).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                else:
+                    body = b'{"error":"not found"}'
+                    self.send_response(404)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.ws_url = f"ws://{host}:{self._server.server_address[1]}/websocket/v1"
+        self.api_url = f"http://{host}:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def ticks(self, market, count):
+        """녹화 체결을 /v1/trades/ticks 형식으로 (최신 순)"""
+        out = []
+        for msg in reversed(self.frames):
+            if (msg.get("code") or msg.get("market")) != market or msg.get("type", "trade") != "trade":
+                continue
+            out.append({
+                "market": market,
+                "timestamp": msg.get("trade_timestamp") or msg.get("timestamp"),
+                "trade_price": msg["trade_price"],
+                "trade_volume": msg["trade_volume"],
+                "prev_closing_price": msg.get("prev_closing_price"),
+                "ask_bid": msg.get("ask_bid"),
+                "sequential_id": msg.get("sequential_id"),
+            })
+            if len(out) >= count:
+                break
+        return out
+
+    def _serve_ws(self, handler):
+        self.connections += 1
+        handler.close_connection = True
+        handler.send_response(101)
+        handler.send_header("Upgrade", "websocket")
+        handler.send_header("Connection", "Upgrade")
+        handler.send_header("Sec-WebSocket-Accept", _ws_accept(handler.headers.get("Sec-WebSocket-Key", "")))
+        handler.end_headers()
+        handler.wfile.flush()
+        sock = handler.connection
+        buf = bytearray()
+        while (frame := _ws_parse(buf)) is None:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return
+            buf += chunk
+        del buf[:frame[3]]
+        request = json.loads(frame[2])
+        codes = set()
+        for part in request:
+            if part.get("type") == "trade":
+                codes.update(part.get("codes", ()))
+        prev_ts = None
+        try:
+            for msg in self.frames:
+                if msg.get("code") not in codes:
+                    continue
+                ts = msg.get("trade_timestamp") or msg.get("timestamp")
+                if self.speed and prev_ts is not None and ts > prev_ts:
+                    time.sleep((ts - prev_ts) / 1000 / self.speed)
+                prev_ts = ts
+                sock.sendall(_ws_frame(0x2, json.dumps(msg).encode("utf-8"), False))  # 업비트는 바이너리 프레임
+                self.sent += 1
+            if not self.hold:
+                sock.sendall(_ws_frame(0x8, b"", False))
+                return
+            while True:  # 클라이언트가 닫을 때까지 유지 (ping에는 pong)
+                chunk = sock.recv(65536)
+                if not chunk:
+                    return
+                buf += chunk
+                while (frame := _ws_parse(buf)) is not None:
+                    del buf[:frame[3]]
+                    if frame[1] == 0x8:
+                        return
+                    if frame[1] == 0x9:
+                        sock.sendall(_ws_frame(0xA, frame[2], False))
+        except OSError:
+            pass
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def synthetic_frames(n_markets=20, minutes=90, seed=3, start_ms=None):
+    """시험용 체결 프레임 (마켓별 랜덤워크, 체결 간격 불규칙, 웹소켓 스냅샷 중복 포함)"""
+    rng = random.Random(seed)
+    start_ms = start_ms or (int(time.time() * 1000) // 3600000 - 2) * 3600000
+    frames, seq = [], 0
+    for i in range(n_markets):
+        market = f"KRW-T{i:03d}"
+        price = 10 ** rng.uniform(-2, 7)
+        ts = start_ms + rng.randint(0, 5000)
+        first = True
+        while ts < start_ms + minutes * 60000:
+            price *= 1 + rng.gauss(0, 0.002)
+            seq += 1
+            msg = {
+                "type": "trade", "code": market, "trade_timestamp": ts, "timestamp": ts + 20,
+                "trade_price": float(f"{price:.8g}"), "trade_volume": round(rng.expovariate(1.0), 8),
+                "ask_bid": rng.choice(("ASK", "BID")), "sequential_id": seq,
+                "stream_type": "SNAPSHOT" if first else "REALTIME",
+            }
+            frames.append(msg)
+            if first:
+                frames.append(dict(msg, stream_type="REALTIME"))  # 구독 직후 스냅샷과 같은 체결
+                first = False
+            ts += int(rng.expovariate(1 / (rng.choice((800, 5000, 90000)))))
+    frames.sort(key=lambda m: m["trade_timestamp"])
+    return frames
+
+
+def _bars_of(builder):
+    return sorted(
+        (b.market, b.minutes, b.start, b.open, b.high, b.low, b.close, round(b.volume, 8), b.trades)
+        for q in builder._closed.values() for b in q
+    )
+
+
+def replay_check(frames, use_rest=False, speed=0.0):
+    """대체 서버로 재생한 분봉 == 프레임을 직접 넣은 분봉인지 확인. 반환: 일치 여부"""
+    expected = CandleBuilder(history=10 ** 6)
+    for msg in frames:
+        expected.add_message(msg)
+    markets = sorted({m.get("code") or m.get("market") for m in frames})
+    server = ReplayServer(frames, speed=speed).start()
+    got = CandleBuilder(history=10 ** 6)
+    closed = []
+    got.subscribe(lambda market, minutes, bar: closed.append(bar))
+    feed = CandleFeed(got, markets, server.ws_url, server.api_url)
+    t0 = time.time()
+    try:
+        if use_rest:
+            feed.poll_once()
+        else:
+            feed.start()
+            # 서버가 다 보내고 수신 프레임 수가 따라올 때까지 대기
+            total = sum(1 for m in frames if m.get("code") in markets)
+            while time.time() - t0 < 60 and (server.sent < total or feed.frames < total):
+                time.sleep(0.05)
+    finally:
+        feed.close()
+        server.close()
+    elapsed = time.time() - t0
+    if use_rest:
+        # 조회는 마켓당 최근 200건까지만 → 비교도 그 범위로
+        recent = [t for m in markets for t in server.ticks(m, 200)]
+        expected = CandleBuilder(history=10 ** 6)
+        for tick in sorted(recent, key=lambda t: (t["timestamp"], t["sequential_id"])):
+            expected.add_message(tick)
+    closed_live = len(closed)
+    for builder in (expected, got):  # 남은 진행 중 봉까지 닫아서 비교
+        builder.flush(builder.clock + FRAMES[-1] * 60000 + CLOSE_GRACE_MS)
+    a, b = _bars_of(expected), _bars_of(got)
+    print(
+        f"[분봉 재생] {'체결 조회' if use_rest else '웹소켓'} | 프레임 {len(frames)} | 마켓 {len(markets)} | "
+        f"체결 {got.trades} (중복 제외 {got.duplicates}) | 수신 중 완성 봉 {closed_live} | {elapsed:.2f}s"
+    )
+    for unit in FRAMES:
+        n = sum(1 for bar in closed if bar.minutes == unit)
+        print(f"  {unit:>2}분봉 {n}개")
+    print(f"  직접 생성과 {'일치' if a == b else '불일치'} ({len(a)} / {len(b)})")
+    return a == b
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    if sys.platform == "win32":
+        try:
+            sys.stdout.reconfigure(encoding="utf-8")
+        except Exception:
+            pass
+    parser = argparse.ArgumentParser(description="체결 스트림 분봉 생성 - 녹화/재생")
+    parser.add_argument("--record", metavar="PATH", help="업비트 체결 프레임 녹화")
+    parser.add_argument("--replay", metavar="PATH", help="녹화 파일을 로컬 대체 서버로 재생해 분봉 검증")
+    parser.add_argument("--synthetic", metavar="PATH", help="시험용 체결 프레임 파일 생성")
+    parser.add_argument("--markets", default="KRW-BTC,KRW-ETH", help="녹화: 마켓 목록 / 생성: 마켓 수")
+    parser.add_argument("--seconds", type=int, default=600)
+    parser.add_argument("--minutes", type=int, default=90)
+    parser.add_argument("--rest", action="store_true", help="재생 시 웹소켓 대신 /v1/trades/ticks 경로 검증")
+    parser.add_argument("--speed", type=float, default=0.0, help="재생 배속 (0=즉시)")
+    args = parser.parse_args()
+    if args.record:
+        print(f"[분봉] 녹화 {record(args.record, args.markets.split(','), args.seconds)}프레임 → {args.record}")
+    elif args.synthetic:
+        frames = synthetic_frames(int(args.markets) if args.markets.isdigit() else 20, args.minutes)
+        with open(args.synthetic, "w", encoding="utf-8") as f:
+            for msg in frames:
+                f.write(json.dumps(msg) + "\n")
+        print(f"[분봉] 시험 프레임 {len(frames)}개 → {args.synthetic}")
+    elif args.replay:
+        sys.exit(0 if replay_check(load_frames(args.replay), args.rest, args.speed) else 1)
+    else:
+        parser.print_help()
@@ -0,0 +1,213 @@
+# commands_upbit.py - 텔레그램 명령으로 감시 규칙 즉시 추가/삭제
+# created : 2026-10-19
+# 백그라운드 스레드가 getUpdates를 롱폴링해 TELEGRAM_CHAT_ID 채팅의 명령만 처리한다 (감시 루프와 별도).
+#   /watch 종목 조건 값 [비율] [사유]   예) /watch 비트코인 이상 150000000 돌파
+#                                           /watch 리플 트레일링 5 / /watch 리플 기준대비 900 -10 손절
+#   /unwatch 종목 [사유]                 (사유 생략 시 해당 종목 전부)
+#   /list, /status, /help
+# 텔레그램으로 바꾼 규칙은 엑셀/DB를 다시 읽지 않고 규칙 1건만 반영하고,
+# STATE_DIR/upbitMA_commands.json에 저장해 재시작/엑셀 재로드 후에도 유지한다.
+
+import os
+import json
+import time
+import datetime
+import threading
+
+import requests
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DIR = os.getenv("STATE_DIR", "").strip() or SCRIPT_DIR  # 런타임 상태 파일 위치
+COMMAND_STORE_PATH = os.path.join(STATE_DIR, "upbitMA_commands.json")
+POLL_TIMEOUT = 25  # getUpdates 롱폴링 대기(초)
+DEFAULT_REASON = "텔레그램"
+
+WATCH_USAGE = (
+    "사용법: /watch 종목 조건 값 [비율] [사유]\n"
+    "  이상/이하: /watch 비트코인 이상 150000000 돌파\n"
+    "  트레일링: /watch 리플 트레일링 5 (고점 대비 %)\n"
+    "  기준대비: /watch 리플 기준대비 900 -10 (기준가격, 비율 %)\n"
+    "  거래량급증: /watch 도지코인 거래량급증 3 (평균 대비 배)"
+)
+HELP_TEXT = (
+    "📖 감시 명령\n"
+    f"{WATCH_USAGE}\n"
+    "/unwatch 종목 [사유] - 감시 해제 (사유 생략 시 종목 전체)\n"
+    "/list - 감시 현황\n"
+    "/status - 스크립트 상태"
+)
+
+
+def parse_command(text):
+    """'/watch@봇이름 a b' → ("watch", ["a", "b"]). 명령 아니면 None"""
+    text = (text or "").strip()
+    if not text.startswith("/"):
+        return None
+    parts = text.split()
+    cmd = parts[0][1:].split("@", 1)[0].lower()
+    return cmd, parts[1:]
+
+
+def build_watch_row(args, today=None):
+    """/watch 인자 → 엑셀 행 형식 dict (rules_upbit.build_rule 입력). 형식 오류는 ValueError(사용법)"""
+    from rules_upbit import RULE_KINDS, parse_number
+
+    if len(args) < 3 or args[1] not in RULE_KINDS:
+        raise ValueError(WATCH_USAGE)
+    name, kind = args[0], args[1]
+    rest = list(args[2:])
+    value = parse_number(rest.pop(0))
+    if value is None:
+        raise ValueError(WATCH_USAGE)
+    row = {"감시중": "O", "종목명": name, "감시조건": kind, "일자": (today or datetime.date.today()).isoformat()}
+    if kind in ("이상", "이하"):
+        row["감시가격"] = value
+    elif kind == "기준대비":
+        ratio = parse_number(rest.pop(0)) if rest else None
+        if ratio is None:
+            raise ValueError(WATCH_USAGE)
+        row["기준가격"], row["비율"] = value, ratio
+    else:
+        row["비율"] = value
+    row["감시사유"] = " ".join(rest) or DEFAULT_REASON
+    return row
+
+
+class CommandStore:
+    """텔레그램으로 추가한 행 / 해제한 (종목명, 감시사유) / 마지막 update_id 저장"""
+
+    def __init__(self, path=COMMAND_STORE_PATH):
+        self.path = path
+        self.rows = {}  # (종목명, 감시사유) → 행
+        self.removed = set()  # 엑셀/DB 규칙 중 텔레그램으로 해제한 키
+        self.offset = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[텔레그램 명령] 저장 파일 손상, 무시: {e}")
+            return
+        for row in data.get("rows", []):
+            self.rows[(row["종목명"], row["감시사유"])] = row
+        self.removed = {tuple(k) for k in data.get("removed", [])}
+        self.offset = int(data.get("offset", 0))
+
+    def save(self):
+        """임시파일 → 교체로 원자적 기록"""
+        with self._lock:
+            data = {
+                "saved_at": time.time(),
+                "offset": self.offset,
+                "rows": list(self.rows.values()),
+                "removed": sorted(self.removed),
+            }
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                print(f"[텔레그램 명령] 저장 실패: {e}")
+
+    def add(self, row):
+        key = (row["종목명"], row["감시사유"])
+        with self._lock:
+            self.rows[key] = dict(row, _id=f"tg:{key[0]}:{key[1]}")
+            self.removed.discard(key)
+        return self.rows[key]
+
+    def remove(self, key):
+        """텔레그램 행이면 삭제, 엑셀/DB 행이면 해제 목록에 기록"""
+        with self._lock:
+            if self.rows.pop(key, None) is None:
+                self.removed.add(key)
+
+    def merge(self, rows):
+        """엑셀/DB 감시중 행 + 텔레그램 행 (해제한 키 제외, 같은 키는 텔레그램 우선)"""
+        with self._lock:
+            own = self.rows
+            removed = self.removed
+            out = []
+            for row in rows:
+                key = (str(row.get("종목명", "") or "").strip(), str(row.get("감시사유", "") or "").strip())
+                if key not in removed and key not in own:
+                    out.append(row)
+            out.extend(own.values())
+        return out
+
+
+class CommandListener:
+    """getUpdates 롱폴링 스레드. handler(cmd, args) → 답장 문자열 (None이면 답장 안 함)"""
+
+    def __init__(self, token, chat_id, handler, store, api_url="https://api.telegram.org"):
+        self.base = f"{api_url.rstrip('/')}/bot{token}"
+        self.chat_id = str(chat_id)
+        self.handler = handler
+        self.store = store
+        self._stop = threading.Event()
+        self._thread = None
+        self.handled = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="telegram-commands", daemon=True)
+        self._thread.start()
+        return self
+
+    def _reply(self, text):
+        try:
+            requests.post(f"{self.base}/sendMessage", data={"chat_id": self.chat_id, "text": text}, timeout=10)
+        except Exception as e:
+            print(f"[텔레그램 명령] 답장 실패: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            t0 = time.time()
+            try:
+                resp = requests.get(
+                    f"{self.base}/getUpdates",
+                    params={"offset": self.store.offset + 1 if self.store.offset else None, "timeout": POLL_TIMEOUT, "allowed_updates": '["message"]'},
+                    timeout=POLL_TIMEOUT + 10,
+                )
+                if resp.status_code != 200:
+                    # 409: 웹훅 설정/다른 프로세스가 폴링 중
+                    print(f"[텔레그램 명령] getUpdates HTTP {resp.status_code}: {resp.text[:200]}")
+                    self._stop.wait(30)
+                    continue
+                updates = resp.json().get("result", [])
+            except Exception as e:
+                print(f"[텔레그램 명령] getUpdates 실패: {e}")
+                self._stop.wait(5)
+                continue
+            for update in updates:
+                self.store.offset = max(self.store.offset, int(update.get("update_id", 0)))
+                self._handle(update.get("message") or {})
+            if updates:
+                self.store.save()
+            elif time.time() - t0 < 1:
+                self._stop.wait(1)  # 롱폴링이 바로 끝나는 서버면 과호출 방지
+
+    def _handle(self, message):
+        if str((message.get("chat") or {}).get("id")) != self.chat_id:
+            return  # 허용 채팅 외 무시
+        parsed = parse_command(message.get("text"))
+        if parsed is None:
+            return
+        cmd, args = parsed
+        try:
+            reply = self.handler(cmd, args)
+        except Exception as e:
+            reply = f"⚠️ 명령 처리 오류: {e}"
+        self.handled += 1
+        if reply:
+            self._reply(reply)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
@@ -0,0 +1,208 @@
+# composite_upbit.py - 원화시장 종합지수 (거래대금 가중)
+# created : 2026-10-19
+# 지수 = 보유수량 · 현재가 (numpy 내적 1회). 보유수량은 리밸런싱 때만 다시 정한다:
+#   비중 w = 24시간 거래대금 비율 (한 종목 최대 MAX_WEIGHT, 초과분은 나머지에 재분배)
+#   보유수량 q = 지수 × w / 현재가  → 리밸런싱 직전/직후 지수가 같아 연속성 유지
+# 리밸런싱 사이 신규 상장 종목은 다음 리밸런싱부터 편입, 시세가 빠진 종목은 마지막 가격 유지.
+# 업비트 시세 API에는 유통량이 없어 시가총액 가중 대신 거래대금(유동성) 가중. weighting="equal"이면 동일 비중.
+#
+# 감시 규칙에서는 마켓 코드 KRW-INDEX(종목명 "원화지수")로 일반 종목처럼 이상/이하/트레일링 등을 쓸 수 있다.
+
+import time
+from collections import deque
+
+COMPOSITE_MARKET = "KRW-INDEX"
+COMPOSITE_NAMES = ("KRW-INDEX", "원화지수", "원화종합지수")
+BASE_LEVEL = 1000.0
+MAX_WEIGHT = 0.25  # 한 종목 최대 비중
+REBALANCE_SECONDS = 86400  # 리밸런싱 주기 (기본 1일)
+HISTORY_SECONDS = 86400  # 지수 이력 보관 기간
+HISTORY_STEP = 60  # 이력 간격(초). 그보다 잦은 표본은 마지막 값으로 덮어씀
+
+
+def cap_weights(raw, max_weight=MAX_WEIGHT):
+    """비중 합 1, 종목당 max_weight 이하 (numpy 배열). 초과분은 상한 미만 종목에 비례 재분배"""
+    import numpy as np
+
+    w = np.asarray(raw, dtype=np.float64)
+    total = w.sum()
+    if total <= 0:
+        return w
+    w = w / total
+    if max_weight * len(w) < 1:
+        return np.full(len(w), 1 / len(w))
+    for _ in range(len(w)):
+        over = w > max_weight
+        if not over.any():
+            break
+        excess = (w[over] - max_weight).sum()
+        w[over] = max_weight
+        free = ~over & (w < max_weight)
+        if not free.any() or w[free].sum() <= 0:
+            break
+        w[free] += excess * w[free] / w[free].sum()
+    return w
+
+
+class CompositeIndex:
+    """원화시장 종합지수. update(snapshot, ts) 1회 = 가격 배열 갱신 + 내적 1회"""
+
+    def __init__(self, weighting="volume", rebalance=REBALANCE_SECONDS, max_weight=MAX_WEIGHT,
+                 history=HISTORY_SECONDS, step=HISTORY_STEP):
+        import numpy as np
+
+        self._np = np
+        self.weighting = weighting
+        self.rebalance_every = rebalance
+        self.max_weight = max_weight
+        self.step = step
+        self.index = {}  # market → 번호
+        self.prices = np.zeros(0)
+        self.qty = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.level = None
+        self.updated_at = None
+        self.rebalanced_at = None
+        self.history = deque(maxlen=max(2, int(history // step) + 1))  # (시각, 지수)
+
+    def _slot(self, market):
+        idx = self.index.get(market)
+        if idx is None:
+            np = self._np
+            idx = self.index[market] = len(self.index)
+            if idx >= len(self.prices):
+                n = max(64, len(self.prices) * 2)
+                for name in ("prices", "qty", "weights"):
+                    old = getattr(self, name)
+                    new = np.zeros(n)
+                    new[:len(old)] = old
+                    setattr(self, name, new)
+        return idx
+
+    def rebalance(self, snapshot, ts):
+        """비중 재산정. 지수 수준은 유지 (첫 리밸런싱은 BASE_LEVEL)"""
+        np = self._np
+        markets = [m for m, t in snapshot.items() if t.get("price")]
+        if not markets:
+            return False
+        if self.weighting == "equal":
+            raw = np.ones(len(markets))
+        else:
+            raw = np.array([float(snapshot[m].get("acc_trade_price_24h") or 0) for m in markets])
+            if raw.sum() <= 0:
+                raw = np.ones(len(markets))
+        level = BASE_LEVEL if self.level is None else self.level
+        w = cap_weights(raw, self.max_weight)
+        self.qty[:] = 0
+        self.weights[:] = 0
+        for m, wi in zip(markets, w):
+            i = self._slot(m)
+            price = float(snapshot[m]["price"])
+            self.prices[i] = price
+            self.weights[i] = wi
+            self.qty[i] = level * wi / price
+        self.level = float(self.qty @ self.prices)
+        self.rebalanced_at = ts
+        return True
+
+    def update(self, snapshot, ts=None, rebalance=True):
+        """시세 반영 → 지수. 일부 마켓만 있는 스냅샷은 rebalance=False (나머지는 마지막 가격)"""
+        ts = time.time() if ts is None else ts
+        if self.rebalanced_at is None:
+            if not rebalance or not self.rebalance(snapshot, ts):
+                return self.level
+        else:
+            index, prices = self.index, self.prices
+            for market, tick in snapshot.items():
+                i = index.get(market)
+                if i is not None and tick.get("price"):
+                    prices[i] = tick["price"]
+            self.level = float(self.qty @ prices)
+            if rebalance and ts - self.rebalanced_at >= self.rebalance_every:
+                self.rebalance(snapshot, ts)  # 방금 계산한 지수 수준에서 비중만 교체
+        self.updated_at = ts
+        if self.history and ts - self.history[-1][0] < self.step:
+            self.history[-1] = (self.history[-1][0], self.level)
+        else:
+            self.history.append((ts, self.level))
+        return self.level
+
+    def tick(self):
+        """감시 규칙용 시세 dict (일반 마켓과 같은 형식)"""
+        return {"price": self.level}
+
+    def change(self, seconds):
+        """seconds 전 대비 등락률(%). 이력 부족 시 None"""
+        if self.level is None or not self.history:
+            return None
+        target = self.history[-1][0] - seconds
+        if self.history[0][0] > target:
+            return None
+        base = None
+        for t, v in reversed(self.history):
+            if t <= target:
+                base = v
+                break
+        return None if not base else (self.level - base) / base * 100
+
+    def range(self, since=None):
+        vals = [v for t, v in self.history if since is None or t >= since]
+        return (min(vals), max(vals)) if vals else (None, None)
+
+    def top_weights(self, n=5):
+        """현재 가격 기준 실제 비중 상위 (리밸런싱 후 가격 변동 반영)"""
+        if self.level is None or not self.level:
+            return []
+        value = self.qty * self.prices
+        names = {i: m for m, i in self.index.items()}
+        order = self._np.argsort(-value)[:n]
+        return [(names[i], float(value[i] / self.level)) for i in order if value[i] > 0]
+
+    def view(self):
+        """조회 API용 dict"""
+        lo, hi = self.range()
+        return {
+            "market": COMPOSITE_MARKET,
+            "level": self.level,
+            "updated_at": self.updated_at,
+            "rebalanced_at": self.rebalanced_at,
+            "weighting": self.weighting,
+            "constituents": int((self.qty > 0).sum()),
+            "change_1h": self.change(3600),
+            "change_24h": self.change(86400),
+            "low_24h": lo,
+            "high_24h": hi,
+            "top_weights": self.top_weights(),
+        }
+
+
+def _pct(v):
+    return "-" if v is None else f"{v:+.2f}%"
+
+
+def format_composite_markdown(v):
+    """Markdown 리포트용 종합지수 표 (행 목록). v: CompositeIndex.view() (리포트 기록 스레드에서 렌더링)"""
+    lines = ["\n## 🧮 원화시장 종합지수"]
+    if not v or v["level"] is None:
+        lines.append("- 없음")
+        return lines
+    rebalanced = time.strftime("%m-%d %H:%M", time.localtime(v["rebalanced_at"]))
+    lines.append("| 지수 | 1시간 | 24시간 | 24시간 저가 | 24시간 고가 | 편입 종목 | 리밸런싱 |")
+    lines.append("|------|-------|--------|-------------|-------------|-----------|----------|")
+    lines.append(
+        f"| {v['level']:,.2f} | {_pct(v['change_1h'])} | {_pct(v['change_24h'])} | "
+        f"{v['low_24h']:,.2f} | {v['high_24h']:,.2f} | {v['constituents']} | {rebalanced} |"
+    )
+    if v["top_weights"]:
+        lines.append("\n| 비중 상위 | 비중 |")
+        lines.append("|-----------|------|")
+        for market, w in v["top_weights"]:
+            lines.append(f"| {market} | {w * 100:.1f}% |")
+    return lines
+
+
+def format_composite_summary(composite):
+    """텔레그램 리포트용 한 줄"""
+    if composite is None or composite.level is None:
+        return "종합지수: 없음"
+    return f"종합지수 {composite.level:,.2f} (1시간 {_pct(composite.change(3600))} | 24시간 {_pct(composite.change(86400))})"
@@ -0,0 +1,642 @@
+# monitor_upbit.py - 감시 규칙(LIST_FILE) 감시 공용 처리 (upbitMA / upbitMA_list 공용)
+# created : 2026-10-19 (upbitMA, upbitMA_list에 같은 코드로 있던 감시 처리를 분리)
+# 규칙 로드/재구성, 전종목 시세 조회와 평가, 근접 마켓 추가 조회, 시작·만료 예약, 텔레그램 명령,
+# 스냅샷 게시/조회 API/체결 스트림/종합지수를 한 곳에서 관리한다. 상태는 모듈 전역(프로세스당 1벌).
+# 진입 스크립트는 configure(머리말, 스크립트명)만 호출하고 나머지는 그대로 쓴다.
+
+import os
+import time
+import datetime
+import threading
+from collections import deque
+
+from dotenv import load_dotenv
+
+from utils_upbit import send_telegram_message, get_upbit_markets_all, get_ticker_snapshot
+from utils_upbit import UPBIT_API_URL, TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+from warmstart_upbit import load_warm_cache, save_warm_cache
+from rulestore_upbit import get_rule_source, ActiveRules
+from rules_upbit import RuleBook
+from registry_upbit import MarketRegistry
+from composite_upbit import COMPOSITE_MARKET, COMPOSITE_NAMES
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
+
+LIST_MA_INTERVAL = int(os.getenv("LIST_MA_INTERVAL", "60").strip() or "60")  # 종목별 감시 주기(초), 기본 1분
+LIST_EVAL_WORKERS = int(os.getenv("LIST_EVAL_WORKERS", "0").strip() or "0")  # 규칙 병렬 평가 워커 수 (0=단일 프로세스)
+LIST_FAST_INTERVAL = int(os.getenv("LIST_FAST_INTERVAL", "0").strip() or "0")  # 발동가 근접 마켓 최소 조회 간격(초, 0=사용 안 함)
+LIST_FAST_BUDGET = float(os.getenv("LIST_FAST_BUDGET", "").strip() or 60 / LIST_MA_INTERVAL)  # 총 요청 예산(회/분, 전종목 조회 포함, 기본: 고정 주기와 같은 요청 수)
+TRADE_STREAM = os.getenv("TRADE_STREAM", "0").strip() in ("1", "true", "True")  # 체결 웹소켓 분봉 (candles_upbit)
+TRADE_STREAM_URL = os.getenv("TRADE_STREAM_URL", "").strip() or "wss://api.upbit.com/websocket/v1"  # 테스트용 교체 가능
+TELEGRAM_COMMANDS = os.getenv("TELEGRAM_COMMANDS", "0").strip() in ("1", "true", "True")  # 텔레그램 명령 수신 (commands_upbit)
+COMPOSITE_INDEX = os.getenv("COMPOSITE_INDEX", "0").strip().lower()  # 원화시장 종합지수: volume / equal (0=사용 안 함)
+COMPOSITE_REBALANCE_HOURS = float(os.getenv("COMPOSITE_REBALANCE_HOURS", "24").strip() or "24")  # 종합지수 비중 재산정 주기
+RULE_TTL_DAYS = float(os.getenv("RULE_TTL_DAYS", "0").strip() or "0")  # 수정일(없으면 일자) 기준 규칙 만료(일). 0=만료일 열만 사용
+LIST_FILE_RAW = os.getenv("LIST_FILE", "").strip()
+if LIST_FILE_RAW:
+    EXCEL_LIST_PATH = os.path.join(SCRIPT_DIR, LIST_FILE_RAW) if not os.path.isabs(LIST_FILE_RAW) else LIST_FILE_RAW
+else:
+    EXCEL_LIST_PATH = None
+SNAPSHOT_BUS_RAW = os.getenv("SNAPSHOT_BUS", "").strip()  # 다른 스크립트용 시세 스냅샷 파일 (빈칸=사용 안 함)
+SNAPSHOT_BUS_PATH = (os.path.join(SCRIPT_DIR, SNAPSHOT_BUS_RAW) if not os.path.isabs(SNAPSHOT_BUS_RAW) else SNAPSHOT_BUS_RAW) if SNAPSHOT_BUS_RAW else None
+QUERY_API_PORT = int(os.getenv("QUERY_API_PORT", "").strip() or "0") or None  # 감시 상태 조회 HTTP API 포트 (빈칸=사용 안 함)
+QUERY_API_HOST = os.getenv("QUERY_API_HOST", "").strip() or "127.0.0.1"
+
+# 감시 상태 (프로세스당 1벌, 진입 스크립트가 configure()로 이름만 지정)
+_tag = "리스트 감시"  # 로그/알림 머리말
+_script = "upbitMA_list"  # /status 머리말
+_MARKET_CACHE_TTL = 600
+_market_registry = MarketRegistry()  # KRW 마켓 목록 + 종목명 인덱스 (응답 diff로 증분 갱신)
+_market_cache_time = 0
+_market_refresh_thread = None
+_last_price_cache = {}  # 마지막 전종목 시세 (웜스타트 저장용)
+_last_price_time = 0
+_snapshot_bus = None  # 스냅샷 파일 게시 (SNAPSHOT_BUS 설정 시)
+_query_server = None  # 조회 API (queryapi_upbit.QueryServer, QUERY_API_PORT 설정 시)
+_fired_log = deque(maxlen=200)  # 최근 발동 알림 (조회 API용)
+
+_list_alert_sent = set()
+_active_rules = None  # 감시중 규칙 캐시 (rulestore_upbit.ActiveRules)
+_rule_book = RuleBook(ttl=RULE_TTL_DAYS * 86400)  # 규칙별 상태 (트레일링 고점, 거래량 평균, 재감시, 시작/만료)
+_rule_book_generation = None
+_rule_evaluator = None  # 병렬 평가기 (LIST_EVAL_WORKERS > 0일 때만 생성)
+_scheduler = None  # 마켓별 조회 주기 (LIST_FAST_INTERVAL > 0일 때만 생성)
+_candle_feed = None  # 체결 스트림 분봉 (candles_upbit, TRADE_STREAM=1일 때만 생성)
+_stream_refs = {}  # 체결 스트림 구독 마켓 → 감시 중 규칙 수 (0이 되면 구독 해제)
+_stream_keys = {}  # 규칙 키 → 참조 중인 구독 마켓 (같은 규칙을 두 번 세지 않도록)
+_rule_lock = threading.Lock()  # 규칙 집합 (감시 루프 ↔ 텔레그램 명령 스레드)
+_command_store = None  # 텔레그램으로 추가/해제한 규칙 저장 (commands_upbit, TELEGRAM_COMMANDS=1일 때만)
+_command_listener = None
+_composite = None  # 원화시장 종합지수 (composite_upbit, COMPOSITE_INDEX 설정 시만)
+_last_active_list_count = 0  # 대기 로그용: 엑셀 감시중(O) 건수
+
+
+def configure(tag, script):
+    """진입 스크립트별 로그/알림 머리말 (예: "종목별 감시", "upbitMA")"""
+    global _tag, _script
+    _tag, _script = tag, script
+
+
+def get_price_cache():
+    """마지막 전종목 시세와 조회 시각 (시세 없으면 ({}, 0))"""
+    return _last_price_cache, _last_price_time
+
+
+def get_watch_counts():
+    """대기 로그용 (감시중 건수, 알림 후 제외 건수)"""
+    return max(0, _last_active_list_count - len(_list_alert_sent)), len(_list_alert_sent)
+
+
+def add_market_hook(hook):
+    """마켓 레지스트리 변경(신규 상장/상장 폐지/유의종목) 콜백 등록"""
+    _market_registry.add_hook(hook)
+
+
+def _refresh_market_cache():
+    global _market_cache_time
+    _market_registry.update(get_upbit_markets_all())
+    _market_cache_time = time.time()
+
+
+def _refresh_market_cache_background():
+    try:
+        _refresh_market_cache()
+    except Exception as e:
+        print(f"[마켓 캐시 갱신 실패] {e}")
+
+
+def get_cached_market_data():
+    """종목명 매핑 + KRW 마켓 목록 캐시. TTL 내에는 API 호출 없이 반환.
+    캐시가 있으면 TTL이 지나도 기존 값을 바로 반환하고 갱신은 백그라운드에서 진행."""
+    global _market_refresh_thread
+    if not _market_registry.loaded:
+        _refresh_market_cache()
+    elif (time.time() - _market_cache_time) >= _MARKET_CACHE_TTL and not (
+        _market_refresh_thread and _market_refresh_thread.is_alive()
+    ):
+        _market_refresh_thread = threading.Thread(target=_refresh_market_cache_background, daemon=True)
+        _market_refresh_thread.start()
+    return _market_registry.name_map, _market_registry.krw_markets
+
+
+def warm_start():
+    """이전 종료 시 저장한 캐시로 마켓 매핑/시세 복원 (만료 상태로 두어 첫 조회 시 백그라운드 갱신)"""
+    global _market_cache_time, _last_price_cache
+    cache = load_warm_cache()
+    if not cache:
+        return False
+    _market_registry.load(cache["markets"])
+    _market_cache_time = 0
+    _last_price_cache = cache.get("tickers", {})
+    saved_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(cache["saved_at"]))
+    print(f"[웜스타트] 캐시 복원: {len(_market_registry.markets)}종목 (저장 {saved_at})")
+    return True
+
+
+def save_cache_snapshot():
+    """종료 시 마켓 목록/종목명 매핑/마지막 시세 저장"""
+    save_warm_cache(_market_registry.snapshot(), _market_registry.name_map, _last_price_cache)
+
+
+def load_excel_list(file_path):
+    """감시 규칙 로드 (감시중=O 행만 반환). LIST_FILE 확장자로 엑셀(.xlsx)/SQLite(.db) 선택
+    열: 감시중, 종목명, 감시사유, 감시가격, 감시조건, 일자, 기준가격, 비율, 수정일, 비고 (+ 선택: 재감시(%), 대기(분), 만료일)
+    """
+    return get_rule_source(file_path).load_active()
+
+
+def load_active_rules():
+    """감시중 규칙 캐시 갱신 후 반환 (SQLite는 변경분만, 엑셀은 파일이 바뀐 경우에만 재로드)
+    LIST_FILE 미설정/파일 없음이면 마지막으로 읽은 행 (없으면 빈 목록, 텔레그램 규칙만 감시)"""
+    global _active_rules
+    if EXCEL_LIST_PATH is None or not os.path.exists(EXCEL_LIST_PATH):
+        return _active_rules.active() if _active_rules is not None else []
+    source = get_rule_source(EXCEL_LIST_PATH)
+    if _active_rules is None or _active_rules.source is not source:
+        _active_rules = ActiveRules(source)
+    _active_rules.refresh()
+    return _active_rules.active()
+
+
+def get_rule_views():
+    """감시 규칙별 상태 (현재가, 발동가까지 거리, 알림 여부). 조회 API와 감시현황 메시지 공용"""
+    prices = _last_price_cache
+    with _rule_lock:
+        rules = list(_rule_book.rules.values())
+    # 병렬 평가 시에도 워커에서 바뀐 상태(재감시/고점/발동 시각)가 매 주기 부모 사본에 반영됨
+    return [rule.view((prices.get(rule.market) or {}).get("price")) for rule in rules]
+
+
+def get_list_monitoring_status(views=None):
+    """감시현황 메시지 본문 생성. 미사용 시 (None, 이유문자열) 반환 (get_rule_views()의 텍스트 보기)
+    텔레그램으로 추가한 규칙이 있으면 LIST_FILE 없이도 현황 표시"""
+    commands = _command_store is not None and bool(_command_store.rows)
+    if not commands:
+        if EXCEL_LIST_PATH is None:
+            return None, "LIST_FILE 미설정"
+        if not os.path.exists(EXCEL_LIST_PATH):
+            return None, f"파일 없음: {EXCEL_LIST_PATH}"
+    if views is None:
+        if not load_active_rules() and not commands:
+            return None, "엑셀에 감시중(O) 행 없음"
+        get_cached_market_data()
+        sync_rule_book()
+        views = get_rule_views()
+    elif not views and not commands and (_active_rules is None or not _active_rules.active()):
+        return None, "엑셀에 감시중(O) 행 없음"
+    count = len(views)
+    if not count:
+        return f"{_tag}: 등록 0건 (엑셀 경로 있음)" + format_rule_schedule(*get_schedule_views()), None
+    body = "\n".join(f"  · {v['name']} | {v['reason']} | {v['describe']}" for v in views[:30])  # 최대 30건
+    if count > 30:
+        body += f"\n  … 외 {count - 30}건"
+    return f"{_tag} 현황 ({count}건)\n{body}" + format_rule_schedule(*get_schedule_views()), None
+
+
+def get_schedule_views():
+    """시작 전/만료 규칙 상태 (감시 대상 아님). 반환: (시작 대기 목록, 만료 목록)"""
+    with _rule_lock:
+        pending = list(_rule_book.pending.values())
+        expired = list(_rule_book.expired.values())
+    return [r.view() for r in pending], [r.view() for r in expired]
+
+
+def format_rule_schedule(pending, expired):
+    """감시현황 끝에 붙일 시작 대기/만료 요약 (각 최대 10건). 둘 다 없으면 빈 문자열"""
+    text = ""
+    for label, views, field in (("⏳ 시작 대기", pending, "starts_at"), ("⌛ 만료", expired, "expires_at")):
+        if views:
+            items = ", ".join(
+                f"{v['name']}({v['reason']}) {datetime.datetime.fromtimestamp(v[field]).strftime('%m-%d %H:%M')}"
+                for v in views[:10]
+            )
+            text += f"\n{label} {len(views)}건: {items}" + (" …" if len(views) > 10 else "")
+    return text
+
+
+def _resolve_row_market(row):
+    name = str(row.get("종목명", "") or "").strip()
+    if name in COMPOSITE_NAMES:
+        return COMPOSITE_MARKET if get_composite() is not None else None  # 종합지수 미사용이면 매핑 실패로 안내
+    return row.get("_market") or _market_registry.resolve(name)
+
+
+def _stream_markets():
+    """체결 스트림 구독 마켓 (종합지수 KRW-INDEX는 업비트 마켓이 아니므로 제외)"""
+    return set(_stream_refs)
+
+
+def _rebuild_stream_refs():
+    """전체 재구성 시 구독 참조 수 다시 계산 (_rule_lock 안에서 호출)"""
+    _stream_keys.clear()
+    _stream_refs.clear()
+    for rule in _rule_book.rules.values():
+        _stream_ref(rule, True)
+
+
+def _stream_ref(rule, added):
+    """규칙 1건만큼 구독 참조 수 증감. 반환: 구독 마켓 집합이 바뀌었는지"""
+    if added:
+        if rule.market == COMPOSITE_MARKET or rule.key in _stream_keys:
+            return False
+        _stream_keys[rule.key] = rule.market
+        _stream_refs[rule.market] = _stream_refs.get(rule.market, 0) + 1
+        return _stream_refs[rule.market] == 1
+    market = _stream_keys.pop(rule.key, None)
+    if market is None:
+        return False
+    _stream_refs[market] -= 1
+    if _stream_refs[market]:
+        return False
+    del _stream_refs[market]
+    return True
+
+
+def sync_rule_book():
+    """감시 규칙/마켓 목록이 바뀐 경우에만 규칙 재구성 (정의가 같은 규칙은 상태 유지)"""
+    global _rule_book_generation
+    with _rule_lock:
+        generation = (None if _active_rules is None else _active_rules.generation, _market_registry.generation)
+        if generation == _rule_book_generation:
+            return
+        rows = [] if _active_rules is None else _active_rules.active()
+        if _command_store is not None:
+            rows = _command_store.merge(rows)  # 텔레그램으로 추가/해제한 규칙
+        for name, reason in _rule_book.sync(rows, _resolve_row_market):
+            print(f"[{_tag}] 마켓 매핑 실패: {name} ({reason})")
+        if _rule_evaluator is not None:
+            _rule_evaluator.sync(_rule_book)
+        if _scheduler is not None:
+            _scheduler.index(_rule_book)
+        _rebuild_stream_refs()
+        if _candle_feed is not None:
+            _candle_feed.set_markets(_stream_markets())
+        _rule_book_generation = generation
+
+
+def get_rule_evaluator():
+    """LIST_EVAL_WORKERS > 0이면 워커 프로세스 병렬 평가기 (최초 호출 시 생성, 이후 재사용)"""
+    global _rule_evaluator
+    if LIST_EVAL_WORKERS <= 0:
+        return None
+    if _rule_evaluator is None:
+        from parallel_upbit import ShardedRuleEvaluator
+
+        _rule_evaluator = ShardedRuleEvaluator(LIST_EVAL_WORKERS)
+        _rule_evaluator.sync(_rule_book)
+        print(f"[{_tag}] 병렬 평가 워커 {LIST_EVAL_WORKERS}개 시작 (규칙 {len(_rule_book.rules)}건)")
+    return _rule_evaluator
+
+
+def refresh_price_cache():
+    """이번 주기에 감시로 조회한 전종목 시세가 없을 때만 조회. 반환: 시세 유무
+    LIST_FAST_INTERVAL 사용 시 전종목 조회 시점은 조회 주기 관리자가 정함 (미룬 동안은 추가 조회가 반영된 캐시 사용)"""
+    global _last_price_cache, _last_price_time
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        if not scheduler.sweep_due(time.time()):
+            return bool(_last_price_cache)
+    elif time.time() - _last_price_time < LIST_MA_INTERVAL / 2:
+        return True
+    snapshot = get_ticker_snapshot(get_cached_market_data()[1])
+    if not snapshot:
+        return bool(_last_price_cache)
+    _last_price_cache = snapshot
+    _last_price_time = time.time()
+    if scheduler is not None:
+        scheduler.charge(_last_price_time)
+        scheduler.observe(snapshot, _last_price_time)
+    return True
+
+
+def publish_query_state():
+    """QUERY_API_PORT 설정 시 조회 API 응답을 이번 주기 상태로 미리 생성 (요청 처리 중 계산/API 호출 없음)"""
+    global _query_server
+    if QUERY_API_PORT is None:
+        return
+    if _query_server is None:
+        from queryapi_upbit import QueryServer
+
+        _query_server = QueryServer(QUERY_API_PORT, QUERY_API_HOST).start()
+    from breadth_upbit import summarize_breadth
+
+    refresh_price_cache()
+    views = get_rule_views()
+    status, reason = get_list_monitoring_status(views)
+    _query_server.publish({
+        "/status": {
+            "updated_at": time.time(),
+            "prices_at": _last_price_time,
+            "markets": len(_market_registry.markets),
+            "rules": len(views),
+            "watching": sum(1 for v in views if not v["done"]),
+            "excluded": len(_list_alert_sent),
+            "pending": len(_rule_book.pending),
+            "expired": len(_rule_book.expired),
+            "list_status": status,
+            "reason": reason,
+        },
+        "/status.txt": status or f"{_tag}: 미사용 ({reason})",
+        "/snapshot": {"updated_at": _last_price_time, "tickers": _last_price_cache},
+        "/breadth": summarize_breadth(_last_price_cache),
+        "/rules": views,
+        "/schedule": dict(zip(("pending", "expired"), get_schedule_views())),
+        "/fired": list(_fired_log),
+        "/candles": _candle_feed.latest(1) if _candle_feed is not None else {},
+        "/composite": _composite.view() if _composite is not None else {},
+    })
+
+
+def get_candle_feed():
+    """TRADE_STREAM=1이면 감시 규칙 마켓의 체결 스트림 분봉 생성기 (최초 호출 시 시작, 이후 재사용)"""
+    global _candle_feed
+    if not TRADE_STREAM:
+        return None
+    if _candle_feed is None:
+        from candles_upbit import CandleBuilder, CandleFeed
+
+        markets = _stream_markets()
+        _candle_feed = CandleFeed(CandleBuilder(), markets, TRADE_STREAM_URL, UPBIT_API_URL).start()
+        print(f"[{_tag}] 체결 스트림 분봉 시작 (마켓 {len(markets)}개)")
+    return _candle_feed
+
+
+def _reindex_rule(rule, added):
+    """규칙 1건 변경을 병렬 평가기(담당 워커만)/조회 주기/체결 스트림 구독에 반영 (_rule_lock 안에서 호출).
+    전체 규칙을 다시 훑지 않음. 감시 대상이 아니던 규칙(시작 전/만료)을 빼도 아무 것도 바뀌지 않음"""
+    if _rule_evaluator is not None:
+        if added:
+            _rule_evaluator.upsert(rule)
+        else:
+            _rule_evaluator.remove(rule.key)
+    if _scheduler is not None:
+        (_scheduler.add_rule if added else _scheduler.remove_rule)(rule)
+    if _stream_ref(rule, added) and _candle_feed is not None:
+        _candle_feed.set_markets(_stream_refs)
+
+
+def handle_command(cmd, args):
+    """텔레그램 명령 처리 (명령 스레드). 엑셀/DB 재로드 없이 규칙 1건 단위로 반영 후 저장"""
+    from commands_upbit import HELP_TEXT, WATCH_USAGE, build_watch_row
+    from rules_upbit import build_rule
+
+    if cmd == "watch":
+        try:
+            row = build_watch_row(args)
+        except ValueError as e:
+            return str(e)
+        get_cached_market_data()
+        market = _resolve_row_market(row)
+        if not market:
+            return f"⚠️ 마켓 매핑 실패: {row['종목명']}"
+        rule = build_rule(row, market, _rule_book.ttl)
+        if rule is None:
+            return f"⚠️ 감시 불가 조건\n{WATCH_USAGE}"
+        with _rule_lock:
+            _command_store.add(row)
+            old = _rule_book.rules.get(rule.key)
+            if _rule_book.add(rule):
+                if old is not None:
+                    _reindex_rule(old, False)
+                if rule.key in _rule_book.rules:
+                    _reindex_rule(rule, True)
+        _command_store.save()
+        print(f"[{_tag}] 텔레그램 감시 추가: {rule.name} ({rule.reason})")
+        return f"✅ 감시 추가: {rule.name} | {rule.reason} | {rule.describe()}"
+    if cmd == "unwatch":
+        if not args:
+            return "사용법: /unwatch 종목 [사유]"
+        name, reason = args[0], " ".join(args[1:])
+        with _rule_lock:
+            known = [*_rule_book.rules, *_rule_book.pending, *_rule_book.expired]  # 시작 전/만료 규칙도 해제 가능
+            if reason:
+                keys = [(name, reason)] if (name, reason) in known else []
+            else:
+                keys = [k for k in known if k[0] == name]
+            for key in keys:
+                _command_store.remove(key)
+                _reindex_rule(_rule_book.remove(key), False)
+        if not keys:
+            return f"⚠️ 감시 중인 규칙 없음: {name} {reason}".rstrip()
+        _command_store.save()
+        print(f"[{_tag}] 텔레그램 감시 해제: {name} ({len(keys)}건)")
+        return f"🗑 감시 해제: {name} ({', '.join(k[1] for k in keys)})"
+    if cmd == "list":
+        status, reason = get_list_monitoring_status(get_rule_views())
+        return status or f"{_tag}: 미사용 ({reason})"
+    if cmd == "status":
+        views = get_rule_views()
+        watching = sum(1 for v in views if not v["done"])
+        at = datetime.datetime.fromtimestamp(_last_price_time).strftime("%H:%M:%S") if _last_price_time else "-"
+        return (
+            f"📊 [{_script}] 상태\n"
+            f"규칙 {len(views)}건 (감시 {watching} / 제외 {len(views) - watching})"
+            f" | 시작 대기 {len(_rule_book.pending)}건 | 만료 {len(_rule_book.expired)}건\n"
+            f"마지막 시세 {at} ({len(_last_price_cache)}종목) | 주기 {LIST_MA_INTERVAL}초\n"
+            f"텔레그램 추가 {len(_command_store.rows)}건 | 해제 {len(_command_store.removed)}건"
+        )
+    if cmd in ("help", "start"):
+        return HELP_TEXT
+    return f"알 수 없는 명령: /{cmd} (/help)"
+
+
+def start_command_listener():
+    """TELEGRAM_COMMANDS=1이면 텔레그램 명령 롱폴링 스레드 시작. 저장된 텔레그램 규칙은 첫 감시 주기에 합쳐짐"""
+    global _command_store, _command_listener
+    if not TELEGRAM_COMMANDS or _command_listener is not None:
+        return
+    from commands_upbit import CommandStore, CommandListener
+
+    _command_store = CommandStore()
+    _command_listener = CommandListener(
+        TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, handle_command, _command_store, TELEGRAM_API_URL
+    ).start()
+    print(f"[{_tag}] 텔레그램 명령 수신 시작 (저장된 규칙 {len(_command_store.rows)}건)")
+
+
+def close_command_listener():
+    global _command_listener
+    if _command_listener is not None:
+        _command_listener.close()
+        _command_listener = None
+
+
+def close_candle_feed():
+    global _candle_feed
+    if _candle_feed is not None:
+        _candle_feed.close()
+        _candle_feed = None
+
+
+def close_query_server():
+    global _query_server
+    if _query_server is not None:
+        _query_server.close()
+        _query_server = None
+
+
+def publish_snapshot_bus():
+    """SNAPSHOT_BUS 설정 시 최신 전종목 시세 + 등락 분포를 스냅샷 파일에 게시.
+    이번 주기에 감시로 조회한 시세가 있으면 재사용하고, 없을 때만 조회한다."""
+    global _snapshot_bus
+    if SNAPSHOT_BUS_PATH is None or not refresh_price_cache():
+        return
+    if _snapshot_bus is None:
+        from snapbus_upbit import SnapshotWriter
+
+        _snapshot_bus = SnapshotWriter(SNAPSHOT_BUS_PATH)
+    from breadth_upbit import summarize_breadth
+
+    _snapshot_bus.publish(_last_price_cache, summarize_breadth(_last_price_cache), _last_price_time)
+
+
+def close_snapshot_bus():
+    global _snapshot_bus
+    if _snapshot_bus is not None:
+        _snapshot_bus.close()
+        _snapshot_bus = None
+
+
+def close_rule_evaluator():
+    global _rule_evaluator
+    if _rule_evaluator is not None:
+        _rule_evaluator.close()
+        _rule_evaluator = None
+
+
+def run_list_monitoring():
+    """LIST_FILE + 텔레그램 규칙 감시 1주기. 전종목 시세 1회 조회 후 평가, 조건 충족 시 알림 후 해당 (종목, 감시사유)는 감시 대상에서 제외.
+    재감시(%) 열이 있는 규칙은 되돌림 폭/대기시간 후 다시 감시. LIST_FILE이 없어도 텔레그램 규칙이 있으면 실행."""
+    global _last_active_list_count, _last_price_cache, _last_price_time
+    active_rows = load_active_rules()
+    if not active_rows and not (_command_store is not None and _command_store.rows):
+        return
+    _, krw_markets = get_cached_market_data()
+    sync_rule_book()
+    _last_active_list_count = len(_rule_book.rules)  # 엑셀 + 텔레그램 규칙 중 감시 대상
+    get_candle_feed()
+    scheduler = get_scheduler()
+    if scheduler is not None and not scheduler.sweep_due(time.time()):
+        return  # 근접 마켓 추가 조회 중: 전종목 조회를 미루고 그 요청을 추가 조회에 씀 (규칙 평가는 추가 조회에서)
+    snapshot = get_ticker_snapshot(krw_markets)
+    if not snapshot:
+        print(f"[{_tag}] 전종목 시세 조회 실패, 이번 주기 스킵")
+        return
+    _last_price_cache = snapshot
+    _last_price_time = time.time()
+    evaluate_rules(with_composite(snapshot, _last_price_time))
+    if scheduler is not None:
+        scheduler.charge(_last_price_time)  # 전종목 조회도 요청 예산에 포함
+        scheduler.observe(snapshot, _last_price_time)
+
+
+def evaluate_rules(snapshot):
+    """시세 스냅샷으로 규칙 평가 후 발동 알림 전송 (전종목 조회/근접 마켓 추가 조회 공용)"""
+    global _list_alert_sent
+    now = datetime.datetime.now()
+    book = get_rule_evaluator() or _rule_book
+    with _rule_lock:  # 텔레그램 명령 스레드와 규칙 집합 공유
+        advance_rule_schedule(now.timestamp())
+        fired = book.evaluate(snapshot, now.timestamp())
+        _list_alert_sent = book.done_keys()
+    for rule, detail in fired:
+        msg = (
+            f"🔔 [{_tag}] {rule.name} - {rule.reason}\n"
+            f"   {detail}\n"
+            f"   ({now.strftime('%Y-%m-%d %H:%M')})"
+        )
+        send_telegram_message(msg)
+        _fired_log.append({"name": rule.name, "reason": rule.reason, "market": rule.market, "detail": detail, "at": now.timestamp()})
+        print(f"[{_tag}] 알림 전송: {rule.name} ({rule.reason})")
+
+
+def advance_rule_schedule(now_ts):
+    """시작/만료 시각이 된 규칙만 감시 대상에 넣고 뺌 (타이밍 휠, _rule_lock 안에서 호출)"""
+    activated, expired = _rule_book.advance(now_ts)
+    if not activated and not expired:
+        return
+    for rule in expired:
+        _reindex_rule(rule, False)
+    for rule in activated:
+        _reindex_rule(rule, True)
+    for rule in activated:
+        print(f"[{_tag}] 감시 시작: {rule.name} ({rule.reason})")
+    for rule in expired:
+        print(f"[{_tag}] 감시 만료: {rule.name} ({rule.reason})")
+
+
+def get_composite():
+    """COMPOSITE_INDEX 설정 시 원화시장 종합지수 (최초 호출 시 생성, 이후 재사용)"""
+    global _composite
+    if COMPOSITE_INDEX in ("", "0", "off", "false"):
+        return None
+    if _composite is None:
+        from composite_upbit import CompositeIndex
+
+        weighting = "equal" if COMPOSITE_INDEX == "equal" else "volume"
+        _composite = CompositeIndex(weighting, rebalance=COMPOSITE_REBALANCE_HOURS * 3600)
+    return _composite
+
+
+def with_composite(snapshot, ts, full=True):
+    """종합지수 갱신 후 규칙 평가용 스냅샷에 KRW-INDEX 추가 (조회 주기/스냅샷 게시에는 넣지 않음).
+    full=False: 근접 마켓만 조회한 일부 시세 (나머지 종목은 마지막 가격, 리밸런싱 안 함)"""
+    composite = get_composite()
+    if composite is None:
+        return snapshot
+    if composite.updated_at != ts:
+        composite.update(snapshot, ts, rebalance=full)
+    if composite.level is None:
+        return snapshot
+    return {**snapshot, COMPOSITE_MARKET: composite.tick()}
+
+
+def get_scheduler():
+    """LIST_FAST_INTERVAL > 0이면 마켓별 조회 주기 관리자 (최초 호출 시 생성)"""
+    global _scheduler
+    if LIST_FAST_INTERVAL <= 0:
+        return None
+    if _scheduler is None:
+        from cadence_upbit import AdaptiveScheduler
+
+        _scheduler = AdaptiveScheduler(LIST_FAST_INTERVAL, LIST_MA_INTERVAL, LIST_FAST_BUDGET)
+        _scheduler.index(_rule_book)
+    return _scheduler
+
+
+def run_fast_poll():
+    """발동 가능성이 쌓이면 가격 규칙이 있는 마켓만 조회해 해당 규칙 평가. 누적거래량은 전종목 주기에서만 반영(거래량 평균 유지)"""
+    global _last_price_cache
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return
+    markets = scheduler.plan(time.time())
+    if not markets:
+        return
+    snapshot = get_ticker_snapshot(markets)
+    if not snapshot:
+        return
+    ts = time.time()
+    _last_price_cache = {**_last_price_cache, **snapshot}
+    prices = {m: {"price": t["price"]} for m, t in snapshot.items()}
+    evaluate_rules(with_composite(prices, ts, full=False))
+    scheduler.observe(snapshot, ts)
+
+
+def wait_next_cycle(seconds):
+    """다음 주기까지 대기. LIST_FAST_INTERVAL 설정 시 대기 중 발동가 근접 마켓만 짧은 간격으로 추가 조회"""
+    if get_scheduler() is None or not _rule_book.rules:
+        time.sleep(seconds)
+        return
+    deadline = time.time() + seconds
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        time.sleep(min(LIST_FAST_INTERVAL, remaining))
+        if deadline - time.time() >= 1:  # 곧 전종목 조회면 생략
+            try:
+                run_fast_poll()
+            except Exception as e:
+                print(f"[근접 마켓 조회 오류] {e}")
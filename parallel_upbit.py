@@ -0,0 +1,356 @@
+# parallel_upbit.py - 감시 규칙 병렬 평가 (멀티프로세스, 공유메모리 시세 배열)
+# created : 2026-10-19
+# 규칙을 (종목명, 감시사유) 해시로 워커 프로세스에 나눠 두고 상태(고점, 거래량 평균 등)는 워커가 보관한다.
+# 주기마다 시세는 shared_memory 배열(마켓 번호 → 현재가/누적거래량)에 한 번만 쓰고,
+# 워커는 복사 없이 읽어 평가한 뒤 발동한 규칙 번호와 설명, 상태가 바뀐 규칙의 상태만 돌려준다.
+# (부모의 WatchRule 사본에 반영 → 조회 API / 감시현황 / 적응형 조회 주기가 워커와 같은 상태를 봄)
+# .env LIST_EVAL_WORKERS > 0 이면 사용 (0 = 기존 단일 프로세스 RuleBook.evaluate)
+#
+# 벤치마크: python parallel_upbit.py --rules 200000 --markets 300 --cycles 10
+
+import os
+import sys
+import math
+import zlib
+import time
+import random
+import multiprocessing
+from multiprocessing import shared_memory
+
+_NAN = float("nan")
+
+
+def _shard_of(key, n):
+    """(종목명, 감시사유) → 워커 번호 (프로세스 간 고정, hash() 랜덤화 영향 없음)"""
+    return zlib.crc32("\x00".join(key).encode("utf-8")) % n
+
+
+def _attach(name, capacity):
+    shm = shared_memory.SharedMemory(name=name)
+    view = shm.buf.cast("d")
+    return shm, view, capacity
+
+
+def _worker_main(conn):
+    """워커 루프. 명령: attach / sync / eval / stop"""
+    shm = view = None
+    capacity = 0
+    rules = {}  # 규칙 번호 → (마켓 번호, WatchRule)
+    try:
+        while True:
+            cmd = conn.recv()
+            op = cmd[0]
+            if op == "attach":
+                if view is not None:
+                    view.release()
+                    shm.close()
+                shm, view, capacity = _attach(cmd[1], cmd[2])
+                conn.send(True)
+            elif op == "sync":
+                _, upserts, removes = cmd
+                for rid in removes:
+                    rules.pop(rid, None)
+                for rid, idx, rule in upserts:
+                    rules[rid] = (idx, rule)
+                conn.send(len(rules))
+            elif op == "eval":
+                now_ts = cmd[1]
+                fired = []
+                # 상태가 바뀐 규칙만: 발동/재감시는 전체 상태, 트레일링 고점만 바뀐 경우는 고점만
+                # (거래량 평균은 매 주기 바뀌므로 발동/재감시 때 함께 전달)
+                changed = []
+                peaks = []
+                for rid, (idx, rule) in rules.items():
+                    if rule.done:
+                        continue
+                    price = view[idx]
+                    if price != price:  # NaN: 이번 주기 시세 없음
+                        continue
+                    vol = view[capacity + idx]
+                    armed, fired_at, peak = rule.armed, rule.fired_at, rule.peak
+                    try:
+                        detail = rule.update(price, None if vol != vol else vol, now_ts)
+                    except Exception as e:
+                        print(f"[병렬 평가] 규칙 오류 {rule.key}: {e}")
+                        continue
+                    if rule.armed is not armed or rule.fired_at != fired_at:
+                        changed.append((rid, rule.state()))
+                    elif rule.peak != peak:
+                        peaks.append((rid, rule.peak))
+                    if detail:
+                        fired.append((rid, detail))
+                conn.send((fired, changed, peaks))
+            elif op == "stop":
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if view is not None:
+            view.release()
+            shm.close()
+
+
+class ShardedRuleEvaluator:
+    """RuleBook 규칙을 워커 프로세스에 나눠 평가. evaluate()는 RuleBook.evaluate와 같은 형식 반환.
+
+    사용: ev = ShardedRuleEvaluator(4); ev.sync(rule_book); ev.evaluate(snapshot, ts); ev.close()
+    규칙 1건 변경(텔레그램 명령, 시작/만료)은 upsert(rule) / remove(key)로 담당 워커에만 전송 (전체 규칙 순회 없음)
+    """
+
+    def __init__(self, workers):
+        self.n = max(1, int(workers))
+        ctx = multiprocessing.get_context("spawn")  # Windows와 동작 통일, 부모 상태 상속 없음
+        self._conns = []
+        self._procs = []
+        for _ in range(self.n):
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+            p.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(p)
+        self._market_idx = {}  # market → 배열 번호
+        self._shm = None
+        self._view = None
+        self._capacity = 0
+        self._sent = {}  # key → 워커에 보낸 WatchRule (동일 객체면 재전송 안 함)
+        self._ids = {}  # key → 규칙 번호
+        self._by_id = {}  # 규칙 번호 → WatchRule (부모 쪽, 이름/사유 표시용)
+        self._next_id = 0
+        self._done = set()
+
+    def _ensure_capacity(self, size):
+        if size <= self._capacity:
+            return
+        capacity = max(256, size * 2)
+        old_shm, old_view = self._shm, self._view
+        self._shm = shared_memory.SharedMemory(create=True, size=capacity * 2 * 8)
+        self._view = self._shm.buf.cast("d")
+        self._capacity = capacity
+        for conn in self._conns:
+            conn.send(("attach", self._shm.name, capacity))
+        for conn in self._conns:
+            conn.recv()
+        if old_shm is not None:
+            old_view.release()
+            old_shm.close()
+            old_shm.unlink()
+
+    def _stage_upsert(self, key, rule):
+        """부모 쪽 번호 부여 → 워커에 보낼 (규칙 번호, 마켓 번호, 규칙)"""
+        idx = self._market_idx.get(rule.market)
+        if idx is None:
+            idx = self._market_idx[rule.market] = len(self._market_idx)
+        rid = self._ids.get(key)
+        if rid is None:
+            rid = self._ids[key] = self._next_id
+            self._next_id += 1
+        self._sent[key] = rule
+        self._by_id[rid] = rule
+        self._done.discard(key)
+        return rid, idx, rule
+
+    def _stage_remove(self, key):
+        """부모 쪽 기록 삭제 → 워커에서 지울 규칙 번호 (보낸 적 없으면 None)"""
+        rid = self._ids.pop(key, None)
+        if rid is None:
+            return None
+        del self._sent[key]
+        del self._by_id[rid]
+        self._done.discard(key)
+        return rid
+
+    def _send_sync(self, upserts, removes):
+        """워커별 (추가/교체 목록, 삭제 목록) 전송 후 응답 대기 (변경 없는 워커는 건너뜀)"""
+        self._ensure_capacity(len(self._market_idx))
+        busy = [i for i in range(self.n) if upserts[i] or removes[i]]
+        for i in busy:
+            self._conns[i].send(("sync", upserts[i], removes[i]))
+        for i in busy:
+            self._conns[i].recv()
+
+    def sync(self, rule_book):
+        """RuleBook 전체와 비교해 변경분(새로 만들어진/삭제된 규칙)만 담당 워커에 전송 (규칙 수만큼 순회)"""
+        rules = rule_book.rules
+        upserts = [[] for _ in range(self.n)]
+        removes = [[] for _ in range(self.n)]
+        for key in [k for k in self._sent if k not in rules]:
+            removes[_shard_of(key, self.n)].append(self._stage_remove(key))
+        for key, rule in rules.items():
+            if self._sent.get(key) is not rule:
+                upserts[_shard_of(key, self.n)].append(self._stage_upsert(key, rule))
+        self._send_sync(upserts, removes)
+
+    def upsert(self, rule):
+        """규칙 1건 추가/교체 (담당 워커 1개에만 전송)"""
+        if self._sent.get(rule.key) is rule:
+            return
+        upserts = [[] for _ in range(self.n)]
+        upserts[_shard_of(rule.key, self.n)].append(self._stage_upsert(rule.key, rule))
+        self._send_sync(upserts, [[]] * self.n)
+
+    def remove(self, key):
+        """규칙 1건 삭제 (담당 워커 1개에만 전송, 없는 키는 무시)"""
+        rid = self._stage_remove(key)
+        if rid is None:
+            return
+        removes = [[] for _ in range(self.n)]
+        removes[_shard_of(key, self.n)].append(rid)
+        self._send_sync([[]] * self.n, removes)
+
+    def evaluate(self, snapshot, now_ts):
+        """시세 스냅샷을 공유메모리에 쓰고 전 워커 평가 → [(WatchRule, 설명)]
+        워커에서 바뀐 상태(재감시, 고점, 발동 시각 등)는 부모 사본에 반영"""
+        if self._view is None:
+            return []
+        view, cap = self._view, self._capacity
+        for market, idx in self._market_idx.items():
+            tick = snapshot.get(market)
+            if tick is None:
+                view[idx] = _NAN
+                view[cap + idx] = _NAN
+            else:
+                view[idx] = tick["price"]
+                acc = tick.get("acc_volume")
+                view[cap + idx] = _NAN if acc is None else acc
+        for conn in self._conns:
+            conn.send(("eval", now_ts))
+        fired = []
+        by_id = self._by_id
+        for conn in self._conns:
+            shard_fired, changed, peaks = conn.recv()
+            for rid, peak in peaks:
+                rule = by_id.get(rid)
+                if rule is not None:
+                    rule.peak = peak
+            for rid, state in changed:
+                rule = by_id.get(rid)
+                if rule is None:
+                    continue
+                rule.set_state(state)
+                if rule.done:
+                    self._done.add(rule.key)
+            for rid, detail in shard_fired:
+                rule = by_id.get(rid)
+                if rule is not None:
+                    fired.append((rule, detail))
+        return fired
+
+    def done_keys(self):
+        """1회 알림 후 제외된 규칙 키"""
+        return set(self._done)
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(("stop",))
+            except (OSError, BrokenPipeError):
+                pass
+        for p in self._procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        self._conns, self._procs = [], []
+        if self._shm is not None:
+            self._view.release()
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = self._view = None
+
+
+# ---------------------------------------------------------------------------
+# 벤치마크
+# ---------------------------------------------------------------------------
+def _bench_book(n_rules, n_markets, seed=3):
+    from rules_upbit import RuleBook, WatchRule
+
+    rng = random.Random(seed)
+    prices = {f"KRW-B{i:04d}": 10 ** rng.uniform(0, 6) for i in range(n_markets)}
+    markets = list(prices)
+    book = RuleBook()
+    for i in range(n_rules):
+        mkt = rng.choice(markets)
+        p = prices[mkt]
+        kind = rng.choice(("이상", "이하", "트레일링", "기준대비", "거래량급증"))
+        key = (mkt, f"r{i}")
+        if kind == "이상":
+            rule = WatchRule(key, mkt, kind, threshold=p * 1.5, rearm=1.0)
+        elif kind == "이하":
+            rule = WatchRule(key, mkt, kind, threshold=p * 0.5, rearm=1.0)
+        elif kind == "트레일링":
+            rule = WatchRule(key, mkt, kind, ratio=30, rearm=1.0)
+        elif kind == "기준대비":
+            rule = WatchRule(key, mkt, kind, ref=p, ratio=rng.choice((-40, 40)), rearm=1.0)
+        else:
+            rule = WatchRule(key, mkt, kind, ratio=50, rearm=1.0)
+        book.rules[key] = rule
+    return book, prices
+
+
+def _bench_snapshots(prices, cycles, seed=5):
+    rng = random.Random(seed)
+    acc = dict.fromkeys(prices, 0.0)
+    cur = dict(prices)
+    out = []
+    for _ in range(cycles):
+        snap = {}
+        for m in cur:
+            cur[m] *= math.exp(rng.gauss(0, 0.01))
+            acc[m] += rng.random() * 100
+            snap[m] = {"price": cur[m], "acc_volume": acc[m]}
+        out.append(snap)
+    return out
+
+
+def run_benchmark(n_rules=200000, n_markets=300, cycles=10, worker_counts=None):
+    """단일 프로세스 RuleBook.evaluate 대비 워커 수별 처리량 출력"""
+    cpu = os.cpu_count() or 1
+    if not worker_counts:
+        worker_counts = sorted({1, 2, 4, 8, cpu} & set(range(1, cpu + 1))) or [1]
+    snaps = _bench_snapshots(_bench_book(1, n_markets)[1], cycles)
+    print(f"[벤치마크] 규칙 {n_rules:,}건 | 마켓 {n_markets} | 주기 {cycles} | CPU {cpu}")
+
+    book, _ = _bench_book(n_rules, n_markets)
+    t0 = time.perf_counter()
+    for i, snap in enumerate(snaps):
+        book.evaluate(snap, 1000.0 + i * 60)
+    base = (time.perf_counter() - t0) / cycles
+    print(f"  단일 프로세스  : 주기당 {base * 1000:8.1f}ms | {n_rules / base:12,.0f} 규칙/초 | x1.00")
+
+    for w in worker_counts:
+        book, _ = _bench_book(n_rules, n_markets)
+        ev = ShardedRuleEvaluator(w)
+        try:
+            t_sync = time.perf_counter()
+            ev.sync(book)
+            t_sync = time.perf_counter() - t_sync
+            ev.evaluate(snaps[0], 999.0)  # 워커 예열
+            t0 = time.perf_counter()
+            for i, snap in enumerate(snaps):
+                ev.evaluate(snap, 1000.0 + i * 60)
+            per = (time.perf_counter() - t0) / cycles
+        finally:
+            ev.close()
+        print(
+            f"  워커 {w:>2}개     : 주기당 {per * 1000:8.1f}ms | {n_rules / per:12,.0f} 규칙/초 | "
+            f"x{base / per:.2f} (초기 전송 {t_sync:.1f}s)"
+        )
+    if cpu == 1:
+        print("  (CPU 1개 환경: 워커 수에 따른 확장성은 측정 불가)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    if sys.platform == "win32":
+        try:
+            sys.stdout.reconfigure(encoding="utf-8")
+        except Exception:
+            pass
+    parser = argparse.ArgumentParser(description="감시 규칙 병렬 평가 벤치마크")
+    parser.add_argument("--rules", type=int, default=200000)
+    parser.add_argument("--markets", type=int, default=300)
+    parser.add_argument("--cycles", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="*", help="워커 수 목록 (기본: 1,2,4,8,CPU 수 중 가능한 값)")
+    args = parser.parse_args()
+    run_benchmark(args.rules, args.markets, args.cycles, args.workers)
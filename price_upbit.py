@@ -0,0 +1,214 @@
+# price_upbit.py - 호가 단위 기반 고정소수점 가격 (원 미만 코인 포함 정확 비교)
+# created : 2026-10-19
+# 가격을 마켓별 소수 자릿수(scale)로 곱한 정수로 보관한다. 예) 0.00464861원, scale 8 → 464861
+# 자릿수는 업비트 원화마켓 호가 단위와 실제 시세의 소수 자릿수 중 큰 쪽 (최대 8자리).
+# PriceBoard      : 마켓 번호 → int64 가격 배열 (numpy, 지연 import)
+# ThresholdIndex  : 가격 조건 규칙(이상/이하/기준대비)의 발동가를 같은 scale 정수 배열로 두고 전 마켓 일괄 비교
+#                   (규칙 1건 추가/삭제는 전체 재구성 없이 반영)
+
+import math
+from decimal import Decimal, ROUND_HALF_UP
+
+MAX_DECIMALS = 8
+
+# 업비트 원화마켓 주문 가격 단위 (가격 하한, 호가 단위). 종목별 예외는 시세 소수 자릿수로 보정
+KRW_TICK_TABLE = (
+    (2_000_000, Decimal("1000")),
+    (1_000_000, Decimal("1000")),
+    (500_000, Decimal("500")),
+    (100_000, Decimal("100")),
+    (50_000, Decimal("50")),
+    (10_000, Decimal("10")),
+    (5_000, Decimal("5")),
+    (1_000, Decimal("1")),
+    (100, Decimal("1")),
+    (10, Decimal("0.1")),
+    (1, Decimal("0.01")),
+    (0.1, Decimal("0.001")),
+    (0.01, Decimal("0.0001")),
+    (0.001, Decimal("0.00001")),
+    (0.0001, Decimal("0.000001")),
+    (0.00001, Decimal("0.0000001")),
+    (0, Decimal("0.00000001")),
+)
+
+
+def tick_size(price):
+    """가격대별 호가 단위 (Decimal)"""
+    for floor, tick in KRW_TICK_TABLE:
+        if price >= floor:
+            return tick
+    return KRW_TICK_TABLE[-1][1]
+
+
+def tick_decimals(price):
+    """호가 단위 소수 자릿수 (1원 이상 단위는 0)"""
+    return max(0, -tick_size(price).as_tuple().exponent)
+
+
+def decimals_of(value):
+    """값 자체의 소수 자릿수 (0.0046 → 4, 1e-05 → 5, 1200.0 → 0)"""
+    exp = Decimal(repr(float(value))).normalize().as_tuple().exponent
+    return min(MAX_DECIMALS, max(0, -exp))
+
+
+def round_to_tick(value):
+    """호가 단위로 반올림. 1원 이상 단위면 int, 아니면 float"""
+    tick = tick_size(value)
+    q = (Decimal(repr(float(value))) / tick).quantize(Decimal(1), rounding=ROUND_HALF_UP) * tick
+    return int(q) if tick >= 1 else float(q)
+
+
+def exact_price(raw):
+    """숫자 문자열/값 → 정수면 int, 아니면 float (int(float()) 절사 없음)"""
+    d = Decimal(str(raw))
+    if d == d.to_integral_value():
+        return int(d)
+    return float(d)
+
+
+def to_fixed(value, decimals, mode="round"):
+    """float → 정수 (scale=decimals). mode: round / ceil / floor (발동가는 방향에 맞춰 올림/내림)"""
+    x = value * 10 ** decimals
+    if mode == "ceil":
+        r = round(x)
+        return r if abs(x - r) < 1e-6 else math.ceil(x)
+    if mode == "floor":
+        r = round(x)
+        return r if abs(x - r) < 1e-6 else math.floor(x)
+    return round(x)
+
+
+def from_fixed(n, decimals):
+    return n / 10 ** decimals
+
+
+class PriceBoard:
+    """마켓별 고정소수점 현재가 배열. update(snapshot) 1회로 전 마켓 갱신"""
+
+    def __init__(self, capacity=512):
+        import numpy as np
+
+        self._np = np
+        self.index = {}  # market → 번호
+        self.scale = np.zeros(capacity, dtype=np.int8)
+        self.ticks = np.zeros(capacity, dtype=np.int64)
+        self.has = np.zeros(capacity, dtype=bool)
+        self.rescaled = False  # scale이 바뀌면 True (ThresholdIndex 재구성 필요)
+
+    def slot(self, market):
+        idx = self.index.get(market)
+        if idx is None:
+            idx = self.index[market] = len(self.index)
+            if idx >= len(self.ticks):
+                np = self._np
+                n = len(self.ticks) * 2
+                self.scale = np.concatenate([self.scale, np.zeros(n - len(self.scale), dtype=np.int8)])
+                self.ticks = np.concatenate([self.ticks, np.zeros(n - len(self.ticks), dtype=np.int64)])
+                self.has = np.concatenate([self.has, np.zeros(n - len(self.has), dtype=bool)])
+            self.scale[idx] = -1  # 아직 시세 없음
+        return idx
+
+    def update(self, snapshot):
+        """시세 스냅샷 { market: {price, ...} } 반영. 이번 스냅샷에 없는 마켓은 무효 처리"""
+        self.has[:] = False
+        scale, ticks, has = self.scale, self.ticks, self.has
+        for market, tick in snapshot.items():
+            price = tick.get("price")
+            if price is None:
+                continue
+            idx = self.slot(market)
+            dec = int(scale[idx])
+            if dec < 0:
+                dec = max(tick_decimals(price), decimals_of(price))
+                scale[idx] = dec
+                self.rescaled = True
+            x = price * 10 ** dec
+            r = round(x)
+            if abs(x - r) > 1e-6 and dec < MAX_DECIMALS:
+                # 호가 단위보다 잘게 체결된 종목 → 자릿수 확대
+                dec = max(dec, decimals_of(price))
+                scale[idx] = dec
+                self.rescaled = True
+                r = round(price * 10 ** dec)
+            ticks[idx] = r
+            has[idx] = True
+
+    def price(self, market):
+        idx = self.index.get(market)
+        if idx is None or not self.has[idx]:
+            return None
+        return from_fixed(int(self.ticks[idx]), int(self.scale[idx]))
+
+
+class ThresholdIndex:
+    """가격 조건 규칙의 발동가 정수 배열. candidates(board) → update()가 필요한 규칙 번호 (numpy 1회 비교)
+    append()/remove()로 규칙 1건씩 반영 (배열은 2배씩 늘리고, 삭제는 빈칸 표시)"""
+
+    def __init__(self, rules, board):
+        np = board._np
+        self._np = np
+        rules = list(rules)
+        cap = max(16, len(rules))
+        self.rules = []
+        self.pos = {}  # 규칙 키 → 번호
+        self.holes = 0  # 삭제로 비운 칸 수
+        self.market = np.zeros(cap, dtype=np.int64)
+        self.threshold = np.zeros(cap, dtype=np.int64)
+        self.rising = np.zeros(cap, dtype=bool)
+        self.armed = np.ones(cap, dtype=bool)
+        self.live = np.zeros(cap, dtype=bool)
+        for rule in rules:
+            self.append(rule, board)
+
+    def _grow(self):
+        np = self._np
+        n = len(self.market) * 2
+        for name in ("market", "threshold", "rising", "armed", "live"):
+            old = getattr(self, name)
+            new = np.zeros(n, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def append(self, rule, board):
+        i = len(self.rules)
+        if i >= len(self.market):
+            self._grow()
+        idx = board.slot(rule.market)
+        dec = int(board.scale[idx])
+        if dec < 0:
+            dec = MAX_DECIMALS if rule.trigger_price < 1 else tick_decimals(rule.trigger_price)
+            board.scale[idx] = dec
+        rising = rule.kind == "이상" or (rule.kind == "기준대비" and rule.ratio >= 0)
+        self.rules.append(rule)
+        self.pos[rule.key] = i
+        self.market[i] = idx
+        # 가격은 scale 격자 위에 있으므로 이상은 올림, 이하는 내림하면 비교 결과가 실수 비교와 같다
+        self.threshold[i] = to_fixed(rule.trigger_price, dec, "ceil" if rising else "floor")
+        self.rising[i] = rising
+        self.armed[i] = rule.armed
+        self.live[i] = not rule.done
+
+    def remove(self, key):
+        """규칙 제외 (칸은 비워 두고 재구성 때 정리). 반환: 제외 여부"""
+        i = self.pos.pop(key, None)
+        if i is None:
+            return False
+        self.rules[i] = None
+        self.live[i] = False
+        self.holes += 1
+        return True
+
+    def candidates(self, board):
+        """이번 시세로 update()가 필요한 규칙 번호: (감시 중 & 조건 충족) 또는 재감시 대기"""
+        np = self._np
+        n = len(self.rules)
+        market, threshold = self.market[:n], self.threshold[:n]
+        p = board.ticks[market]
+        valid = board.has[market] & self.live[:n]
+        met = np.where(self.rising[:n], p >= threshold, p <= threshold)
+        return np.flatnonzero(valid & (met | ~self.armed[:n]))
+
+    def mark(self, i, rule):
+        self.armed[i] = rule.armed
+        self.live[i] = not rule.done
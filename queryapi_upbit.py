@@ -0,0 +1,73 @@
+# queryapi_upbit.py - 감시 상태 조회용 읽기 전용 로컬 HTTP API
+# created : 2026-10-19
+# 감시 루프가 주기마다 publish()로 응답 본문(JSON bytes)을 미리 만들어 두고,
+# 요청 스레드는 그 bytes만 돌려준다. 조회가 업비트 API 호출/엑셀 재로드를 일으키거나 감시 주기를 늦추지 않는다.
+#
+# 예: curl http://127.0.0.1:8765/rules
+
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def _encode(value):
+    """응답 본문 미리 만들기: str → text/plain, 그 외 → JSON"""
+    if isinstance(value, str):
+        return value.encode("utf-8"), "text/plain; charset=utf-8"
+    return json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"), "application/json; charset=utf-8"
+
+
+class QueryServer:
+    """GET 전용 HTTP 서버. publish({경로: 값})로 응답 전체를 교체 (요청 처리 중에도 안전)"""
+
+    def __init__(self, port, host="127.0.0.1"):
+        self.host = host
+        self.port = port
+        self._responses = {}  # 경로 → (본문 bytes, Content-Type)
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        responses = self  # 핸들러에서 최신 응답 dict 참조용
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0].rstrip("/") or "/"
+                current = responses._responses
+                hit = current.get(path)
+                if hit is None:
+                    body, ctype = _encode({"error": "not found", "paths": sorted(current)})
+                    status = 404
+                else:
+                    body, ctype = hit
+                    status = 200
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"[조회 API] http://{self.host}:{self.port}/ 시작")
+        return self
+
+    def publish(self, views):
+        """감시 주기마다 호출. 값은 여기서 한 번만 직렬화하고 dict를 통째로 교체"""
+        responses = {path: _encode(value) for path, value in views.items()}
+        responses["/"] = _encode({"paths": sorted(views), "updated_at": time.time()})
+        self._responses = responses
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
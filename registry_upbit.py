@@ -0,0 +1,140 @@
+# registry_upbit.py - 원화시장 마켓 레지스트리 (/v1/market/all 응답 diff)
+# created : 2026-10-19
+# 이전 응답과 비교해 신규 상장/상장 폐지/유의종목 지정·해제를 이벤트로 발생시키고,
+# 종목명 매핑은 바뀐 마켓만 증분 갱신한다.
+
+
+def _market_warning(m):
+    """유의종목 여부 정규화: market_warning(구) / market_event.warning(신) 둘 다 지원"""
+    if str(m.get("market_warning", "") or "").upper() == "CAUTION":
+        return "CAUTION"
+    event = m.get("market_event") or {}
+    if event.get("warning"):
+        return "CAUTION"
+    return "NONE"
+
+
+def _market_names(m):
+    """마켓 하나가 매핑되는 이름 목록 (한글명, 영문명, 심볼, 마켓코드, 심볼/KRW)"""
+    mkt = m["market"]
+    symbol = mkt.replace("KRW-", "")
+    names = [n for n in (m.get("korean_name", ""), m.get("english_name", "")) if n]
+    names += [symbol, mkt, f"{symbol}/KRW"]
+    return names
+
+
+class MarketRegistry:
+    """KRW 마켓 목록 + 종목명 인덱스.
+
+    update(raw)는 이전 목록과의 차이만 반영하고 이벤트 목록을 반환한다.
+    이벤트: {"type": "listed"|"delisted"|"warning", "market", "korean_name", "warning", "prev_warning"}
+    """
+
+    def __init__(self):
+        self.markets = {}  # market → 원본 dict (KRW만, 상장 순서 유지)
+        self.name_map = {}  # 종목명/심볼 → market
+        self._upper_map = {}  # 대문자 종목명 → market (대소문자 무시 조회용)
+        self._hooks = []
+        self.loaded = False
+        self.generation = 0  # 목록이 바뀔 때마다 증가 (종목명 재매핑 필요 여부 판단용)
+
+    @property
+    def krw_markets(self):
+        return list(self.markets)
+
+    def add_hook(self, fn):
+        """이벤트 발생 시 호출할 함수 등록 (fn(event))"""
+        self._hooks.append(fn)
+
+    def resolve(self, name):
+        """종목명/심볼/마켓코드 → market (대소문자 무시). 없으면 None"""
+        return self.name_map.get(name) or self._upper_map.get(str(name).upper())
+
+    def _index(self, m):
+        mkt = m["market"]
+        for n in _market_names(m):
+            self.name_map[n] = mkt
+            self._upper_map[n.upper()] = mkt
+
+    def _unindex(self, m):
+        mkt = m["market"]
+        for n in _market_names(m):
+            if self.name_map.get(n) == mkt:
+                del self.name_map[n]
+            if self._upper_map.get(n.upper()) == mkt:
+                del self._upper_map[n.upper()]
+
+    def load(self, raw):
+        """이벤트 없이 기준 목록 설정 (웜스타트 캐시 복원용)"""
+        self.markets = {}
+        self.name_map = {}
+        self._upper_map = {}
+        for m in raw:
+            if m["market"].startswith("KRW-"):
+                self.markets[m["market"]] = m
+                self._index(m)
+        self.loaded = True
+        self.generation += 1
+
+    def update(self, raw):
+        """새 /v1/market/all 응답 반영. 최초 호출은 기준 설정만 하고 이벤트 없음."""
+        if not self.loaded:
+            self.load(raw)
+            return []
+        fresh = {m["market"]: m for m in raw if m["market"].startswith("KRW-")}
+        events = []
+        renamed = False
+        for mkt in [k for k in self.markets if k not in fresh]:
+            old = self.markets.pop(mkt)
+            self._unindex(old)
+            events.append(self._event("delisted", old))
+        for mkt, m in fresh.items():
+            old = self.markets.get(mkt)
+            if old is None:
+                self.markets[mkt] = m
+                self._index(m)
+                events.append(self._event("listed", m))
+                continue
+            if _market_names(old) != _market_names(m):
+                self._unindex(old)
+                self._index(m)
+                renamed = True
+            prev_warning, warning = _market_warning(old), _market_warning(m)
+            self.markets[mkt] = m
+            if prev_warning != warning:
+                events.append(self._event("warning", m, prev_warning))
+        if events or renamed:
+            self.generation += 1
+        for e in events:
+            for fn in self._hooks:
+                try:
+                    fn(e)
+                except Exception as ex:
+                    print(f"[마켓 레지스트리] 이벤트 처리 오류: {ex}")
+        return events
+
+    @staticmethod
+    def _event(kind, m, prev_warning=None):
+        return {
+            "type": kind,
+            "market": m["market"],
+            "korean_name": m.get("korean_name", ""),
+            "warning": _market_warning(m),
+            "prev_warning": prev_warning,
+        }
+
+    def snapshot(self):
+        """현재 목록 원본 (웜스타트 캐시 저장용)"""
+        return list(self.markets.values())
+
+
+def format_market_event(event):
+    """텔레그램 메시지 본문"""
+    name = f"{event['korean_name']}({event['market']})" if event["korean_name"] else event["market"]
+    if event["type"] == "listed":
+        return f"🆕 [신규 상장] {name}" + (" ⚠️유의종목" if event["warning"] == "CAUTION" else "")
+    if event["type"] == "delisted":
+        return f"🚫 [상장 폐지/거래 중단] {name}"
+    if event["warning"] == "CAUTION":
+        return f"⚠️ [유의종목 지정] {name}"
+    return f"✅ [유의종목 해제] {name}"
@@ -0,0 +1,136 @@
+# report_upbit.py - 시간 단위 리포트 기록 스레드 (월별 파일 교체, 지난 달 gzip 압축, JSONL 병행 기록)
+# created : 2026-10-19
+# 감시 루프는 submit(summary, render)로 넘기기만 하고, Markdown 렌더링/파일 기록은 기록 스레드에서 한다.
+# 파일: {디렉터리}/{접두어}_{YYYYMM}.md  + 같은 이름 .jsonl (리포트 1건 = JSON 1줄, 후처리 도구용)
+#   월은 리포트 제출 시각 기준 (시작 시 1회 계산하지 않음). 달이 바뀌면 지난 달 파일을 .gz로 압축 후 삭제.
+#   keep_months > 0이면 그보다 오래된 압축 파일 삭제.
+
+import os
+import re
+import gzip
+import json
+import time
+import queue
+import shutil
+import threading
+
+QUEUE_SIZE = 64  # 디스크가 멈춰도 감시 루프가 막히지 않도록 대기열 상한 (초과분은 버림)
+_STOP = object()
+
+
+def _json_default(obj):
+    """numpy 값/배열, 집합 등 → JSON 호환 값"""
+    if hasattr(obj, "item") and getattr(obj, "ndim", 0) == 0:
+        return obj.item()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    return str(obj)
+
+
+def _month_index(yyyymm):
+    return int(yyyymm[:4]) * 12 + int(yyyymm[4:]) - 1
+
+
+class ReportWriter:
+    """리포트 기록 스레드. submit()은 대기열에 넣고 바로 반환"""
+
+    def __init__(self, directory, prefix, keep_months=0):
+        self.directory = directory
+        self.prefix = prefix
+        self.keep_months = keep_months
+        self._pattern = re.compile(rf"^{re.escape(prefix)}_(\d{{6}})\.(md|jsonl)(\.gz)?$")
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._month = None
+        self._md = None
+        self._jsonl = None
+        self.written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="report-writer", daemon=True)
+        self._thread.start()
+
+    def path(self, at=None, ext="md"):
+        """at(초) 시점 월의 리포트 파일 경로 (기본: 현재)"""
+        month = time.strftime("%Y%m", time.localtime(time.time() if at is None else at))
+        return os.path.join(self.directory, f"{self.prefix}_{month}.{ext}")
+
+    def submit(self, summary, render, at=None):
+        """summary: JSONL 1줄로 기록할 dict (제출 후 변경하지 않을 것), render(summary, at) → Markdown 문자열"""
+        at = time.time() if at is None else at
+        try:
+            self._queue.put_nowait((summary, render, at))
+        except queue.Full:
+            self.dropped += 1
+            print(f"[리포트 기록] 대기열 초과, 리포트 1건 버림 (누적 {self.dropped}건)")
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    self._close_files()
+                    return
+                self._write(*item)
+            except Exception as e:
+                print(f"[리포트 기록 오류] {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, summary, render, at):
+        month = time.strftime("%Y%m", time.localtime(at))
+        if month != self._month:
+            self._rotate(month)
+        text = render(summary, at)
+        record = json.dumps({"at": at, **summary}, ensure_ascii=False, default=_json_default)
+        self._md.write(text)
+        self._md.write("\n\n---\n\n")
+        self._md.flush()
+        self._jsonl.write(record + "\n")
+        self._jsonl.flush()
+        self.written += 1
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(at))}] Markdown 파일 저장 완료 → {self._md.name}")
+
+    def _close_files(self):
+        for f in (self._md, self._jsonl):
+            if f is not None:
+                f.close()
+        self._md = self._jsonl = None
+
+    def _rotate(self, month):
+        """현재 월 파일로 교체하고 지난 달 파일 압축 (시작 직후 첫 기록에도 실행 → 재시작 사이 지난 달도 처리)"""
+        self._close_files()
+        os.makedirs(self.directory, exist_ok=True)
+        self._month = month
+        self._md = open(os.path.join(self.directory, f"{self.prefix}_{month}.md"), "a", encoding="utf-8")
+        self._jsonl = open(os.path.join(self.directory, f"{self.prefix}_{month}.jsonl"), "a", encoding="utf-8")
+        self._compress_closed(month)
+
+    def _compress_closed(self, current):
+        cur = _month_index(current)
+        for name in sorted(os.listdir(self.directory)):
+            m = self._pattern.match(name)
+            if m is None or m.group(1) >= current:
+                continue
+            path = os.path.join(self.directory, name)
+            if m.group(3):
+                if self.keep_months > 0 and cur - _month_index(m.group(1)) > self.keep_months:
+                    os.remove(path)
+                    print(f"[리포트 기록] 보관 기간 지난 파일 삭제: {name}")
+                continue
+            # 이미 .gz가 있으면 gzip 멤버로 이어 붙임 (읽을 때 하나로 풀림)
+            with open(path, "rb") as src, gzip.open(path + ".gz", "ab") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+            print(f"[리포트 기록] 지난 달 파일 압축: {name} → {name}.gz")
+
+    def close(self, timeout=10):
+        """대기 중인 리포트를 모두 기록한 뒤 종료 (timeout 초까지 대기).
+        디스크가 멈춰 대기열이 찬 상태면 종료 신호를 넣지 못해도 그대로 반환 (종료 처리가 멈추지 않도록)"""
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print(f"[리포트 기록] 종료 대기 초과, 미기록 {self._queue.qsize()}건")
+            return
+        self._thread.join(max(0, deadline - time.monotonic()))
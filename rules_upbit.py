@@ -0,0 +1,500 @@
+# rules_upbit.py - 종목별 감시 규칙 (상태 유지형)
+# created : 2026-10-19
+# 감시조건(열):
+#   이상 / 이하   : 감시가격(또는 기준가격+비율) 도달 (기존)
+#   트레일링      : 감시 시작 후 고점 대비 비율(%) 하락 시
+#   기준대비      : 기준가격 대비 비율(%) 도달 시 (+면 상승, -면 하락 방향)
+#   거래량급증    : 주기당 거래량이 평균(EMA)의 비율(배) 이상일 때
+# 재감시(%) 열이 있으면 알림 후 해당 폭만큼 되돌아오고 대기(분)가 지나면 다시 감시 (없으면 1회 알림 후 제외)
+# 규칙마다 상태를 갖고 시세 1건당 O(1)로 갱신한다.
+# 가격은 절사 없이 보관 (원 미만 코인). 규칙이 많으면 가격 조건 규칙은 고정소수점 배열로 일괄 비교 (price_upbit)
+# 일자가 미래면 그 날짜부터 감시 시작, 만료일(선택 열) 또는 (수정일/일자 + RULE_TTL_DAYS)이 지나면 만료.
+# 시작/만료 시각은 타이밍 휠(wheel_upbit)에 예약해 해당 시각이 된 규칙만 감시 대상에 넣고 뺀다.
+
+import re
+import math
+import time
+import datetime
+
+from price_upbit import exact_price, round_to_tick
+
+RULE_KINDS = ("이상", "이하", "트레일링", "기준대비", "거래량급증")
+VOLUME_EMA_WINDOW = 30  # 거래량 평균 기간 (감시 주기 수)
+VOLUME_WARMUP = 5  # 평균이 안정될 때까지 판정 보류 (주기 수)
+STATIC_KINDS = ("이상", "이하", "기준대비")  # 발동가가 고정인 규칙 (일괄 비교 대상)
+VECTOR_MIN_RULES = 2000  # 규칙이 이 이상이면 numpy 일괄 비교 사용
+
+
+def parse_number(raw):
+    """'₩1,234원', '5%', '3배' 등 → float. 숫자 아님/빈칸은 None"""
+    if raw is None:
+        return None
+    s = str(raw)
+    for ch in ("₩", ",", "원", "%", "배"):
+        s = s.replace(ch, "")
+    s = s.strip()
+    if not s or s in ("None", "NaT"):
+        return None
+    try:
+        v = float(s)
+    except ValueError:
+        return None
+    return v if math.isfinite(v) else None
+
+
+def parse_date(raw, end_of_day=False):
+    """날짜 셀(datetime/date/'2026-03-01'/'2026.3.1 09:00'/20260301) → timestamp. 날짜 아님/빈칸은 None.
+    end_of_day: 시각 없는 날짜는 그날 끝(다음날 0시)으로 (만료일용)"""
+    if raw is None:
+        return None
+    if isinstance(raw, datetime.datetime):
+        dt = raw
+        date_only = dt.time() == datetime.time(0)  # 엑셀 날짜 셀은 0시 datetime
+    elif isinstance(raw, datetime.date):
+        dt, date_only = datetime.datetime.combine(raw, datetime.time(0)), True
+    else:
+        s = str(raw).strip()
+        m = re.match(r"(\d{4})\D+(\d{1,2})\D+(\d{1,2})\D*?(?:(\d{1,2}):(\d{2})(?::(\d{2}))?)?\s*$", s)
+        if m is None:
+            m = re.match(r"(\d{4})(\d{2})(\d{2})()()()(?:\.0)?$", s)
+        if m is None:
+            return None
+        y, mo, d, hh, mm, ss = m.groups()
+        try:
+            dt = datetime.datetime(int(y), int(mo), int(d), int(hh or 0), int(mm or 0), int(ss or 0))
+        except ValueError:
+            return None
+        date_only = not hh
+    if date_only and end_of_day:
+        dt += datetime.timedelta(days=1)
+    return dt.timestamp()
+
+
+def rule_schedule(row, ttl=0):
+    """행 → (감시 시작, 만료) timestamp. 시작 = 일자, 만료 = 만료일 또는 (수정일/일자 + ttl초). 없으면 None"""
+    starts_at = parse_date(row.get("일자"))
+    expires_at = parse_date(row.get("만료일"), end_of_day=True)
+    if expires_at is None and ttl > 0:
+        base = parse_date(row.get("수정일")) or starts_at
+        if base is not None:
+            expires_at = base + ttl
+    return starts_at, expires_at
+
+
+def parse_threshold(row):
+    """행에서 감시가격 계산. 감시가격(숫자) 또는 기준가격+비율.
+    반환: 가격(정수면 int, 원 미만이면 float) 또는 None(파싱 실패/템플릿 행)
+    기준가격+비율은 호가 단위로 반올림
+    """
+    watch_raw = row.get("감시가격")
+    ref_raw = row.get("기준가격")
+    ratio_raw = row.get("비율")
+
+    # 감시가격이 숫자면 사용
+    if watch_raw is not None and str(watch_raw).strip() not in ("", "None", "NaT"):
+        s = str(watch_raw).replace("₩", "").replace(",", "").replace("원", "").strip()
+        if s and s.replace(".", "", 1).replace("-", "", 1).isdigit():
+            return exact_price(s)
+
+    # 기준가격 + 비율로 계산 (기준가격이 숫자인 경우만)
+    if ref_raw is None or ratio_raw is None:
+        return None
+    ref_str = str(ref_raw).strip()
+    if not ref_str or ref_str in ("None", "NaT") or not ref_str.replace(".", "", 1).replace(",", "").replace("-", "", 1).isdigit():
+        return None  # "20일선" 등 텍스트는 미지원
+    ref = parse_number(ref_raw)
+    ratio = parse_number(ratio_raw)
+    if ref is None or ratio is None:
+        return None
+    return round_to_tick(ref * (1 + ratio / 100))
+
+
+def format_krw(price):
+    """가격 표시: 100원 이상은 정수, 미만은 소수점 표시"""
+    if price is None:
+        return "-"
+    if abs(price) >= 100:
+        return f"{price:,.0f}"
+    return f"{price:,.8f}".rstrip("0").rstrip(".")
+
+
+class WatchRule:
+    """감시 규칙 1건 + 상태 (고점, 거래량 평균, 알림/재감시 여부)"""
+
+    __slots__ = (
+        "key", "market", "name", "reason", "kind", "threshold", "ref", "ratio", "rearm", "cooldown",
+        "armed", "done", "fired_at", "peak", "vol_avg", "vol_n", "last_acc", "starts_at", "expires_at",
+    )
+
+    def __init__(self, key, market, kind, threshold=None, ref=None, ratio=None, rearm=None, cooldown=0.0):
+        self.key = key
+        self.name, self.reason = key
+        self.market = market
+        self.kind = kind
+        self.threshold = threshold
+        self.ref = ref
+        self.ratio = ratio
+        self.rearm = rearm  # 재감시 폭(%). None이면 1회 알림 후 제외
+        self.cooldown = cooldown  # 재감시 대기(초)
+        self.armed = True
+        self.done = False
+        self.fired_at = None
+        self.peak = None
+        self.vol_avg = None
+        self.vol_n = 0
+        self.last_acc = None
+        self.starts_at = None  # 감시 시작 (일자가 미래인 경우)
+        self.expires_at = None  # 만료 (만료일 / RULE_TTL_DAYS)
+
+    @property
+    def signature(self):
+        """정의가 같으면 상태 유지 (엑셀/DB 재로드 시 비교용)"""
+        return (self.market, self.kind, self.threshold, self.ref, self.ratio, self.rearm, self.cooldown)
+
+    def state(self):
+        """평가로 바뀌는 상태 (병렬 평가 워커 → 부모 사본 반영용)"""
+        return (self.armed, self.done, self.fired_at, self.peak, self.vol_avg, self.vol_n, self.last_acc)
+
+    def set_state(self, state):
+        self.armed, self.done, self.fired_at, self.peak, self.vol_avg, self.vol_n, self.last_acc = state
+
+    @property
+    def trigger_price(self):
+        """현재 기준 발동 가격 (거래량 규칙은 None)"""
+        if self.kind in ("이상", "이하"):
+            return self.threshold
+        if self.kind == "트레일링":
+            return None if self.peak is None else self.peak * (1 - abs(self.ratio) / 100)
+        if self.kind == "기준대비":
+            return self.ref * (1 + self.ratio / 100)
+        return None
+
+    def _rising(self):
+        return self.kind == "이상" or (self.kind == "기준대비" and self.ratio >= 0)
+
+    def _met(self, price, vol):
+        if self.kind == "거래량급증":
+            return vol is not None and self.vol_n >= VOLUME_WARMUP and vol >= self.vol_avg * self.ratio > 0
+        trigger = self.trigger_price
+        if trigger is None:
+            return False
+        return price >= trigger if self._rising() else price <= trigger
+
+    def _rearmed(self, price, vol, now_ts):
+        if now_ts - self.fired_at < self.cooldown:
+            return False
+        band = self.rearm / 100
+        if self.kind == "거래량급증":
+            return vol is not None and vol < self.vol_avg * self.ratio * (1 - band)
+        trigger = self.trigger_price
+        if self._rising():
+            return price < trigger * (1 - band)
+        return price > trigger * (1 + band)
+
+    def update(self, price, acc_volume, now_ts):
+        """시세 1건 반영. 발동 시 설명 문자열, 아니면 None"""
+        if self.done:
+            return None
+        vol = None
+        if self.kind == "거래량급증" and acc_volume is not None:
+            # 누적거래량(UTC 일 단위) 차분 = 이번 주기 거래량. 날짜 바뀌어 줄면 누적값 자체가 주기 거래량
+            if self.last_acc is not None:
+                vol = acc_volume - self.last_acc if acc_volume >= self.last_acc else acc_volume
+            self.last_acc = acc_volume
+        if self.kind == "트레일링" and (self.peak is None or price > self.peak):
+            self.peak = price
+
+        fired = None
+        if self.armed:
+            if self._met(price, vol):
+                fired = self.describe_fire(price, vol)
+                self.fired_at = now_ts
+                if self.rearm is None:
+                    self.done = True
+                else:
+                    self.armed = False
+        elif self._rearmed(price, vol, now_ts):
+            self.armed = True
+            if self.kind == "트레일링":
+                self.peak = price
+
+        if vol is not None:
+            alpha = 2 / (VOLUME_EMA_WINDOW + 1)
+            self.vol_avg = vol if self.vol_avg is None else self.vol_avg + alpha * (vol - self.vol_avg)
+            self.vol_n += 1
+        return fired
+
+    def distance(self, price):
+        """현재가 → 발동 가격까지 남은 비율(%). +면 상승, -면 하락해야 발동. 계산 불가(거래량 규칙 등)면 None"""
+        trigger = self.trigger_price
+        if trigger is None or not price:
+            return None
+        return (trigger - price) / price * 100
+
+    def view(self, price=None):
+        """조회 API용 상태 dict"""
+        distance = self.distance(price)
+        return {
+            "name": self.name,
+            "reason": self.reason,
+            "market": self.market,
+            "kind": self.kind,
+            "describe": self.describe(),
+            "trigger_price": self.trigger_price,
+            "price": price,
+            "distance_pct": None if distance is None else round(distance, 4),
+            "armed": self.armed,
+            "done": self.done,
+            "fired_at": self.fired_at,
+            "peak": self.peak,
+            "volume_avg": self.vol_avg,
+            "starts_at": self.starts_at,
+            "expires_at": self.expires_at,
+        }
+
+    def describe(self):
+        """감시현황 표시용 한 줄"""
+        if self.kind in ("이상", "이하"):
+            return f"{format_krw(self.threshold)}원 {self.kind}"
+        if self.kind == "트레일링":
+            return f"고점 대비 -{abs(self.ratio):g}% 트레일링"
+        if self.kind == "기준대비":
+            return f"기준가격 {format_krw(self.ref)}원 대비 {self.ratio:+g}%"
+        return f"거래량 평균 {self.ratio:g}배 이상"
+
+    def describe_fire(self, price, vol):
+        if self.kind in ("이상", "이하"):
+            return f"감시가격 {self.kind} {format_krw(self.threshold)}원 | 현재가 {format_krw(price)}원"
+        if self.kind == "트레일링":
+            return (
+                f"고점 {format_krw(self.peak)}원 대비 -{abs(self.ratio):g}% "
+                f"({format_krw(self.trigger_price)}원) 이탈 | 현재가 {format_krw(price)}원"
+            )
+        if self.kind == "기준대비":
+            pct = (price - self.ref) / self.ref * 100
+            return f"기준가격 {format_krw(self.ref)}원 대비 {pct:+.2f}% (목표 {self.ratio:+g}%) | 현재가 {format_krw(price)}원"
+        return f"거래량 {vol:,.2f} (평균 {self.vol_avg:,.2f}의 {vol / self.vol_avg:.1f}배) | 현재가 {format_krw(price)}원"
+
+
+def build_rule(row, market, ttl=0):
+    """엑셀/DB 행 → WatchRule (시작/만료 시각 포함). 감시 불가(조건/가격 없음) 행은 None"""
+    rule = _build_rule(row, market)
+    if rule is not None:
+        rule.starts_at, rule.expires_at = rule_schedule(row, ttl)
+    return rule
+
+
+def _build_rule(row, market):
+    name = str(row.get("종목명", "") or "").strip()
+    reason = str(row.get("감시사유", "") or "").strip()
+    kind = str(row.get("감시조건", "") or "").strip()
+    rearm = parse_number(row.get("재감시(%)"))
+    cooldown = (parse_number(row.get("대기(분)")) or 0) * 60
+    opts = {"rearm": rearm if rearm is not None and rearm >= 0 else None, "cooldown": cooldown}
+    key = (name, reason)
+    if kind in ("이상", "이하"):
+        threshold = parse_threshold(row)
+        if threshold is None:
+            return None
+        return WatchRule(key, market, kind, threshold=threshold, **opts)
+    ratio = parse_number(row.get("비율"))
+    if ratio is None:
+        return None
+    if kind == "트레일링" and ratio != 0:
+        return WatchRule(key, market, kind, ratio=ratio, **opts)
+    if kind == "기준대비":
+        ref = parse_number(row.get("기준가격"))
+        if not ref:
+            return None
+        return WatchRule(key, market, kind, ref=ref, ratio=ratio, **opts)
+    if kind == "거래량급증" and ratio > 0:
+        return WatchRule(key, market, kind, ratio=ratio, **opts)
+    return None
+
+
+class RuleBook:
+    """감시 규칙 집합. sync()는 정의가 바뀐 규칙만 교체하고 나머지는 상태 유지.
+    rules는 감시 중인 규칙만. 시작 전(pending)/만료(expired) 규칙은 따로 두고 advance()로 옮긴다."""
+
+    def __init__(self, ttl=0):
+        self.rules = {}  # (종목명, 감시사유) → WatchRule
+        self.pending = {}  # 일자가 아직 안 된 규칙
+        self.expired = {}  # 만료된 규칙 (평가 제외, 감시현황 표시용)
+        self.ttl = ttl  # 수정일/일자 기준 만료(초). 0이면 만료일 열만 사용
+        self._wheel = None  # wheel_upbit.TimingWheel (시작/만료 예약이 있을 때만)
+        self._board = None  # price_upbit.PriceBoard (규칙이 많을 때만)
+        self._index = None  # price_upbit.ThresholdIndex (규칙 변경/자릿수 변경 시 재구성)
+        self._dynamic = {}  # 매 시세 갱신이 필요한 규칙 (트레일링, 거래량급증)
+
+    def _find(self, key):
+        return self.rules.get(key) or self.pending.get(key) or self.expired.get(key)
+
+    def _place(self, rule, now_ts):
+        """시작/만료 시각에 따라 rules/pending/expired 중 하나에 두고 다음 시각을 휠에 예약. 반환: 놓인 dict"""
+        key = rule.key
+        if rule.expires_at is not None and rule.expires_at <= now_ts:
+            target, due = self.expired, None
+        elif rule.starts_at is not None and rule.starts_at > now_ts:
+            target, due = self.pending, rule.starts_at
+        else:
+            target, due = self.rules, rule.expires_at
+        target[key] = rule
+        if due is not None:
+            if self._wheel is None:
+                from wheel_upbit import TimingWheel
+
+                self._wheel = TimingWheel(now=now_ts)
+            self._wheel.schedule(key, due)
+        elif self._wheel is not None:
+            self._wheel.cancel(key)
+        return target
+
+    def _drop(self, key):
+        """세 집합과 휠에서 제거 (색인은 호출 측에서 처리). 반환: (WatchRule, 있던 dict) 또는 (None, None)"""
+        if self._wheel is not None:
+            self._wheel.cancel(key)
+        for bucket in (self.rules, self.pending, self.expired):
+            rule = bucket.pop(key, None)
+            if rule is not None:
+                return rule, bucket
+        return None, None
+
+    def sync(self, rows, resolve, now_ts=None):
+        """행 목록 반영. resolve(row) → market. 반환: 마켓 매핑 실패 행 (종목명, 감시사유) 목록"""
+        now_ts = time.time() if now_ts is None else now_ts
+        seen = set()
+        unresolved = []
+        for row in rows:
+            market = resolve(row)
+            name = str(row.get("종목명", "") or "").strip()
+            reason = str(row.get("감시사유", "") or "").strip()
+            if not market:
+                unresolved.append((name, reason))
+                continue
+            rule = build_rule(row, market, self.ttl)
+            if rule is None:
+                continue  # 템플릿/비율 행 등 스킵
+            seen.add(rule.key)
+            old = self._find(rule.key)
+            if old is not None and old.signature == rule.signature:
+                if (old.starts_at, old.expires_at) == (rule.starts_at, rule.expires_at):
+                    continue
+                # 날짜만 바뀜 → 상태 유지하고 다시 배치
+                old.starts_at, old.expires_at = rule.starts_at, rule.expires_at
+                rule = old
+            was_active = rule.key in self.rules
+            self._drop(rule.key)
+            if self._place(rule, now_ts) is self.rules or was_active:
+                self._index = None
+        for key in [k for bucket in (self.rules, self.pending, self.expired) for k in bucket if k not in seen]:
+            if self._drop(key)[1] is self.rules:
+                self._index = None
+        return unresolved
+
+    def add(self, rule, now_ts=None):
+        """규칙 1건 추가/교체 (전체 sync 없이, 텔레그램 명령 등). 정의가 같으면 상태 유지. 반환: 반영 여부"""
+        now_ts = time.time() if now_ts is None else now_ts
+        old = self._find(rule.key)
+        if old is not None and old.signature == rule.signature and (old.starts_at, old.expires_at) == (rule.starts_at, rule.expires_at):
+            return False
+        if self._drop(rule.key)[1] is self.rules:
+            self._unindex(old)
+        if self._place(rule, now_ts) is self.rules:
+            self._reindex(rule)
+        return True
+
+    def remove(self, key):
+        """규칙 1건 삭제 (시작 전/만료 규칙 포함). 반환: 삭제한 WatchRule 또는 None"""
+        rule, bucket = self._drop(key)
+        if bucket is self.rules:
+            self._unindex(rule)
+        return rule
+
+    def advance(self, now_ts):
+        """시작/만료 시각이 된 규칙만 옮김 (휠에서 만기된 키만 확인). 반환: (감시 시작 목록, 만료 목록)"""
+        if self._wheel is None:
+            return [], []
+        activated, expired = [], []
+        for key in self._wheel.advance(now_ts):
+            rule = self.pending.pop(key, None)
+            if rule is None:
+                rule = self.rules.pop(key, None)
+                if rule is None:
+                    continue
+                self._unindex(rule)
+            target = self._place(rule, now_ts)
+            if target is self.rules:
+                self._reindex(rule)
+                activated.append(rule)
+            elif target is self.expired:
+                expired.append(rule)
+        return activated, expired
+
+    def _reindex(self, rule):
+        if self._index is None:
+            return
+        if rule.kind in STATIC_KINDS:
+            self._index.append(rule, self._board)
+        else:
+            self._dynamic[rule.key] = rule
+
+    def _unindex(self, rule):
+        if self._index is None:
+            return
+        if rule.kind not in STATIC_KINDS:
+            self._dynamic.pop(rule.key, None)
+        elif self._index.remove(rule.key) and self._index.holes > max(64, len(self._index.rules) // 2):
+            self._index = None  # 빈칸이 많으면 다음 평가 때 재구성
+
+    def evaluate(self, snapshot, now_ts):
+        """시세 스냅샷 { market: {price, acc_volume, ...} } 반영 → 발동 [(WatchRule, 설명)]"""
+        if len(self.rules) >= VECTOR_MIN_RULES:
+            return self._evaluate_vectorized(snapshot, now_ts)
+        fired = []
+        for rule in self.rules.values():
+            if rule.done:
+                continue
+            tick = snapshot.get(rule.market)
+            if tick is None:
+                continue
+            detail = rule.update(tick["price"], tick.get("acc_volume"), now_ts)
+            if detail:
+                fired.append((rule, detail))
+        return fired
+
+    def _evaluate_vectorized(self, snapshot, now_ts):
+        """가격 조건 규칙은 고정소수점 배열로 일괄 비교해 충족/재감시 대기 규칙만 update()"""
+        from price_upbit import PriceBoard, ThresholdIndex
+
+        if self._board is None:
+            self._board = PriceBoard()
+        board = self._board
+        board.update(snapshot)
+        if self._index is None or board.rescaled:
+            static = [r for r in self.rules.values() if r.kind in STATIC_KINDS]
+            self._index = ThresholdIndex(static, board)
+            self._dynamic = {k: r for k, r in self.rules.items() if r.kind not in STATIC_KINDS}
+            board.rescaled = False
+        fired = []
+        index = self._index
+        for i in index.candidates(board):
+            rule = index.rules[i]
+            tick = snapshot[rule.market]
+            detail = rule.update(tick["price"], tick.get("acc_volume"), now_ts)
+            index.mark(i, rule)
+            if detail:
+                fired.append((rule, detail))
+        for rule in self._dynamic.values():
+            if rule.done:
+                continue
+            tick = snapshot.get(rule.market)
+            if tick is None:
+                continue
+            detail = rule.update(tick["price"], tick.get("acc_volume"), now_ts)
+            if detail:
+                fired.append((rule, detail))
+        return fired
+
+    def done_keys(self):
+        """1회 알림 후 제외된 규칙 키"""
+        return {k for k, r in self.rules.items() if r.done}
@@ -0,0 +1,339 @@
+# rulestore_upbit.py - 종목별 감시 규칙 저장소 (엑셀 / SQLite)
+# created : 2026-10-19
+# LIST_FILE 확장자로 선택: .xlsx → 엑셀(기존), .db/.sqlite → SQLite
+# SQLite는 변경마다 버전을 올려 "버전 N 이후 변경분"만 조회할 수 있다.
+#
+# 엑셀 → SQLite: python rulestore_upbit.py import upbitMA.list.xlsx upbitMA.list.db  (마켓 코드는 업비트 마켓 목록으로 채움)
+# SQLite → 엑셀: python rulestore_upbit.py export upbitMA.list.db upbitMA.list.xlsx
+
+import os
+import sys
+import datetime
+import sqlite3
+import threading
+
+# 엑셀 열 ↔ SQLite 컬럼
+RULE_COLUMNS = [
+    ("감시중", "active"),
+    ("종목명", "name"),
+    ("감시사유", "reason"),
+    ("감시가격", "watch_price"),
+    ("감시조건", "condition"),
+    ("일자", "date"),
+    ("기준가격", "ref_price"),
+    ("비율", "ratio"),
+    ("수정일", "modified"),
+    ("비고", "note"),
+    ("재감시(%)", "rearm"),  # 선택 열 (rules_upbit 재감시 폭)
+    ("대기(분)", "cooldown"),  # 선택 열 (rules_upbit 재감시 대기)
+    ("만료일", "expires"),  # 선택 열 (rules_upbit 감시 만료)
+]
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+def _is_active_row(row):
+    status = str(row.get("감시중", "") or "").strip().upper()
+    name = str(row.get("종목명", "") or "").strip()
+    return status == "O" and bool(name)
+
+
+class RuleSource:
+    """감시 규칙 저장소 인터페이스.
+
+    load_active() → 감시중=O 행 목록 (엑셀 열 이름 키 + "_id")
+    changes_since(version) → (새 버전, 변경/추가 행, 삭제 id 목록). 증분 불가 시 None
+    """
+
+    version = 0
+
+    def load_active(self):
+        raise NotImplementedError
+
+    def changes_since(self, version):
+        return None
+
+
+class ExcelRuleSource(RuleSource):
+    """upbitMA.list.xlsx. 파일 수정시각이 바뀐 경우에만 다시 읽는다."""
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 0
+        self._mtime = None
+        self._active = []
+
+    def _stat(self):
+        return os.stat(self.path).st_mtime_ns
+
+    def load_active(self):
+        mtime = self._stat()
+        if mtime == self._mtime:
+            return self._active
+        rows = read_excel_rows(self.path)
+        if rows is None:
+            return []
+        self._active = [r for r in rows if _is_active_row(r)]
+        self._mtime = mtime
+        self.version += 1
+        return self._active
+
+    def changes_since(self, version):
+        # 엑셀은 행 단위 변경 추적이 불가 → 파일이 바뀌었으면 전체 재로드
+        if self._mtime is not None and self._stat() == self._mtime:
+            return self.version, [], []
+        return None
+
+
+def read_excel_rows(file_path):
+    """엑셀 전체 행 로드 (헤더 = 1행). openpyxl 미설치 시 None"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        print("[종목별 감시] openpyxl 미설치. pip install openpyxl")
+        return None
+    wb = load_workbook(file_path, data_only=True, read_only=True)
+    try:
+        ws = wb.active
+        ws.reset_dimensions()  # 저장된 범위 정보가 틀린 파일 대비
+        rows_iter = ws.iter_rows(values_only=True)
+        header = list(next(rows_iter, []) or [])
+        rows = []
+        for n, values in enumerate(rows_iter, start=2):
+            row_dict = {"_id": f"xlsx:{n}"}
+            for idx, value in enumerate(values):
+                if idx < len(header) and header[idx]:
+                    row_dict[header[idx]] = value
+            rows.append(row_dict)
+    finally:
+        wb.close()
+    return rows
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+CREATE TABLE IF NOT EXISTS rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    active INTEGER NOT NULL DEFAULT 1,
+    market TEXT,
+    name TEXT NOT NULL,
+    reason TEXT,
+    watch_price,
+    condition TEXT,
+    date TEXT,
+    ref_price,
+    ratio,
+    modified TEXT,
+    note TEXT,
+    rearm,
+    cooldown,
+    expires TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_rules_active_market ON rules (active, market);
+CREATE INDEX IF NOT EXISTS idx_rules_version ON rules (version);
+CREATE TABLE IF NOT EXISTS deleted_rules (id INTEGER PRIMARY KEY, version INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_deleted_rules_version ON deleted_rules (version);
+
+-- 외부 도구(sqlite3 CLI 등)로 직접 수정해도 버전이 올라가도록 트리거로 관리
+CREATE TRIGGER IF NOT EXISTS rules_ai AFTER INSERT ON rules BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'version';
+    UPDATE rules SET version = (SELECT value FROM meta WHERE key = 'version') WHERE id = NEW.id;
+    DELETE FROM deleted_rules WHERE id = NEW.id;
+END;
+DROP TRIGGER IF EXISTS rules_au;
+-- 버전 열만 바뀐 UPDATE(rules_ai/rules_au가 직접 쓰는 것)는 건너뜀 → 변경 1건당 버전 1회 증가
+CREATE TRIGGER rules_au AFTER UPDATE ON rules WHEN NEW.version IS OLD.version BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'version';
+    UPDATE rules SET version = (SELECT value FROM meta WHERE key = 'version') WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS rules_ad AFTER DELETE ON rules BEGIN
+    UPDATE meta SET value = value + 1 WHERE key = 'version';
+    INSERT OR REPLACE INTO deleted_rules (id, version) VALUES (OLD.id, (SELECT value FROM meta WHERE key = 'version'));
+END;
+"""
+
+
+def _to_db_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    return value
+
+
+class SQLiteRuleSource(RuleSource):
+    """SQLite 규칙 저장소. (active, market) 인덱스, 버전 기반 증분 조회, 가져올 때 마켓 코드를 채워 감시 시 종목명 매핑 생략."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 이전 버전 DB에 없는 열 추가
+        cols = {r[1] for r in self._conn.execute("PRAGMA table_info(rules)")}
+        if "name" in cols:
+            for _, field in RULE_COLUMNS:
+                if field not in cols:
+                    self._conn.execute(f"ALTER TABLE rules ADD COLUMN {field}")
+        self._conn.executescript(_SCHEMA)
+
+    @property
+    def version(self):
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    @staticmethod
+    def _to_row(rec):
+        row = {"_id": rec["id"], "_market": rec["market"]}
+        for col, field in RULE_COLUMNS:
+            row[col] = rec[field]
+        row["감시중"] = "O" if rec["active"] else "X"
+        return row
+
+    def load_active(self):
+        with self._lock:
+            recs = self._conn.execute("SELECT * FROM rules WHERE active = 1 ORDER BY id").fetchall()
+        return [self._to_row(r) for r in recs if str(r["name"] or "").strip()]
+
+    def changes_since(self, version):
+        with self._lock:
+            cur = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            if cur == version:
+                return cur, [], []
+            recs = self._conn.execute("SELECT * FROM rules WHERE version > ?", (version,)).fetchall()
+            removed = [
+                r[0] for r in self._conn.execute("SELECT id FROM deleted_rules WHERE version > ?", (version,))
+            ]
+        changed = [self._to_row(r) for r in recs]
+        return cur, changed, removed
+
+    def upsert(self, row, market=None):
+        """행 추가/수정 (row["_id"]가 있으면 수정). 반환: id"""
+        values = {field: _to_db_value(row.get(col)) for col, field in RULE_COLUMNS}
+        values["active"] = 1 if _is_active_row(row) else 0
+        values["market"] = market if market is not None else row.get("_market")
+        rule_id = row.get("_id")
+        with self._lock:
+            if isinstance(rule_id, int):
+                sets = ", ".join(f"{k} = ?" for k in values)
+                self._conn.execute(f"UPDATE rules SET {sets} WHERE id = ?", (*values.values(), rule_id))
+                return rule_id
+            cols = ", ".join(values)
+            marks = ", ".join("?" for _ in values)
+            cur = self._conn.execute(f"INSERT INTO rules ({cols}) VALUES ({marks})", tuple(values.values()))
+            return cur.lastrowid
+
+    def import_excel(self, xlsx_path, resolve=None):
+        """엑셀 전체 행 가져오기 (감시중 X 행 포함). resolve(종목명) → market 이 있으면 market 채움.
+        한 트랜잭션으로 반영하고, 도중에 실패하면 전부 되돌림"""
+        rows = read_excel_rows(xlsx_path) or []
+        count = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+        try:
+            for r in rows:
+                if not str(r.get("종목명", "") or "").strip():
+                    continue
+                r = {k: v for k, v in r.items() if k != "_id"}
+                market = resolve(str(r["종목명"]).strip()) if resolve else None
+                self.upsert(r, market=market)
+                count += 1
+        except BaseException:
+            with self._lock:
+                self._conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self._conn.execute("COMMIT")
+        return count
+
+    def export_excel(self, xlsx_path):
+        """기존 upbitMA.list.xlsx 열 구성으로 내보내기 (감시중 X 행 포함)"""
+        from openpyxl import Workbook
+
+        with self._lock:
+            recs = self._conn.execute("SELECT * FROM rules ORDER BY id").fetchall()
+        wb = Workbook()
+        ws = wb.active
+        ws.append([col for col, _ in RULE_COLUMNS])
+        for rec in recs:
+            row = self._to_row(rec)
+            ws.append([row[col] for col, _ in RULE_COLUMNS])
+        wb.save(xlsx_path)
+        return len(recs)
+
+    def close(self):
+        self._conn.close()
+
+
+_sources = {}
+
+
+def get_rule_source(path):
+    """경로별 규칙 저장소 (프로세스 내 1개 유지: 엑셀 수정시각/SQLite 연결 재사용)"""
+    src = _sources.get(path)
+    if src is None:
+        if path.lower().endswith(SQLITE_EXTENSIONS):
+            src = SQLiteRuleSource(path)
+        else:
+            src = ExcelRuleSource(path)
+        _sources[path] = src
+    return src
+
+
+class ActiveRules:
+    """감시중 규칙 캐시. refresh()는 저장소가 지원하면 변경분만 반영한다."""
+
+    def __init__(self, source):
+        self.source = source
+        self.version = None
+        self.rows = {}  # _id → row
+        self.generation = 0  # 감시중 행이 바뀔 때마다 증가
+
+    def refresh(self):
+        """변경 있으면 True"""
+        if self.version is not None:
+            delta = self.source.changes_since(self.version)
+            if delta is not None:
+                new_version, changed, removed = delta
+                for rule_id in removed:
+                    self.rows.pop(rule_id, None)
+                for row in changed:
+                    if _is_active_row(row):
+                        self.rows[row["_id"]] = row
+                    else:
+                        self.rows.pop(row["_id"], None)
+                self.version = new_version
+                if changed or removed:
+                    self.generation += 1
+                return bool(changed or removed)
+        version = self.source.version
+        self.rows = {r["_id"]: r for r in self.source.load_active()}
+        self.version = version
+        self.generation += 1
+        return True
+
+    def active(self):
+        return list(self.rows.values())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] in ("import", "export"):
+        cmd, src_path, dst_path = sys.argv[1:]
+        if cmd == "import":
+            resolve = None
+            try:
+                from utils_upbit import get_upbit_markets_all
+                from registry_upbit import MarketRegistry
+
+                registry = MarketRegistry()
+                registry.update(get_upbit_markets_all())
+                resolve = registry.resolve
+            except Exception as e:
+                print(f"[규칙 저장소] 마켓 목록 조회 실패, 마켓 코드 없이 가져옴 (감시 시 종목명으로 매핑): {e}")
+            n = SQLiteRuleSource(dst_path).import_excel(src_path, resolve)
+            print(f"[규칙 저장소] {src_path} → {dst_path}: {n}건")
+        else:
+            n = SQLiteRuleSource(src_path).export_excel(dst_path)
+            print(f"[규칙 저장소] {src_path} → {dst_path}: {n}건")
+    else:
+        print("사용법: python rulestore_upbit.py import <xlsx> <db> | export <db> <xlsx>")
@@ -0,0 +1,242 @@
+# screener_upbit.py - 원화시장 전종목 이동평균(5/20/60/120일) 교차 스크리너
+# created : 2026-10-19
+# 종목 × 일자 종가 행렬을 유지하고 하루 1열씩 추가 (과거 일봉은 최초 1회만 조회)
+# 최초 구성/재구성(마켓당 일봉 1회, 수십 초)은 백그라운드 스레드에서 하고, 끝날 때까지 결과 없음
+
+import os
+import datetime
+import threading
+
+import numpy as np
+
+from utils_upbit import get_day_candles
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DIR = os.getenv("STATE_DIR", "").strip() or SCRIPT_DIR  # 런타임 상태 파일 위치
+MA_STATE_PATH = os.path.join(STATE_DIR, "upbitMA_ma.npz")
+
+MA_PERIODS = (5, 20, 60, 120)
+MA_CROSS_PAIRS = ((5, 20), (20, 60), (60, 120))
+MA_HISTORY_DAYS = max(MA_PERIODS) + 1  # 전일 교차 판정용 1일 여유
+_CANDLE_REQUEST_GAP = 0.12  # 업비트 시세 API 초당 10회 제한
+
+
+def _utc_today():
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+class MAScreener:
+    """종목 × 일자 종가 행렬 기반 이동평균 스크리너.
+
+    closes[i, j] = markets[i]의 dates[j] 일봉 종가 (없으면 NaN).
+    하루가 지나면 현재가 조회 결과의 전일종가로 1열만 추가한다.
+    """
+
+    def __init__(self, state_path=MA_STATE_PATH, history_days=MA_HISTORY_DAYS):
+        self.state_path = state_path
+        self.history_days = history_days
+        self.markets = []
+        self._row = {}
+        self.closes = np.empty((0, 0))
+        self.last_date = None  # 마지막 확정 일봉 날짜 (UTC)
+        self._bootstrap_thread = None  # 일봉 행렬 구성 중인 스레드
+        self._stop = threading.Event()  # 요청 간격 대기용 (감시 루프와 무관하게 실제 시간)
+
+    # ---- 상태 저장/복원 ----
+    def load(self):
+        """저장된 행렬 복원. 성공 시 True."""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return False
+        try:
+            with np.load(self.state_path, allow_pickle=False) as data:
+                self.markets = [str(m) for m in data["markets"]]
+                self.closes = np.array(data["closes"], dtype=float)
+                self.last_date = datetime.date.fromisoformat(str(data["last_date"]))
+        except Exception as e:
+            print(f"[MA 스크리너] 상태 복원 실패: {e}")
+            return False
+        self._row = {m: i for i, m in enumerate(self.markets)}
+        return True
+
+    def save(self):
+        if not self.state_path or self.last_date is None:
+            return
+        tmp_path = self.state_path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            markets=np.array(self.markets),
+            closes=self.closes,
+            last_date=np.array(self.last_date.isoformat()),
+        )
+        os.replace(tmp_path, self.state_path)
+
+    # ---- 행렬 구성 ----
+    def bootstrap(self, markets):
+        """일봉 API로 최초 행렬 구성 (마켓당 1회 호출). 당일 미확정 봉은 제외."""
+        yesterday = _utc_today() - datetime.timedelta(days=1)
+        dates = [yesterday - datetime.timedelta(days=k) for k in range(self.history_days - 1, -1, -1)]
+        col = {d.isoformat(): j for j, d in enumerate(dates)}
+        closes = np.full((len(markets), len(dates)), np.nan)
+        for i, mkt in enumerate(markets):
+            try:
+                for c in get_day_candles(mkt, count=self.history_days + 1):
+                    j = col.get(c["date"])
+                    if j is not None:
+                        closes[i, j] = c["close"]
+            except Exception as e:
+                print(f"[MA 스크리너] 일봉 조회 실패: {mkt} ({e})")
+            self._stop.wait(_CANDLE_REQUEST_GAP)
+        self.markets = list(markets)
+        self._row = {m: i for i, m in enumerate(self.markets)}
+        self.closes = closes
+        self.last_date = yesterday
+        self.save()
+        print(f"[MA 스크리너] 일봉 행렬 구성 완료: {len(markets)}종목 × {len(dates)}일")
+
+    def _start_bootstrap(self, markets):
+        """bootstrap()을 백그라운드로 시작 (구성이 끝나면 행렬을 한 번에 교체)"""
+
+        def run():
+            try:
+                self.bootstrap(markets)
+            except Exception as e:
+                print(f"[MA 스크리너] 일봉 행렬 구성 실패: {e}")
+
+        self._bootstrap_thread = threading.Thread(target=run, name="ma-bootstrap", daemon=True)
+        self._bootstrap_thread.start()
+        print(f"[MA 스크리너] 일봉 행렬 구성 시작 (백그라운드, {len(markets)}종목)")
+
+    def _sync_markets(self, markets):
+        """신규 상장은 NaN 행 추가, 상장 폐지는 행 제거."""
+        added = [m for m in markets if m not in self._row]
+        wanted = set(markets)
+        removed = [m for m in self.markets if m not in wanted]
+        if not added and not removed:
+            return
+        keep = [i for i, m in enumerate(self.markets) if m in wanted]
+        closes = self.closes[keep]
+        if added:
+            closes = np.vstack([closes, np.full((len(added), closes.shape[1]), np.nan)])
+        self.markets = [self.markets[i] for i in keep] + added
+        self._row = {m: i for i, m in enumerate(self.markets)}
+        self.closes = closes
+
+    def update(self, ticker_data):
+        """현재가 조회 결과(get_ticker_info)로 행렬 갱신.
+        UTC 기준 날짜가 바뀌었으면 전일종가(prev_closing_price)로 1열 추가.
+        2일 이상 비었으면 일봉으로 재구성 (백그라운드).
+        반환: evaluate() 가능 여부 (행렬 구성 중이면 False)"""
+        if self._bootstrap_thread is not None:
+            if self._bootstrap_thread.is_alive():
+                return False
+            self._bootstrap_thread = None
+        markets = [d["market"] for d in ticker_data]
+        yesterday = _utc_today() - datetime.timedelta(days=1)
+        if self.last_date is None and not self.load():
+            self._start_bootstrap(markets)
+            return False
+        self._sync_markets(markets)
+        if self.last_date >= yesterday:
+            return True
+        if self.last_date < yesterday - datetime.timedelta(days=1):
+            print(f"[MA 스크리너] 일봉 {(yesterday - self.last_date).days}일 누락, 행렬 재구성")
+            self._start_bootstrap(markets)
+            return False
+        column = np.full(len(self.markets), np.nan)
+        for d in ticker_data:
+            column[self._row[d["market"]]] = d["prev_closing_price"]
+        self.closes = np.hstack([self.closes, column[:, None]])[:, -self.history_days:]
+        self.last_date = yesterday
+        self.save()
+        return True
+
+    # ---- 계산 ----
+    def evaluate(self, ticker_data):
+        """현재가를 당일 잠정 종가로 붙여 이동평균/교차/이격도를 전종목 한 번에 계산.
+
+        반환: {
+            "golden": [(market, short, long)], "dead": [(market, short, long)],
+            "deviation": { period: [(market, 이격률%)] (이격률 내림차순) },
+        }
+        """
+        result = {"golden": [], "dead": [], "deviation": {}}
+        if not self.markets:
+            return result
+        live = np.full(len(self.markets), np.nan)
+        for d in ticker_data:
+            i = self._row.get(d["market"])
+            if i is not None:
+                live[i] = d["trade_price"]
+        x = np.hstack([self.closes, live[:, None]])
+        t = x.shape[1]
+        # 누적합 앞에 0열을 붙여 구간합 = cs[:, b] - cs[:, a]
+        missing = np.isnan(x)
+        cs = np.zeros((x.shape[0], t + 1))
+        np.cumsum(np.where(missing, 0.0, x), axis=1, out=cs[:, 1:])
+        cn = np.zeros((x.shape[0], t + 1), dtype=np.int64)
+        np.cumsum(missing, axis=1, out=cn[:, 1:])
+
+        def sma(n, end):
+            """end 열(포함)까지 n일 이동평균. 구간에 결측이 있으면 NaN."""
+            if end + 1 < n:
+                return np.full(x.shape[0], np.nan)
+            a, b = end + 1 - n, end + 1
+            out = (cs[:, b] - cs[:, a]) / n
+            out[(cn[:, b] - cn[:, a]) > 0] = np.nan
+            return out
+
+        now_ma = {n: sma(n, t - 1) for n in MA_PERIODS}
+        prev_ma = {n: sma(n, t - 2) for n in MA_PERIODS}
+        markets = np.array(self.markets)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for short, long in MA_CROSS_PAIRS:
+                prev_diff = prev_ma[short] - prev_ma[long]
+                now_diff = now_ma[short] - now_ma[long]
+                golden = (prev_diff <= 0) & (now_diff > 0)
+                dead = (prev_diff >= 0) & (now_diff < 0)
+                result["golden"] += [(str(m), short, long) for m in markets[golden]]
+                result["dead"] += [(str(m), short, long) for m in markets[dead]]
+            for n in MA_PERIODS:
+                dev = (live - now_ma[n]) / now_ma[n] * 100
+                ok = ~np.isnan(dev)
+                order = np.argsort(-dev[ok])
+                result["deviation"][n] = [
+                    (str(m), float(v)) for m, v in zip(markets[ok][order], dev[ok][order])
+                ]
+        return result
+
+
+def format_ma_markdown(ma_result, top=10):
+    """Markdown 리포트용 이동평균 섹션 라인 목록"""
+    lines = ["\n## 📐 이동평균 교차 (골든/데드크로스)"]
+    crosses = [("골든", m, s, l) for m, s, l in ma_result["golden"]]
+    crosses += [("데드", m, s, l) for m, s, l in ma_result["dead"]]
+    if crosses:
+        lines.append("| 종목명 | 구분 | 이동평균 |")
+        lines.append("|--------|------|----------|")
+        for kind, m, s, l in crosses:
+            lines.append(f"| {m} | {kind}크로스 | {s}/{l}일 |")
+    else:
+        lines.append("- 없음")
+
+    dev20 = ma_result["deviation"].get(20, [])
+    lines.append(f"\n## 📏 20일선 이격도 상/하위 {top}")
+    if dev20:
+        lines.append("| 종목명 | 이격률(%) |")
+        lines.append("|--------|------------|")
+        picks = dev20[:top] + dev20[-top:] if len(dev20) > 2 * top else dev20
+        for m, v in picks:
+            lines.append(f"| {m} | {v:+.2f}% |")
+    else:
+        lines.append("- 없음")
+    return lines
+
+
+def format_ma_summary(ma_result):
+    """텔레그램 요약용 한 줄 (교차 쌍별 골든/데드 건수)"""
+    parts = []
+    for short, long in MA_CROSS_PAIRS:
+        g = sum(1 for _, s, l in ma_result["golden"] if (s, l) == (short, long))
+        d = sum(1 for _, s, l in ma_result["dead"] if (s, l) == (short, long))
+        parts.append(f"{short}/{long} 골든 {g}·데드 {d}")
+    return "MA 교차: " + " | ".join(parts)
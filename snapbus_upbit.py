@@ -0,0 +1,204 @@
+# snapbus_upbit.py - 최신 시세/등락 분포를 메모리 맵 파일로 게시 (같은 PC의 다른 스크립트용)
+# created : 2026-10-19
+# 감시 스크립트가 주기마다 전종목 시세와 등락 구간 통계를 파일 하나에 쓰고,
+# 대시보드 등 다른 프로세스는 업비트 API 호출 없이 SnapshotReader로 바로 읽는다.
+# 시퀀스 잠금(seqlock): 쓰는 동안 시퀀스가 홀수 → 읽기 전후 시퀀스가 같고 짝수일 때만 유효한 스냅샷.
+#
+# 파일 구조 (리틀 엔디언)
+#   헤더 64바이트: magic "UPMA", 포맷 버전(u32), 시퀀스(u64), 파일 크기(u64), 본문 길이(u64), 게시 시각(f64), 종목 수(u64)
+#   본문: 등락 통계 JSON 길이(u32) + JSON, 이후 종목별 48바이트
+#         (마켓코드 16바이트, 현재가, 전일종가, 누적거래량, 24시간 누적거래대금 - f64)
+#
+# 읽기 예:
+#   from snapbus_upbit import SnapshotReader
+#   with SnapshotReader("upbitMA.snap") as r:
+#       snap = r.read()   # {"seq", "published_at", "breadth", "tickers": {market: {...}}}
+#       btc = r.get("KRW-BTC")
+
+import os
+import json
+import mmap
+import time
+import struct
+
+MAGIC = b"UPMA"
+FORMAT_VERSION = 1
+DEFAULT_SIZE = 1 << 20  # 1MB (원화시장 전종목 약 15KB)
+
+_HEADER = struct.Struct("<4sIQQQdQ")
+_HEADER_SIZE = 64
+_SEQ_OFFSET = 8
+_SEQ = struct.Struct("<Q")
+_LEN = struct.Struct("<I")
+_RECORD = struct.Struct("<16sdddd")
+_NAN = float("nan")
+
+
+def _num(v):
+    return _NAN if v is None else float(v)
+
+
+def _opt(v):
+    return None if v != v else v
+
+
+class SnapshotWriter:
+    """게시 쪽 (감시 스크립트 1개만 사용). 파일은 고정 크기로 만들고 재사용"""
+
+    def __init__(self, path, size=DEFAULT_SIZE):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) >= _HEADER_SIZE
+        self._f = open(path, "r+b" if exists else "w+b")
+        if os.fstat(self._f.fileno()).st_size < size:
+            self._f.truncate(size)
+        self.size = os.fstat(self._f.fileno()).st_size
+        self._mm = mmap.mmap(self._f.fileno(), self.size)
+        magic, version, seq = _HEADER.unpack_from(self._mm, 0)[:3]
+        # 이전 실행 파일이면 시퀀스 이어서 사용 (읽는 쪽이 새 스냅샷을 놓치지 않도록).
+        # 쓰다 중단된 홀수면 본문이 깨졌을 수 있으므로 길이/종목 수를 0으로 (다음 게시 전까지 빈 스냅샷)
+        if magic == MAGIC and version == FORMAT_VERSION:
+            if seq & 1:
+                self._seq = seq + 1
+                _HEADER.pack_into(self._mm, 0, MAGIC, FORMAT_VERSION, self._seq, self.size, 0, 0.0, 0)
+            else:
+                self._seq = seq
+        else:
+            self._seq = 0
+            _HEADER.pack_into(self._mm, 0, MAGIC, FORMAT_VERSION, 0, self.size, 0, 0.0, 0)
+
+    def publish(self, snapshot, breadth=None, published_at=None):
+        """스냅샷 게시. 반환: 새 시퀀스 (크기 초과 시 None)"""
+        breadth_raw = json.dumps(breadth or {}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        length = _LEN.size + len(breadth_raw) + _RECORD.size * len(snapshot)
+        if _HEADER_SIZE + length > self.size:
+            print(f"[스냅샷 게시] 크기 초과: {length}바이트 > {self.size - _HEADER_SIZE}바이트, 게시 생략")
+            return None
+        mm = self._mm
+        self._seq += 1
+        _SEQ.pack_into(mm, _SEQ_OFFSET, self._seq)  # 홀수: 쓰는 중
+        pos = _HEADER_SIZE
+        _LEN.pack_into(mm, pos, len(breadth_raw))
+        pos += _LEN.size
+        mm[pos:pos + len(breadth_raw)] = breadth_raw
+        pos += len(breadth_raw)
+        for market, tick in snapshot.items():
+            _RECORD.pack_into(
+                mm, pos, market.encode("ascii")[:16],
+                _num(tick.get("price")), _num(tick.get("prev_close")),
+                _num(tick.get("acc_volume")), _num(tick.get("acc_trade_price_24h")),
+            )
+            pos += _RECORD.size
+        self._seq += 1
+        _HEADER.pack_into(
+            mm, 0, MAGIC, FORMAT_VERSION, self._seq, self.size, length,
+            time.time() if published_at is None else published_at, len(snapshot),
+        )
+        return self._seq
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._f.close()
+            self._mm = None
+
+
+class SnapshotReader:
+    """읽기 쪽. 여러 프로세스가 동시에 사용 가능 (읽기 전용 매핑)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._last = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def seq(self):
+        """현재 시퀀스 (바뀌었는지만 확인할 때)"""
+        return _SEQ.unpack_from(self._mm, _SEQ_OFFSET)[0]
+
+    def read_raw(self, retries=10000):
+        """일관된 (헤더, 본문 bytes) 복사본. 게시 전이거나 계속 쓰는 중이면 None"""
+        mm = self._mm
+        for _ in range(retries):
+            s1 = _SEQ.unpack_from(mm, _SEQ_OFFSET)[0]
+            if s1 & 1:
+                continue
+            header = _HEADER.unpack(mm[:_HEADER.size])
+            if header[0] != MAGIC or header[1] != FORMAT_VERSION:
+                return None
+            length = header[4]
+            if header[2] != s1 or _HEADER_SIZE + length > len(mm):
+                continue
+            body = mm[_HEADER_SIZE:_HEADER_SIZE + length]
+            if _SEQ.unpack_from(mm, _SEQ_OFFSET)[0] == s1:
+                return header, body
+        return None
+
+    def read(self):
+        """최신 스냅샷 dict. 게시 전이면 None. 시퀀스가 그대로면 이전 결과 재사용"""
+        if self._last is not None and self.seq() == self._last["seq"]:
+            return self._last
+        raw = self.read_raw()
+        if raw is None or raw[0][4] == 0:
+            return None
+        header, body = raw
+        n_breadth = _LEN.unpack_from(body, 0)[0]
+        pos = _LEN.size + n_breadth
+        breadth = json.loads(body[_LEN.size:pos].decode("utf-8"))
+        tickers = {}
+        for market, price, prev_close, acc_volume, acc_price in _RECORD.iter_unpack(body[pos:pos + _RECORD.size * header[6]]):
+            tickers[market.rstrip(b"\x00").decode("ascii")] = {
+                "price": price,
+                "prev_close": _opt(prev_close),
+                "acc_volume": _opt(acc_volume),
+                "acc_trade_price_24h": _opt(acc_price),
+            }
+        self._last = {"seq": header[2], "published_at": header[5], "breadth": breadth, "tickers": tickers}
+        return self._last
+
+    def get(self, market):
+        """종목 1개 시세 (없으면 None)"""
+        snap = self.read()
+        return None if snap is None else snap["tickers"].get(market)
+
+    def age(self):
+        """마지막 게시 후 경과 초 (게시 전이면 None)"""
+        snap = self.read()
+        return None if snap is None else time.time() - snap["published_at"]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._f.close()
+            self._mm = None
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.platform == "win32":
+        try:
+            sys.stdout.reconfigure(encoding="utf-8")
+        except Exception:
+            pass
+    if len(sys.argv) < 2:
+        print("사용: python snapbus_upbit.py <스냅샷 파일> [마켓...]")
+        sys.exit(1)
+    with SnapshotReader(sys.argv[1]) as reader:
+        t0 = time.perf_counter()
+        snap = reader.read()
+        took = (time.perf_counter() - t0) * 1e6
+        if snap is None:
+            print("게시된 스냅샷 없음")
+            sys.exit(1)
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snap["published_at"]))
+        print(f"시퀀스 {snap['seq']} | 게시 {stamp} | {len(snap['tickers'])}종목 | 읽기 {took:.0f}µs")
+        print(f"등락 분포: {snap['breadth']}")
+        for market in sys.argv[2:]:
+            print(f"{market}: {snap['tickers'].get(market)}")
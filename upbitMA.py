@@ -4,15 +4,33 @@
 # modified : 2025-10-27 메시지 형식 수정 (10%, 15%는 5%이상에 포함)
 # modified : 2026-02-03 종목별 감시(upbitMA.list.xlsx) 추가
 # modified : 2026-02-03 설정 전부 .env 사용
+# modified : 2026-10-19 이동평균(5/20/60/120일) 교차 스크리너 추가
+# modified : 2026-10-19 캐시 스냅샷 웜스타트 (upbitMA_cache.json), 무거운 모듈 지연 import
+# modified : 2026-10-19 마켓 레지스트리: 신규 상장/상장 폐지/유의종목 변경 즉시 알림
+# modified : 2026-10-19 감시 규칙 저장소 분리 (엑셀 / SQLite, rulestore_upbit)
+# modified : 2026-10-19 상태 유지형 감시조건 (트레일링/기준대비/거래량급증, 재감시)
+# modified : 2026-10-19 감시 규칙 병렬 평가 옵션 (LIST_EVAL_WORKERS, 공유메모리 시세 배열)
+# modified : 2026-10-19 시세/등락 분포 스냅샷 파일 게시 (SNAPSHOT_BUS, snapbus_upbit)
+# modified : 2026-10-19 감시 상태 조회 HTTP API (QUERY_API_PORT, queryapi_upbit)
+# modified : 2026-10-19 등락 분포 주기별 집계 → 8:30 리포트/-15% 경고 (breadth_upbit)
+# modified : 2026-10-19 발동가에 가까운 마켓만 짧은 주기로 추가 조회 (LIST_FAST_INTERVAL, cadence_upbit)
+# modified : 2026-10-19 원 미만 가격 절사 제거, 규칙이 많으면 고정소수점 배열 일괄 비교 (price_upbit)
+# modified : 2026-10-19 체결 웹소켓 분봉 생성 (TRADE_STREAM, candles_upbit)
+# modified : 2026-10-19 텔레그램 명령으로 감시 규칙 즉시 추가/해제 (TELEGRAM_COMMANDS, commands_upbit)
+# modified : 2026-10-19 원화시장 종합지수 → 감시 규칙(KRW-INDEX)/리포트 (COMPOSITE_INDEX, composite_upbit)
+# modified : 2026-10-19 일자/만료일/RULE_TTL_DAYS로 감시 시작·만료 예약 (타이밍 휠, wheel_upbit)
+# modified : 2026-10-19 리포트 기록 스레드: 현재 월 기준 파일 교체, 지난 달 gzip, JSONL 병행 (report_upbit)
+# modified : 2026-10-19 종목별 감시 처리를 upbitMA_list와 공용 모듈로 분리 (monitor_upbit)
 
 import requests
 import time
 import datetime
 import os
 import sys
-import re
+import copy
 import atexit
 import signal
+import threading
 
 if sys.platform == "win32":
     try:
@@ -22,6 +40,14 @@ if sys.platform == "win32":
 
 from dotenv import load_dotenv
 
+from rules_upbit import parse_threshold
+from price_upbit import exact_price
+from registry_upbit import format_market_event
+from breadth_upbit import BreadthAggregator, summarize_breadth, format_breadth_headline, format_breadth_summary, format_breadth_markdown
+from composite_upbit import format_composite_markdown, format_composite_summary
+import monitor_upbit as monitor
+from monitor_upbit import get_cached_market_data, get_list_monitoring_status, run_list_monitoring, wait_next_cycle
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
 
@@ -29,38 +55,33 @@ load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "").strip()
 ALL_MA_INTERVAL = int(os.getenv("ALL_MA_INTERVAL", "3600").strip() or "3600")  # 전체 종목 분석 주기(초)
-LIST_MA_INTERVAL = int(os.getenv("LIST_MA_INTERVAL", "60").strip() or "60")  # 종목별 감시 주기(초), 기본 1분
-LIST_FILE_RAW = os.getenv("LIST_FILE", "").strip()
-if LIST_FILE_RAW:
-    EXCEL_LIST_PATH = os.path.join(SCRIPT_DIR, LIST_FILE_RAW) if not os.path.isabs(LIST_FILE_RAW) else LIST_FILE_RAW
-else:
-    EXCEL_LIST_PATH = None
+REPORT_KEEP_MONTHS = int(os.getenv("REPORT_KEEP_MONTHS", "0").strip() or "0")  # 압축 리포트 보관 개월 (0=전부 보관)
+UPBIT_API_URL = (os.getenv("UPBIT_API_URL", "").strip() or "https://api.upbit.com").rstrip("/")  # 테스트용 교체 가능
+TELEGRAM_API_URL = (os.getenv("TELEGRAM_API_URL", "").strip() or "https://api.telegram.org").rstrip("/")
 
 if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
     raise ValueError("TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID가 .env에 필요합니다.")
 
-# 종목별 감시용 캐시: 마켓 매핑 + 전종목 시세 (API 호출 최소화)
-_MARKET_CACHE_TTL = 600  # 초 (10분)
-_market_map_cache = None
-_krw_markets_cache = None
-_market_cache_time = 0
+# 원화시장 등락 분포: 매 감시 주기 표본을 1시간 구간 OHLC로 누적 (24시간 보관)
+_breadth = BreadthAggregator()
+_breadth_warned_start = None  # -15% 경고를 보낸 구간 (구간당 1회)
 
-# 종목별 감시: 한 번 알림 보낸 (종목명, 감시사유)는 이후 감시 대상에서 제외 (감시중 X와 동일)
-_list_alert_sent = set()
-_last_active_list_count = 0  # 대기 로그용: 엑셀 감시중(O) 건수
+# 전체 종목 이동평균 스크리너: 종목 × 일자 종가 행렬 (하루 1열씩 추가, numpy 지연 import)
+_ma_screener = None
 
-# ✅ 실행 시마다 날짜 확인 → 파일명 동적으로 갱신
+# 리포트 파일: {SCRIPT_FILENAME}_{YYYYMM}.md (+ .jsonl). 월은 기록 시점 기준으로 바뀜 (report_upbit)
 TODAY = datetime.date.today().strftime("%Y%m%d")
 TODAY_MONTH = datetime.date.today().strftime("%Y%m")
 SCRIPT_FILENAME = os.path.splitext(os.path.basename(sys.argv[0]))[0]
 # LOG_DIR_FILENAME = os.path.join(SCRIPT_DIR, f"{SCRIPT_FILENAME}_{TODAY}.md")
-LOG_DIR_FILENAME = os.path.join(SCRIPT_DIR, f"{SCRIPT_FILENAME}_{TODAY_MONTH}.md")
+LOG_DIR_FILENAME = os.path.join(SCRIPT_DIR, f"{SCRIPT_FILENAME}_{TODAY_MONTH}.md")  # 시작 시점 파일 (기록 위치는 이 디렉터리)
+_report_writer = None  # 리포트 기록 스레드 (report_upbit.ReportWriter, 첫 리포트 때 시작)
 
 
 
 def send_telegram_message(message):
     """텔레그램 알림 전송"""
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
     try:
         r = requests.post(url, data=payload, timeout=10)
@@ -69,271 +90,88 @@ def send_telegram_message(message):
     except Exception as e:
         print(f"[텔레그램 전송 실패] {e}")
 
-def get_upbit_markets():
-    """업비트 원화시장 종목 목록 가져오기"""
-    url = "https://api.upbit.com/v1/market/all"
-    res = requests.get(url).json()
-    return [m['market'] for m in res if m['market'].startswith('KRW-')]
-
-
-def get_upbit_markets_all():
-    """업비트 마켓 전체 조회 (종목명→마켓코드 매핑용)"""
-    url = "https://api.upbit.com/v1/market/all"
-    resp = requests.get(url, params={"isDetails": "true"}, timeout=10)
-    resp.raise_for_status()
-    return resp.json()
-
-
-def build_name_market_map():
-    """종목명/심볼 → 마켓코드(KRW-XXX) 매핑 생성"""
-    markets = get_upbit_markets_all()
-    name_map = {}
-    for m in markets:
-        mkt = m["market"]
-        if not mkt.startswith("KRW-"):
-            continue
-        korean = m.get("korean_name", "")
-        english = m.get("english_name", "")
-        symbol = mkt.replace("KRW-", "")
-        if korean:
-            name_map[korean] = mkt
-        if english:
-            name_map[english] = mkt
-        name_map[symbol] = mkt
-        name_map[mkt] = mkt
-        name_map[f"{symbol}/KRW"] = mkt
-    return name_map
-
-
-def get_cached_market_data():
-    """종목명 매핑 + KRW 마켓 목록 캐시. TTL 내에는 API 호출 없이 반환."""
-    global _market_map_cache, _krw_markets_cache, _market_cache_time
-    now_ts = time.time()
-    if (
-        _market_map_cache is not None
-        and _krw_markets_cache is not None
-        and (now_ts - _market_cache_time) < _MARKET_CACHE_TTL
-    ):
-        return _market_map_cache, _krw_markets_cache
-    raw = get_upbit_markets_all()
-    name_map = {}
-    krw_list = []
-    for m in raw:
-        mkt = m["market"]
-        if not mkt.startswith("KRW-"):
-            continue
-        krw_list.append(mkt)
-        korean = m.get("korean_name", "")
-        english = m.get("english_name", "")
-        symbol = mkt.replace("KRW-", "")
-        if korean:
-            name_map[korean] = mkt
-        if english:
-            name_map[english] = mkt
-        name_map[symbol] = mkt
-        name_map[mkt] = mkt
-        name_map[f"{symbol}/KRW"] = mkt
-    _market_map_cache = name_map
-    _krw_markets_cache = krw_list
-    _market_cache_time = now_ts
-    return name_map, krw_list
+def notify_market_event(event):
+    """마켓 레지스트리 이벤트(신규 상장/상장 폐지/유의종목) 즉시 텔레그램 알림"""
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    send_telegram_message(f"{format_market_event(event)}\n({now})")
+    print(f"[마켓 변경] {format_market_event(event)}")
 
 
 def get_all_ticker_prices(markets):
-    """전종목 시세 1회 API 호출로 조회 → { market: 현재가(int) } 반환"""
+    """전종목 시세 1회 API 호출로 조회 → { market: 현재가 } 반환 (정수면 int, 원 미만이면 float)"""
     if not markets:
         return {}
-    url = "https://api.upbit.com/v1/ticker"
+    url = f"{UPBIT_API_URL}/v1/ticker"
     try:
         resp = requests.get(url, params={"markets": ",".join(markets)}, timeout=15)
         if resp.status_code != 200:
             return {}
         data = resp.json()
-        return {r["market"]: int(float(r["trade_price"])) for r in data if r.get("trade_price") is not None}
+        return {r["market"]: exact_price(r["trade_price"]) for r in data if r.get("trade_price") is not None}
     except Exception:
         return {}
 
 
-def load_excel_list(file_path):
-    """upbitMA.list.xlsx 형식 엑셀 로드 (감시중=O 행만 반환)
-    열: 감시중, 종목명, 감시사유, 감시가격, 감시조건, 일자, 기준가격, 비율, 수정일, 비고
-    """
-    try:
-        from openpyxl import load_workbook
-    except ImportError:
-        print("[종목별 감시] openpyxl 미설치. pip install openpyxl")
-        return []
-    wb = load_workbook(file_path, data_only=True)
-    ws = wb.active
-    header = [cell.value for cell in ws[1]]
-    rows = []
-    for row in ws.iter_rows(min_row=2):
-        row_dict = {}
-        for idx, cell in enumerate(row):
-            if idx < len(header) and header[idx]:
-                row_dict[header[idx]] = cell.value
-        rows.append(row_dict)
-    # 감시중=O 인 행만
-    active = []
-    for r in rows:
-        status = str(r.get("감시중", "") or "").strip().upper()
-        name = str(r.get("종목명", "") or "").strip()
-        if status == "O" and name:
-            active.append(r)
-    return active
-
-
 def parse_watch_price(row):
-    """행에서 감시가격 계산. 감시가격(숫자) 또는 기준가격+비율.
-    반환: int 또는 None(파싱 실패/템플릿 행)
-    """
-    watch_raw = row.get("감시가격")
-    ref_raw = row.get("기준가격")
-    ratio_raw = row.get("비율")
-
-    # 감시가격이 숫자면 사용
-    if watch_raw is not None and str(watch_raw).strip() not in ("", "None", "NaT"):
-        s = str(watch_raw).replace("₩", "").replace(",", "").replace("원", "").strip()
-        if s and s.replace(".", "", 1).replace("-", "", 1).isdigit():
-            return int(float(s))
-
-    # 기준가격 + 비율로 계산 (기준가격이 숫자인 경우만)
-    if ref_raw is None or ratio_raw is None:
-        return None
-    ref_str = str(ref_raw).strip()
-    if not ref_str or ref_str in ("None", "NaT") or not ref_str.replace(".", "", 1).replace(",", "").replace("-", "", 1).isdigit():
-        return None  # "20일선" 등 텍스트는 미지원
-    try:
-        ref = float(str(ref_raw).replace("₩", "").replace(",", "").replace("원", "").strip())
-    except (ValueError, TypeError):
-        return None
-    try:
-        ratio = float(str(ratio_raw).replace("%", "").strip())
-    except (ValueError, TypeError):
-        return None
-    return int(ref * (1 + ratio / 100))
+    """행에서 감시가격 계산. 감시가격(숫자) 또는 기준가격+비율. (rules_upbit.parse_threshold)"""
+    return parse_threshold(row)
 
 
 def get_current_price(market, retries=2):
-    """단일 마켓 현재가 조회"""
-    url = "https://api.upbit.com/v1/ticker"
+    """단일 마켓 현재가 조회 (원 미만 절사 없음)"""
+    url = f"{UPBIT_API_URL}/v1/ticker"
     for _ in range(retries):
         try:
             resp = requests.get(url, params={"markets": market}, timeout=10)
             if resp.status_code == 200:
                 data = resp.json()
                 if data:
-                    return int(float(data[0]["trade_price"]))
+                    return exact_price(data[0]["trade_price"])
         except Exception:
             pass
         time.sleep(0.1)
     return None
 
 
-def get_list_monitoring_status():
-    """종목별 감시현황 메시지 본문 생성. 미사용 시 (None, 이유문자열) 반환."""
-    if EXCEL_LIST_PATH is None:
-        return None, "LIST_FILE 미설정"
-    if not os.path.exists(EXCEL_LIST_PATH):
-        return None, f"파일 없음: {EXCEL_LIST_PATH}"
-    active_rows = load_excel_list(EXCEL_LIST_PATH)
-    if not active_rows:
-        return None, "엑셀에 감시중(O) 행 없음"
-    name_market_map, _ = get_cached_market_data()
-    lines = []
-    count = 0
-    for row in active_rows:
-        stock_name = str(row.get("종목명", "") or "").strip()
-        reason = str(row.get("감시사유", "") or "").strip()
-        condition = str(row.get("감시조건", "") or "").strip()
-        market = name_market_map.get(stock_name)
-        if not market:
-            for k, v in name_market_map.items():
-                if k.upper() == stock_name.upper():
-                    market = v
-                    break
-        if not market or condition not in ("이상", "이하"):
-            continue
-        watch_price = parse_watch_price(row)
-        if watch_price is None:
-            continue
-        count += 1
-        lines.append(f"  · {stock_name} | {reason} | {watch_price:,}원 {condition}")
-    if not count:
-        return "종목별 감시: 등록 0건 (엑셀 경로 있음)", None
-    body = "\n".join(lines[:30])  # 최대 30건
-    if count > 30:
-        body += f"\n  … 외 {count - 30}건"
-    return f"종목별 감시 현황 ({count}건)\n{body}", None
-
-
-def run_list_monitoring():
-    """LIST_FILE이 .env에 있고 해당 엑셀 파일이 있으면 종목별 감시. 전종목 시세 1회 조회 후 캐시로 비교.
-    한 번 조건 충족 시 알림 전송 후 해당 (종목, 감시사유)는 감시 대상에서 제외(감시중 X와 동일)."""
-    global _list_alert_sent, _last_active_list_count
-    if EXCEL_LIST_PATH is None or not os.path.exists(EXCEL_LIST_PATH):
+def update_breadth():
+    """이번 주기 전종목 시세로 등락 분포를 집계에 반영.
+    -15% 이하 하락 종목이 15개 이상이면 구간(1시간)당 1회 텔레그램 경고 (시간 단위 표본 사이의 급락도 포착)"""
+    global _breadth_warned_start
+    if not monitor.refresh_price_cache():
         return
-    active_rows = load_excel_list(EXCEL_LIST_PATH)
-    if not active_rows:
+    prices, prices_at = monitor.get_price_cache()
+    if prices_at == _breadth.last_at:
         return
-    _last_active_list_count = len(active_rows)
-    name_market_map, krw_markets = get_cached_market_data()
-    price_cache = get_all_ticker_prices(krw_markets)
-    if not price_cache:
-        print("[종목별 감시] 전종목 시세 조회 실패, 이번 주기 스킵")
-        return
-    now = datetime.datetime.now()
-    for row in active_rows:
-        stock_name = str(row.get("종목명", "") or "").strip()
-        reason = str(row.get("감시사유", "") or "").strip()
-        condition = str(row.get("감시조건", "") or "").strip()
-        alert_key = (stock_name, reason)
-        if alert_key in _list_alert_sent:
-            continue
-
-        market = name_market_map.get(stock_name)
-        if not market:
-            for k, v in name_market_map.items():
-                if k.upper() == stock_name.upper():
-                    market = v
-                    break
-        if not market:
-            print(f"[종목별 감시] 마켓 매핑 실패: {stock_name} ({reason})")
-            continue
-
-        watch_price = parse_watch_price(row)
-        if watch_price is None:
-            continue  # 템플릿/비율 행 등 스킵
-
-        if condition not in ("이상", "이하"):
-            continue
-
-        current = price_cache.get(market)
-        if current is None:
-            continue
-
-        condition_met = False
-        if condition == "이상":
-            condition_met = current >= watch_price
-        else:
-            condition_met = current <= watch_price
-
-        if not condition_met:
-            continue
-
-        _list_alert_sent.add(alert_key)
-
+    breadth = summarize_breadth(prices)
+    bucket = _breadth.add(breadth, prices_at)
+    if bucket["fall15_peak"] >= 15 and _breadth_warned_start != bucket["start"]:
+        _breadth_warned_start = bucket["start"]
+        now = datetime.datetime.now()
         msg = (
-            f"🔔 [종목별 감시] {stock_name} - {reason}\n"
-            f"   감시가격 {condition} {watch_price:,}원 | 현재가 {current:,}원\n"
-            f"   ({now.strftime('%Y-%m-%d %H:%M')})"
+            f"📉 경고: -15% 이하 하락 종목이 {breadth['fall_15']}개 이상 발생!\n"
+            f"({now.strftime('%Y-%m-%d %H:%M')})\n"
+            f"전체 종목: {breadth['total']}개\n"
+            f"상승: +5%↑ {breadth['rise_5']}개 (+10%↑ {breadth['rise_10']}개 | +15%↑ {breadth['rise_15']}개)\n"
+            f"보합(-5%~+5%): {breadth['neutral']}개\n"
+            f"하락: -5%↓ {breadth['fall_5']}개 (-10%↓ {breadth['fall_10']}개 | -15%↓ {breadth['fall_15']}개)\n"
+            f"파일: {report_file_name()}"
         )
         send_telegram_message(msg)
-        print(f"[종목별 감시] 알림 전송: {stock_name} ({reason})")
+
+
+def update_composite():
+    """이번 주기 전종목 시세로 종합지수 갱신 (감시 주기에서 이미 반영했으면 생략)"""
+    composite = monitor.get_composite()
+    if composite is None or not monitor.refresh_price_cache():
+        return
+    prices, prices_at = monitor.get_price_cache()
+    if composite.updated_at != prices_at:
+        composite.update(prices, prices_at)
+
 
 def get_ticker_info(markets):
     """현재가, 전일가 기준으로 등락률 계산"""
-    url = "https://api.upbit.com/v1/ticker"
+    url = f"{UPBIT_API_URL}/v1/ticker"
     res = requests.get(url, params={"markets": ",".join(markets)}).json()
 
     result = []
@@ -341,7 +179,9 @@ def get_ticker_info(markets):
         change_rate = (r['trade_price'] - r['prev_closing_price']) / r['prev_closing_price'] * 100
         result.append({
             'market': r['market'],
-            'change_rate': change_rate
+            'change_rate': change_rate,
+            'trade_price': r['trade_price'],
+            'prev_closing_price': r['prev_closing_price'],
         })
     return result
 
@@ -382,9 +222,52 @@ def analyze(change_data):
 
     return summary
 
-def save_to_markdown(LOGFILE, summary):
-    """결과를 Markdown 파일에 추가"""
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def run_ma_screener(change_data):
+    """이동평균 스크리너 갱신 + 전종목 교차/이격도 계산. 실패 시 None (통계 리포트는 계속)"""
+    global _ma_screener
+    try:
+        if _ma_screener is None:
+            from screener_upbit import MAScreener
+            _ma_screener = MAScreener()
+        if not _ma_screener.update(change_data):
+            return None  # 일봉 행렬 구성 중 (백그라운드)
+        return _ma_screener.evaluate(change_data)
+    except Exception as e:
+        print(f"[MA 스크리너 오류] {e}")
+        return None
+
+def get_report_writer():
+    """리포트 기록 스레드 (최초 호출 시 시작). LOG_DIR_FILENAME 디렉터리에 현재 월 파일로 기록"""
+    global _report_writer
+    if _report_writer is None:
+        from report_upbit import ReportWriter
+
+        _report_writer = ReportWriter(os.path.dirname(LOG_DIR_FILENAME), SCRIPT_FILENAME, REPORT_KEEP_MONTHS)
+    return _report_writer
+
+
+def close_report_writer():
+    """대기 중인 리포트 기록 후 종료"""
+    global _report_writer
+    if _report_writer is not None:
+        _report_writer.close()
+        _report_writer = None
+
+
+def report_file_name():
+    """현재 월 리포트 파일 이름 (텔레그램 메시지 표시용)"""
+    return f"{SCRIPT_FILENAME}_{datetime.date.today().strftime('%Y%m')}.md"
+
+
+def save_to_markdown(summary):
+    """리포트를 기록 스레드에 넘김 (Markdown 렌더링/파일 기록/월 교체는 report_upbit). 반환: -15% 이하 종목 수"""
+    get_report_writer().submit(summary, render_markdown)
+    return len(summary['fall_below_15'])
+
+
+def render_markdown(summary, at):
+    """리포트 1건 Markdown (기록 스레드에서 호출)"""
+    now = datetime.datetime.fromtimestamp(at).strftime("%Y-%m-%d %H:%M:%S")
 
     lines = []
     lines.append(f"\n# 📈 업비트 원화시장 상승/하락 통계 ({now})\n")
@@ -417,21 +300,45 @@ def save_to_markdown(LOGFILE, summary):
     else:
         lines.append("- 없음")
 
-    with open(LOGFILE, "a", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-        f.write("\n\n---\n\n")
+    if summary.get('breadth'):
+        lines.extend(format_breadth_markdown(summary['breadth']))
 
-    print(f"[{now}] Markdown 파일 저장 완료 → {LOGFILE}")
-    return len(summary['fall_below_15'])
+    if summary.get('composite') is not None:
+        lines.extend(format_composite_markdown(summary['composite']))
+
+    if summary.get('ma'):
+        from screener_upbit import format_ma_markdown
+        lines.extend(format_ma_markdown(summary['ma']))
+
+    return "\n".join(lines)
 
 def main():
     now_start = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    send_telegram_message(
-        f"🟢 [upbitMA] 업비트 원화시장 감시 스크립트 시작\n({now_start})"
-    )
-    print(f"[시작] 텔레그램 알림 전송 완료 → {now_start}")
+    monitor.configure("종목별 감시", "upbitMA")
+    monitor.warm_start()
+    monitor.start_command_listener()
+    monitor.add_market_hook(notify_market_event)
+    # 시작 알림은 첫 감시 주기를 막지 않도록 백그라운드 전송
+    threading.Thread(
+        target=send_telegram_message,
+        args=(f"🟢 [upbitMA] 업비트 원화시장 감시 스크립트 시작\n({now_start})",),
+        daemon=True,
+    ).start()
+    print(f"[시작] 텔레그램 알림 전송 → {now_start}")
+
+    exited = []
 
     def on_exit():
+        if exited:
+            return
+        exited.append(True)
+        monitor.save_cache_snapshot()
+        monitor.close_rule_evaluator()
+        monitor.close_snapshot_bus()
+        monitor.close_query_server()
+        monitor.close_candle_feed()
+        monitor.close_command_listener()
+        close_report_writer()
         t = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         send_telegram_message(f"🔴 [upbitMA] 스크립트 종료\n({t})")
 
@@ -441,6 +348,8 @@ def main():
 
     last_daily_report_date = None  # 매일 8:30 리포트 중복 방지
     last_full_analysis_time = None  # 전체 종목 분석 마지막 실행 시각
+    last_ma = None  # 마지막 이동평균 스크리너 결과 (8:30 리포트용)
+    last_summary = None  # 마지막 전체 종목 분석 (등락 분포 표본이 없을 때 8:30 리포트용)
     first_list_status_telegram_sent = False  # 종목별 감시 현황은 첫 실행 시 1회만 텔레그램 전송
 
     while True:
@@ -449,6 +358,30 @@ def main():
             hour, minute = now.hour, now.minute
             today = now.date()
 
+            # === ③ 종목별 주가 감시 (1분 단위, 감시가 도달 시에만 텔레그램) ===
+            # 첫 주기 평가가 전체 종목 분석(시세/일봉 조회)을 기다리지 않도록 먼저 실행
+            try:
+                run_list_monitoring()
+            except Exception as e_list:
+                print(f"[종목별 감시 오류] {e_list}")
+            # === ① 등락 분포 집계 (매 주기), -15% 이하 15개 이상 시 텔레그램 경고 ===
+            try:
+                update_breadth()
+            except Exception as e_breadth:
+                print(f"[등락 분포 집계 오류] {e_breadth}")
+            try:
+                update_composite()
+            except Exception as e_composite:
+                print(f"[종합지수 갱신 오류] {e_composite}")
+            try:
+                monitor.publish_snapshot_bus()
+            except Exception as e_bus:
+                print(f"[스냅샷 게시 오류] {e_bus}")
+            try:
+                monitor.publish_query_state()
+            except Exception as e_query:
+                print(f"[조회 API 오류] {e_query}")
+
             # 전체 종목 분석은 ALL_MA_INTERVAL(기본 1시간)마다만 실행
             do_full_analysis = (
                 last_full_analysis_time is None
@@ -457,39 +390,21 @@ def main():
 
             if do_full_analysis:
                 # === 데이터 수집 및 분석 (1시간 단위) ===
-                markets = get_upbit_markets()
+                _, markets = get_cached_market_data()
                 change_data = get_ticker_info(markets)
                 summary = analyze(change_data)
-                fall_count = save_to_markdown(LOG_DIR_FILENAME, summary)
+                summary['ma'] = run_ma_screener(change_data)
+                # 지난 분석 이후 구간별 등락 분포 (-15% 경고는 update_breadth에서 매 주기 판정)
+                # 기록 스레드에서 렌더링하므로 감시 루프가 계속 고치는 값은 복사본으로 넘김
+                summary['breadth'] = [copy.deepcopy(b) for b in _breadth.intervals(
+                    since=last_full_analysis_time.timestamp() if last_full_analysis_time else None
+                )]
+                composite = monitor.get_composite()
+                summary['composite'] = composite.view() if composite is not None else None
+                save_to_markdown(summary)
                 last_full_analysis_time = now
-
-                # === ① 이벤트: -15% 이하 하락 15개 이상 시에만 텔레그램 전송 ===
-                if fall_count >= 15:
-                    msg = (
-                        f"📉 경고: -15% 이하 하락 종목이 {fall_count}개 이상 발생!\n"
-                        f"({now.strftime('%Y-%m-%d %H:%M')})\n"
-                        f"전체 종목: {summary['total']}개\n"
-                        f"상승: +5%↑ {summary['rise_5']}개 (+10%↑ {summary['rise_10']}개 | +15%↑ {summary['rise_15']}개)\n"
-                        f"보합(-5%~+5%): {summary['neutral']}개\n"
-                        f"하락: -5%↓ {summary['fall_5']}개 (-10%↓ {summary['fall_10']}개 | -15%↓ {summary['fall_15']}개)\n"
-                        f"파일: {os.path.basename(LOG_DIR_FILENAME)}"
-                    )
-                    send_telegram_message(msg)
-
-                # === ② 매일 8:30 정리 리포트 (해당일 1회만 텔레그램 전송) ===
-                is_after_830 = (hour > 8) or (hour == 8 and minute >= 30)
-                if is_after_830 and last_daily_report_date != today:
-                    msg_summary = (
-                        f"📊 업비트 원화시장 요약 리포트 ({now.strftime('%Y-%m-%d %H:%M')})\n"
-                        f"전체 종목: {summary['total']}개\n"
-                        f"상승: +5%↑ {summary['rise_5']}개 (+10%↑ {summary['rise_10']}개 | +15%↑ {summary['rise_15']}개)\n"
-                        f"보합(-5%~+5%): {summary['neutral']}개\n"
-                        f"하락: -5%↓ {summary['fall_5']}개 (-10%↓ {summary['fall_10']}개 | -15%↓ {summary['fall_15']}개)\n"
-                        f"파일: {os.path.basename(LOG_DIR_FILENAME)}"
-                    )
-                    send_telegram_message(msg_summary)
-                    last_daily_report_date = today
-                    print(f"[로그] 매일 8:30 정리 리포트 전송 완료 ({now.strftime('%Y-%m-%d %H:%M')})")
+                last_ma = summary['ma']
+                last_summary = summary
 
                 # === 종목별 감시현황: 첫 실행 시 1회 텔레그램 전송, 이후는 로그만 ===
                 try:
@@ -507,21 +422,33 @@ def main():
                 except Exception as e_status:
                     print(f"[종목별 감시현황 오류] {e_status}")
 
-            # === ③ 종목별 주가 감시 (1분 단위, 감시가 도달 시에만 텔레그램) ===
-            try:
-                run_list_monitoring()
-            except Exception as e_list:
-                print(f"[종목별 감시 오류] {e_list}")
+            # === ② 매일 8:30 정리 리포트 (해당일 1회만 텔레그램 전송) ===
+            # 마지막 시간 단위 표본이 아니라 지난 24시간 주기별 등락 분포 집계 기준 (마지막 값 + 기간 최대)
+            # 집계 표본이 없으면 마지막 전체 종목 분석으로 전송
+            is_after_830 = (hour > 8) or (hour == 8 and minute >= 30)
+            if is_after_830 and last_daily_report_date != today:
+                from screener_upbit import format_ma_summary
+                window = _breadth.window()
+                msg_summary = (
+                    f"📊 업비트 원화시장 요약 리포트 ({now.strftime('%Y-%m-%d %H:%M')})\n"
+                    f"{format_breadth_headline(window, last_summary)}\n"
+                    f"{format_breadth_summary(window)}\n"
+                    + (f"{format_composite_summary(monitor.get_composite())}\n" if monitor.get_composite() is not None else "")
+                    + (f"{format_ma_summary(last_ma)}\n" if last_ma else "")
+                    + f"파일: {report_file_name()}"
+                )
+                send_telegram_message(msg_summary)
+                last_daily_report_date = today
+                print(f"[로그] 매일 8:30 정리 리포트 전송 완료 ({now.strftime('%Y-%m-%d %H:%M')})")
 
         except Exception as e:
             print(f"[오류 발생] {e}")
 
         now = datetime.datetime.now()
-        next_run = now + datetime.timedelta(seconds=LIST_MA_INTERVAL)
-        watching = max(0, _last_active_list_count - len(_list_alert_sent))
-        excluded = len(_list_alert_sent)
-        print(f"[{now.strftime('%H:%M:%S')}] ⏳ {LIST_MA_INTERVAL}초 대기 중... 다음 {next_run.strftime('%H:%M:%S')} | 감시중 {watching}건 | 제외 {excluded}건")
-        time.sleep(LIST_MA_INTERVAL)
+        next_run = now + datetime.timedelta(seconds=monitor.LIST_MA_INTERVAL)
+        watching, excluded = monitor.get_watch_counts()
+        print(f"[{now.strftime('%H:%M:%S')}] ⏳ {monitor.LIST_MA_INTERVAL}초 대기 중... 다음 {next_run.strftime('%H:%M:%S')} | 감시중 {watching}건 | 제외 {excluded}건")
+        wait_next_cycle(monitor.LIST_MA_INTERVAL)
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,10 @@
 # upbitMA_market.py - 업비트 원화시장 전체 종목 분석 전용
 # created : 2026-02-03 (upbitMA 분리)
 # 수정: .env ALL_MA_INTERVAL 사용
+# 수정: 이동평균 교차 스크리너 (screener_upbit, numpy 지연 import)
+# 수정: 마켓 레지스트리: 신규 상장/상장 폐지/유의종목 변경 즉시 알림
+# 수정: 8:30 리포트에 지난 24시간 등락 분포 흐름 (breadth_upbit)
+# 수정: 리포트 기록 스레드: 현재 월 기준 파일 교체, 지난 달 gzip, JSONL 병행 (report_upbit)
 
 import os
 import sys
@@ -8,6 +12,7 @@ import time
 import datetime
 import atexit
 import signal
+import threading
 
 if sys.platform == "win32":
     try:
@@ -17,18 +22,39 @@ if sys.platform == "win32":
 
 from dotenv import load_dotenv
 
-from utils_upbit import send_telegram_message, get_upbit_markets, get_ticker_info
+from utils_upbit import send_telegram_message, get_upbit_markets_all, get_ticker_info
+from registry_upbit import MarketRegistry, format_market_event
+from warmstart_upbit import load_warm_cache, save_warm_cache
+from breadth_upbit import BreadthAggregator, BANDS, format_breadth_summary
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
 
 ALL_MA_INTERVAL = int(os.getenv("ALL_MA_INTERVAL", "3600").strip() or "3600")
+REPORT_KEEP_MONTHS = int(os.getenv("REPORT_KEEP_MONTHS", "0").strip() or "0")  # 압축 리포트 보관 개월 (0=전부 보관)
 if not os.getenv("TELEGRAM_BOT_TOKEN", "").strip() or not os.getenv("TELEGRAM_CHAT_ID", "").strip():
     raise ValueError("TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID가 .env에 필요합니다.")
 
 TODAY_MONTH = datetime.date.today().strftime("%Y%m")
 SCRIPT_FILENAME = "upbitMA_market"
-LOG_DIR_FILENAME = os.path.join(SCRIPT_DIR, f"{SCRIPT_FILENAME}_{TODAY_MONTH}.md")
+LOG_DIR_FILENAME = os.path.join(SCRIPT_DIR, f"{SCRIPT_FILENAME}_{TODAY_MONTH}.md")  # 시작 시점 파일 (기록 위치는 이 디렉터리)
+_report_writer = None  # 리포트 기록 스레드 (report_upbit.ReportWriter, 첫 리포트 때 시작)
+
+# 마켓 목록: 이전 응답과 diff 해 변경분만 반영 (재시작 시 웜스타트 캐시를 기준으로 비교)
+_market_registry = MarketRegistry()
+
+# 이동평균 스크리너: 종목 × 일자 종가 행렬 (하루 1열씩 추가, 첫 사용 시 생성)
+_ma_screener = None
+
+# 등락 분포 집계 (분석 주기마다 표본 1개, 24시간 보관). 분 단위 집계는 upbitMA.py
+_breadth = BreadthAggregator()
+
+
+def notify_market_event(event):
+    """마켓 레지스트리 이벤트(신규 상장/상장 폐지/유의종목) 즉시 텔레그램 알림"""
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    send_telegram_message(f"{format_market_event(event)}\n({now})")
+    print(f"[마켓 변경] {format_market_event(event)}")
 
 
 def analyze(change_data):
@@ -69,9 +95,53 @@ def analyze(change_data):
     return summary
 
 
-def save_to_markdown(LOGFILE, summary):
-    """결과를 Markdown 파일에 추가"""
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def run_ma_screener(change_data):
+    """이동평균 스크리너 갱신 + 전종목 교차/이격도 계산. 실패 시 None (통계 리포트는 계속)"""
+    global _ma_screener
+    try:
+        if _ma_screener is None:
+            from screener_upbit import MAScreener
+            _ma_screener = MAScreener()
+        if not _ma_screener.update(change_data):
+            return None  # 일봉 행렬 구성 중 (백그라운드)
+        return _ma_screener.evaluate(change_data)
+    except Exception as e:
+        print(f"[MA 스크리너 오류] {e}")
+        return None
+
+
+def get_report_writer():
+    """리포트 기록 스레드 (최초 호출 시 시작). LOG_DIR_FILENAME 디렉터리에 현재 월 파일로 기록"""
+    global _report_writer
+    if _report_writer is None:
+        from report_upbit import ReportWriter
+
+        _report_writer = ReportWriter(os.path.dirname(LOG_DIR_FILENAME), SCRIPT_FILENAME, REPORT_KEEP_MONTHS)
+    return _report_writer
+
+
+def close_report_writer():
+    """대기 중인 리포트 기록 후 종료"""
+    global _report_writer
+    if _report_writer is not None:
+        _report_writer.close()
+        _report_writer = None
+
+
+def report_file_name():
+    """현재 월 리포트 파일 이름 (텔레그램 메시지 표시용)"""
+    return f"{SCRIPT_FILENAME}_{datetime.date.today().strftime('%Y%m')}.md"
+
+
+def save_to_markdown(summary):
+    """리포트를 기록 스레드에 넘김 (Markdown 렌더링/파일 기록/월 교체는 report_upbit). 반환: -15% 이하 종목 수"""
+    get_report_writer().submit(summary, render_markdown)
+    return len(summary["fall_below_15"])
+
+
+def render_markdown(summary, at):
+    """리포트 1건 Markdown (기록 스레드에서 호출)"""
+    now = datetime.datetime.fromtimestamp(at).strftime("%Y-%m-%d %H:%M:%S")
 
     lines = []
     lines.append(f"\n# 📈 업비트 원화시장 상승/하락 통계 ({now})\n")
@@ -104,20 +174,35 @@ def save_to_markdown(LOGFILE, summary):
     else:
         lines.append("- 없음")
 
-    with open(LOGFILE, "a", encoding="utf-8") as f:
-        f.write("\n".join(lines))
-        f.write("\n\n---\n\n")
+    if summary.get("ma"):
+        from screener_upbit import format_ma_markdown
+        lines.extend(format_ma_markdown(summary["ma"]))
 
-    print(f"[{now}] Markdown 파일 저장 완료 → {LOGFILE}")
-    return len(summary["fall_below_15"])
+    return "\n".join(lines)
 
 
 def main():
     now_start = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    send_telegram_message(f"🟢 [upbitMA_market] 업비트 시장 분석 스크립트 시작\n({now_start})")
-    print(f"[시작] 텔레그램 알림 전송 완료 → {now_start}")
+    cache = load_warm_cache()
+    if cache:
+        _market_registry.load(cache["markets"])
+    _market_registry.add_hook(notify_market_event)
+    threading.Thread(
+        target=send_telegram_message,
+        args=(f"🟢 [upbitMA_market] 업비트 시장 분석 스크립트 시작\n({now_start})",),
+        daemon=True,
+    ).start()
+    print(f"[시작] 텔레그램 알림 전송 → {now_start}")
+
+    exited = []
 
     def on_exit():
+        if exited:
+            return
+        exited.append(True)
+        close_report_writer()
+        prev = load_warm_cache() or {}  # 시세 스냅샷은 리스트 감시 쪽 값을 유지
+        save_warm_cache(_market_registry.snapshot(), _market_registry.name_map, prev.get("tickers", {}))
         t = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         send_telegram_message(f"🔴 [upbitMA_market] 스크립트 종료\n({t})")
 
@@ -133,10 +218,13 @@ def main():
             hour, minute = now.hour, now.minute
             today = now.date()
 
-            markets = get_upbit_markets()
+            _market_registry.update(get_upbit_markets_all())
+            markets = _market_registry.krw_markets
             change_data = get_ticker_info(markets)
             summary = analyze(change_data)
-            fall_count = save_to_markdown(LOG_DIR_FILENAME, summary)
+            summary["ma"] = run_ma_screener(change_data)
+            _breadth.add({k: summary[k] for k in ("total",) + BANDS})
+            fall_count = save_to_markdown(summary)
 
             # ① -15% 이하 하락 15개 이상 시 텔레그램 전송
             if fall_count >= 15:
@@ -147,20 +235,23 @@ def main():
                     f"상승: +5%↑ {summary['rise_5']}개 (+10%↑ {summary['rise_10']}개 | +15%↑ {summary['rise_15']}개)\n"
                     f"보합(-5%~+5%): {summary['neutral']}개\n"
                     f"하락: -5%↓ {summary['fall_5']}개 (-10%↓ {summary['fall_10']}개 | -15%↓ {summary['fall_15']}개)\n"
-                    f"파일: {os.path.basename(LOG_DIR_FILENAME)}"
+                    f"파일: {report_file_name()}"
                 )
                 send_telegram_message(msg)
 
             # ② 매일 8:30 정리 리포트
             is_after_830 = (hour > 8) or (hour == 8 and minute >= 30)
             if is_after_830 and last_daily_report_date != today:
+                from screener_upbit import format_ma_summary
                 msg_summary = (
                     f"📊 업비트 원화시장 요약 리포트 ({now.strftime('%Y-%m-%d %H:%M')})\n"
                     f"전체 종목: {summary['total']}개\n"
                     f"상승: +5%↑ {summary['rise_5']}개 (+10%↑ {summary['rise_10']}개 | +15%↑ {summary['rise_15']}개)\n"
                     f"보합(-5%~+5%): {summary['neutral']}개\n"
                     f"하락: -5%↓ {summary['fall_5']}개 (-10%↓ {summary['fall_10']}개 | -15%↓ {summary['fall_15']}개)\n"
-                    f"파일: {os.path.basename(LOG_DIR_FILENAME)}"
+                    + f"{format_breadth_summary(_breadth.window())}\n"
+                    + (f"{format_ma_summary(summary['ma'])}\n" if summary["ma"] else "")
+                    + f"파일: {report_file_name()}"
                 )
                 send_telegram_message(msg_summary)
                 last_daily_report_date = today
@@ -0,0 +1,507 @@
+# upbitMA_soak.py - 장기 실행(soak) 점검: 가짜 업비트/텔레그램 서버 + 가속 시계
+# created : 2026-10-19
+# 실제 엔트리(upbitMA / upbitMA_list / upbitMA_market)의 main()을 자식 프로세스에서 실행하고,
+# time.sleep/시각을 가상 시계로 바꿔 며칠 분량을 몇 분 안에 돌린다.
+# 가상 1시간마다 RSS, tracemalloc, 열린 파일 수, 주기별 처리시간을 기록하고
+# 워밍업 이후 증가량이 기준을 넘으면 종료코드 1.
+#
+# 사용: python upbitMA_soak.py [--entry upbitMA] [--days 3] [--markets 200] [--rules 300]
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import threading
+import subprocess
+import importlib
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 실패 기준 (워밍업 이후 증가량)
+MAX_RSS_GROWTH_MB = 64
+MAX_TRACED_GROWTH_MB = 16
+MAX_FD_GROWTH = 8
+MAX_CYCLE_SECONDS = 5.0  # 한 주기 실제 처리시간 상한 (가짜 서버 기준)
+
+_SAMPLE_PREFIX = "[SOAK] "
+
+
+# ---------------------------------------------------------------------------
+# 가짜 업비트 / 텔레그램 서버
+# ---------------------------------------------------------------------------
+class FakeMarket:
+    """시세 경로 생성: 종목별 로그 랜덤워크 + 가끔 급등락. /v1/ticker 전종목 조회 1회 = 1스텝."""
+
+    def __init__(self, n_markets, seed=7, start_date=None, steps_per_day=1440):
+        self.rng = random.Random(seed)
+        self.start_date = start_date or datetime.datetime.now(datetime.timezone.utc).date()
+        self.steps_per_day = steps_per_day
+        self.step_no = 0
+        self.lock = threading.Lock()
+        self.markets = {}
+        for i in range(n_markets):
+            self._list_market(i)
+        self.next_id = n_markets
+        self.telegram_sent = 0
+        self.requests = 0
+
+    def _list_market(self, i):
+        # 0.001원 ~ 1억원대까지 고르게 (원 미만 코인 포함)
+        price = 10 ** self.rng.uniform(-3, 8)
+        self.markets[f"KRW-C{i:04d}"] = {
+            "korean_name": f"코인{i:04d}",
+            "english_name": f"Coin{i:04d}",
+            "price": price,
+            "prev_close": price,
+            "acc_volume": 0.0,
+            "sigma": self.rng.uniform(0.001, 0.01),
+            "warning": "NONE",
+        }
+
+    def step(self):
+        with self.lock:
+            self.step_no += 1
+            day_roll = self.step_no % self.steps_per_day == 0
+            for m in self.markets.values():
+                r = self.rng.gauss(0, m["sigma"])
+                if self.rng.random() < 0.001:
+                    r += self.rng.choice((-1, 1)) * self.rng.uniform(0.05, 0.2)
+                m["price"] = max(m["price"] * math.exp(r), 1e-8)
+                m["acc_volume"] += self.rng.lognormvariate(0, 1)
+                if day_roll:
+                    m["prev_close"] = m["price"]
+                    m["acc_volume"] = 0.0
+            # 상장/폐지/유의종목 이벤트도 가끔 발생
+            if self.step_no % 500 == 0:
+                self._list_market(self.next_id)
+                self.next_id += 1
+            if self.step_no % 1700 == 0 and len(self.markets) > 10:
+                self.markets.pop(next(iter(self.markets)))
+            if self.step_no % 900 == 0:
+                m = self.rng.choice(list(self.markets.values()))
+                m["warning"] = "NONE" if m["warning"] == "CAUTION" else "CAUTION"
+
+    def market_all(self):
+        with self.lock:
+            return [
+                {
+                    "market": k,
+                    "korean_name": m["korean_name"],
+                    "english_name": m["english_name"],
+                    "market_warning": m["warning"],
+                }
+                for k, m in self.markets.items()
+            ]
+
+    def ticker(self, markets):
+        with self.lock:
+            return [
+                {
+                    "market": k,
+                    "trade_price": self.markets[k]["price"],
+                    "prev_closing_price": self.markets[k]["prev_close"],
+                    "acc_trade_volume": self.markets[k]["acc_volume"],
+                    "acc_trade_price_24h": self.markets[k]["acc_volume"] * self.markets[k]["price"],
+                }
+                for k in markets
+                if k in self.markets
+            ]
+
+    def day_candles(self, market, count):
+        with self.lock:
+            m = self.markets.get(market)
+            if m is None:
+                return []
+            price, out = m["price"], []
+            rng = random.Random(hash(market) & 0xFFFF)
+            for k in range(count):
+                d = self.start_date - datetime.timedelta(days=k)
+                out.append({"candle_date_time_utc": f"{d.isoformat()}T00:00:00", "trade_price": price})
+                price *= math.exp(rng.gauss(0, m["sigma"] * 5))
+            return out
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, data, status=200):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            fake.requests += 1
+            url = urlparse(self.path)
+            q = parse_qs(url.query)
+            if url.path == "/v1/market/all":
+                return self._json(fake.market_all())
+            if url.path == "/v1/ticker":
+                markets = q.get("markets", [""])[0].split(",")
+                if len(markets) > 1:
+                    fake.step()
+                return self._json(fake.ticker(markets))
+            if url.path == "/v1/candles/days":
+                count = int(q.get("count", ["200"])[0])
+                return self._json(fake.day_candles(q.get("market", [""])[0], count))
+            if url.path.endswith("/getUpdates"):
+                return self._json({"ok": True, "result": []})
+            return self._json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            fake.requests += 1
+            length = int(self.headers.get("Content-Length", 0) or 0)
+            self.rfile.read(length)
+            if url_is_send(self.path):
+                fake.telegram_sent += 1
+                return self._json({"ok": True, "result": {}})
+            return self._json({"ok": False}, 404)
+
+    return Handler
+
+
+def url_is_send(path):
+    return urlparse(path).path.endswith("/sendMessage")
+
+
+def start_fake_server(fake):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(fake))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_rule_list(path, markets, n_rules, seed=11):
+    """가짜 시세 기준으로 감시 규칙 엑셀 생성 (조건 종류 골고루)"""
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["감시중", "종목명", "감시사유", "감시가격", "감시조건", "일자", "기준가격", "비율", "수정일", "비고", "재감시(%)", "대기(분)"])
+    names = list(markets.items())
+    for i in range(n_rules):
+        mkt, m = rng.choice(names)
+        kind = rng.choice(("이상", "이하", "트레일링", "기준대비", "거래량급증"))
+        price = m["price"]
+        watch = ref = ratio = None
+        if kind == "이상":
+            watch = round(price * rng.uniform(1.01, 1.2), 8)
+        elif kind == "이하":
+            watch = round(price * rng.uniform(0.8, 0.99), 8)
+        elif kind == "트레일링":
+            ratio = rng.choice((3, 5, 10))
+        elif kind == "기준대비":
+            ref, ratio = round(price, 8), rng.choice((-10, -5, 5, 10))
+        else:
+            ratio = rng.choice((3, 5))
+        rearm = rng.choice((None, 1, 2))
+        ws.append(["O", m["korean_name"], f"soak{i}", watch, kind, None, ref, ratio, None, None, rearm, 5 if rearm else None])
+    tmp = path + ".tmp"
+    wb.save(tmp)
+    os.replace(tmp, path)  # 감시 중 읽는 쪽이 쓰다 만 파일을 보지 않도록
+
+
+# ---------------------------------------------------------------------------
+# 자식 프로세스: 가상 시계 + 측정
+# ---------------------------------------------------------------------------
+class _SoakDone(BaseException):
+    pass
+
+
+class VirtualClock:
+    """time.sleep → 가상 시간만 전진 (speed > 0 이면 실제로 1/speed 만큼 대기)"""
+
+    def __init__(self, start, duration, sample_every, speed=0.0):
+        self.t = start
+        self.start = start
+        self.duration = duration
+        self.sample_every = sample_every
+        self.speed = speed
+        self.next_sample = start
+        self.last_wake = time.perf_counter()
+        self.latencies = []
+        self.samples = 0
+        self.baseline = None
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self.t
+
+    def sleep(self, seconds):
+        busy = time.perf_counter() - self.last_wake
+        if threading.current_thread() is threading.main_thread():
+            self.latencies.append(busy)
+        if self.speed > 0:
+            time.sleep(seconds / self.speed)
+        with self._lock:
+            self.t += max(0.0, seconds)
+        if threading.current_thread() is threading.main_thread():
+            if self.t - self.start >= self.duration:
+                self._sample(final=True)
+                raise _SoakDone()
+            if self.t >= self.next_sample:
+                self._sample(final=False)
+                self.next_sample += self.sample_every
+            self.last_wake = time.perf_counter()
+
+    def _sample(self, final):
+        import tracemalloc
+
+        lat = sorted(self.latencies) or [0.0]
+        current, peak = tracemalloc.get_traced_memory()
+        snap = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"))
+        )
+        sample = {
+            "sim_hours": round((self.t - self.start) / 3600, 2),
+            "rss_mb": round(_rss_mb(), 2),
+            "traced_mb": round(current / 1e6, 2),
+            "fds": _fd_count(),
+            "threads": threading.active_count(),
+            "cycles": len(self.latencies),
+            "p50_s": round(lat[len(lat) // 2], 4),
+            "p99_s": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))], 4),
+            "max_s": round(lat[-1], 4),
+        }
+        self.samples += 1
+        if self.samples == 2:
+            self.baseline = snap  # 첫 구간(워밍업) 이후 기준
+        if final:
+            ref = self.baseline or snap
+            sample["top_growth"] = [str(s) for s in snap.compare_to(ref, "lineno")[:8]]
+            sample["top_alloc"] = [str(s) for s in snap.statistics("lineno")[:8]]
+        self.latencies = []
+        print(_SAMPLE_PREFIX + json.dumps(sample, ensure_ascii=False), flush=True)
+
+
+def _rss_mb():
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss / 1e6
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def _fd_count():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        try:
+            import psutil
+
+            p = psutil.Process()
+            return p.num_fds() if hasattr(p, "num_fds") else p.num_handles()
+        except ImportError:
+            return -1
+
+
+class _TimeShim:
+    """time 모듈 대체: time()/sleep()만 가상 시계, 나머지는 그대로"""
+
+    def __init__(self, clock):
+        self._clock = clock
+
+    def time(self):
+        return self._clock.time()
+
+    def sleep(self, seconds):
+        self._clock.sleep(seconds)
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def _datetime_shim(clock):
+    _timedelta, _timezone = datetime.timedelta, datetime.timezone
+
+    class _DateTime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.datetime.fromtimestamp(clock.time(), tz)
+
+        @classmethod
+        def today(cls):
+            return cls.now()
+
+    class _Date(datetime.date):
+        @classmethod
+        def today(cls):
+            return datetime.datetime.fromtimestamp(clock.time()).date()
+
+    class _Module:
+        datetime = _DateTime
+        date = _Date
+        timedelta = _timedelta
+        timezone = _timezone
+
+    return _Module
+
+
+def run_child(entry, sim_seconds, sample_every, speed):
+    import tracemalloc
+
+    tracemalloc.start(1)
+    clock = VirtualClock(time.time(), sim_seconds, sample_every, speed)
+    mod = importlib.import_module(entry)
+    state_dir = os.environ["STATE_DIR"]
+    if hasattr(mod, "LOG_DIR_FILENAME"):
+        mod.LOG_DIR_FILENAME = os.path.join(state_dir, os.path.basename(mod.LOG_DIR_FILENAME))
+    time_shim, dt_shim = _TimeShim(clock), _datetime_shim(clock)
+
+    def install():
+        # 저장소 모듈 전체의 time/datetime 참조를 가상 시계로 교체 (지연 import 모듈 포함)
+        for m in list(sys.modules.values()):
+            f = getattr(m, "__file__", None) or ""
+            if os.path.dirname(os.path.abspath(f)) != SCRIPT_DIR or m is sys.modules[__name__]:
+                continue
+            if getattr(m, "time", None) is time:
+                m.time = time_shim
+            if getattr(m, "datetime", None) is datetime:
+                m.datetime = dt_shim
+
+    install()
+    orig_sleep = clock.sleep
+
+    def sleep_and_install(seconds):
+        install()
+        orig_sleep(seconds)
+
+    clock.sleep = sleep_and_install
+    try:
+        mod.main()
+    except _SoakDone:
+        pass
+    sys.exit(0)
+
+
+# ---------------------------------------------------------------------------
+# 부모: 서버 실행 + 자식 감시 + 판정
+# ---------------------------------------------------------------------------
+def run_soak(entry="upbitMA", days=3.0, n_markets=200, n_rules=300, sample_hours=1.0, speed=0.0, keep=False):
+    fake = FakeMarket(n_markets)
+    server = start_fake_server(fake)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    work_dir = tempfile.mkdtemp(prefix="upbitMA_soak_")
+    list_path = os.path.join(work_dir, "soak.list.xlsx")
+    try:
+        write_rule_list(list_path, fake.markets, n_rules)
+    except ImportError:
+        print("[soak] openpyxl 미설치: 감시 규칙 없이 실행")
+        list_path = ""
+    env = dict(os.environ)
+    env.update({
+        "UPBIT_API_URL": base_url,
+        "TELEGRAM_API_URL": base_url,
+        "TELEGRAM_BOT_TOKEN": "soak",
+        "TELEGRAM_CHAT_ID": "1",
+        "LIST_FILE": list_path,
+        "STATE_DIR": work_dir,
+        "PYTHONUNBUFFERED": "1",
+    })
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--child", entry,
+        "--sim-seconds", str(days * 86400), "--sample-seconds", str(sample_hours * 3600), "--speed", str(speed),
+    ]
+    log_path = os.path.join(work_dir, "child.log")
+    samples = []
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen(cmd, cwd=work_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8")
+        last_rewrite = time.perf_counter()
+        for line in proc.stdout:
+            if line.startswith(_SAMPLE_PREFIX):
+                s = json.loads(line[len(_SAMPLE_PREFIX):])
+                samples.append(s)
+                print(
+                    f"[soak] {s['sim_hours']:>7.1f}h | RSS {s['rss_mb']:>7.1f}MB | traced {s['traced_mb']:>6.2f}MB | "
+                    f"fd {s['fds']:>3} | thr {s['threads']:>2} | 주기 {s['cycles']:>4} | p99 {s['p99_s']:.3f}s"
+                )
+            else:
+                log.write(line)
+            # 실행 중 감시 규칙 파일 수정 (재로드 경로 점검)
+            if list_path and time.perf_counter() - last_rewrite > 20:
+                write_rule_list(list_path, fake.markets, n_rules, seed=int(time.time()))
+                last_rewrite = time.perf_counter()
+        proc.wait()
+    server.shutdown()
+    elapsed = time.perf_counter() - started
+    ok, problems = evaluate_samples(samples, proc.returncode)
+    print(f"[soak] 실제 {elapsed:.0f}초 / 가상 {days}일 | 업비트·텔레그램 요청 {fake.requests}건 (텔레그램 {fake.telegram_sent}건)")
+    if samples and samples[-1].get("top_growth"):
+        print("[soak] 워밍업 이후 할당 증가 상위:")
+        for s in samples[-1]["top_growth"]:
+            print(f"    {s}")
+    for p in problems:
+        print(f"[soak 실패] {p}")
+    print(f"[soak] {'통과' if ok else '실패'} (로그: {log_path})")
+    if ok and not keep:
+        import shutil
+
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return ok
+
+
+def evaluate_samples(samples, returncode):
+    """워밍업(첫 샘플 구간) 이후 증가량 판정 → (통과 여부, 문제 목록)"""
+    problems = []
+    if returncode != 0:
+        problems.append(f"자식 프로세스 종료코드 {returncode}")
+    if len(samples) < 3:
+        problems.append(f"샘플 부족 ({len(samples)}개)")
+        return False, problems
+    base = samples[max(1, len(samples) // 10)]
+    last = samples[-1]
+    if last["rss_mb"] - base["rss_mb"] > MAX_RSS_GROWTH_MB:
+        problems.append(f"RSS 증가 {last['rss_mb'] - base['rss_mb']:.1f}MB > {MAX_RSS_GROWTH_MB}MB")
+    if last["traced_mb"] - base["traced_mb"] > MAX_TRACED_GROWTH_MB:
+        problems.append(f"Python 할당 증가 {last['traced_mb'] - base['traced_mb']:.1f}MB > {MAX_TRACED_GROWTH_MB}MB")
+    if last["fds"] - base["fds"] > MAX_FD_GROWTH:
+        problems.append(f"열린 파일 증가 {last['fds'] - base['fds']}개 > {MAX_FD_GROWTH}개")
+    worst = max(s["max_s"] for s in samples[1:])
+    if worst > MAX_CYCLE_SECONDS:
+        problems.append(f"주기 처리시간 최대 {worst:.2f}s > {MAX_CYCLE_SECONDS}s")
+    return not problems, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="upbitMA 장기 실행(soak) 점검")
+    parser.add_argument("--entry", default="upbitMA", choices=("upbitMA", "upbitMA_list", "upbitMA_market"))
+    parser.add_argument("--days", type=float, default=3.0, help="가상 실행 기간(일)")
+    parser.add_argument("--markets", type=int, default=200)
+    parser.add_argument("--rules", type=int, default=300)
+    parser.add_argument("--sample-hours", type=float, default=1.0)
+    parser.add_argument("--speed", type=float, default=0.0, help="가속 배율 (0 = 대기 없음)")
+    parser.add_argument("--keep", action="store_true", help="통과해도 작업 폴더 유지")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--sim-seconds", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--sample-seconds", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        sys.path.insert(0, SCRIPT_DIR)
+        run_child(args.child, args.sim_seconds, args.sample_seconds, args.speed)
+        return
+    ok = run_soak(args.entry, args.days, args.markets, args.rules, args.sample_hours, args.speed, args.keep)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
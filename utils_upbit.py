@@ -5,12 +5,16 @@ import os
 import requests
 
 from dotenv import load_dotenv
+from price_upbit import exact_price
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 load_dotenv(os.path.join(SCRIPT_DIR, ".env"))
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "").strip()
+# API 주소 (부하/장기 실행 테스트 시 로컬 가짜 서버로 교체: upbitMA_soak.py)
+UPBIT_API_URL = (os.getenv("UPBIT_API_URL", "").strip() or "https://api.upbit.com").rstrip("/")
+TELEGRAM_API_URL = (os.getenv("TELEGRAM_API_URL", "").strip() or "https://api.telegram.org").rstrip("/")
 
 
 def _ensure_telegram_config():
@@ -21,7 +25,7 @@ def _ensure_telegram_config():
 def send_telegram_message(message):
     """텔레그램 알림 전송"""
     _ensure_telegram_config()
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
     try:
         r = requests.post(url, data=payload, timeout=10)
@@ -33,14 +37,14 @@ def send_telegram_message(message):
 
 def get_upbit_markets():
     """업비트 원화시장 종목 목록 가져오기"""
-    url = "https://api.upbit.com/v1/market/all"
+    url = f"{UPBIT_API_URL}/v1/market/all"
     res = requests.get(url).json()
     return [m["market"] for m in res if m["market"].startswith("KRW-")]
 
 
 def get_upbit_markets_all():
     """업비트 마켓 전체 조회 (종목명→마켓코드 매핑용)"""
-    url = "https://api.upbit.com/v1/market/all"
+    url = f"{UPBIT_API_URL}/v1/market/all"
     resp = requests.get(url, params={"isDetails": "true"}, timeout=10)
     resp.raise_for_status()
     return resp.json()
@@ -48,30 +52,70 @@ def get_upbit_markets_all():
 
 def get_ticker_info(markets):
     """현재가, 전일가 기준으로 등락률 계산"""
-    url = "https://api.upbit.com/v1/ticker"
+    url = f"{UPBIT_API_URL}/v1/ticker"
     res = requests.get(url, params={"markets": ",".join(markets)}).json()
 
     result = []
     for r in res:
         change_rate = (r["trade_price"] - r["prev_closing_price"]) / r["prev_closing_price"] * 100
-        result.append({"market": r["market"], "change_rate": change_rate})
+        result.append({
+            "market": r["market"],
+            "change_rate": change_rate,
+            "trade_price": r["trade_price"],
+            "prev_closing_price": r["prev_closing_price"],
+        })
     return result
 
 
+def get_day_candles(market, count=200):
+    """일봉 조회 (최신순) → [{ date: 'YYYY-MM-DD'(UTC), close: 종가 }]"""
+    url = f"{UPBIT_API_URL}/v1/candles/days"
+    resp = requests.get(url, params={"market": market, "count": count}, timeout=10)
+    resp.raise_for_status()
+    return [
+        {"date": c["candle_date_time_utc"][:10], "close": c["trade_price"]}
+        for c in resp.json()
+    ]
+
+
 def get_all_ticker_prices(markets):
-    """전종목 시세 1회 API 호출로 조회 → { market: 현재가(int) } 반환"""
+    """전종목 시세 1회 API 호출로 조회 → { market: 현재가 } 반환 (정수면 int, 원 미만이면 float)"""
     if not markets:
         return {}
-    url = "https://api.upbit.com/v1/ticker"
+    url = f"{UPBIT_API_URL}/v1/ticker"
     try:
         resp = requests.get(url, params={"markets": ",".join(markets)}, timeout=15)
         if resp.status_code != 200:
             return {}
         data = resp.json()
         return {
-            r["market"]: int(float(r["trade_price"]))
+            r["market"]: exact_price(r["trade_price"])
             for r in data
             if r.get("trade_price") is not None
         }
     except Exception:
         return {}
+
+
+def get_ticker_snapshot(markets):
+    """전종목 시세 1회 API 호출 → { market: {price, prev_close, acc_volume, acc_trade_price_24h} }
+    acc_volume: UTC 0시 기준 누적 거래량 (주기별 거래량 계산용)"""
+    if not markets:
+        return {}
+    url = f"{UPBIT_API_URL}/v1/ticker"
+    try:
+        resp = requests.get(url, params={"markets": ",".join(markets)}, timeout=15)
+        if resp.status_code != 200:
+            return {}
+        return {
+            r["market"]: {
+                "price": float(r["trade_price"]),
+                "prev_close": r.get("prev_closing_price"),
+                "acc_volume": r.get("acc_trade_volume"),
+                "acc_trade_price_24h": r.get("acc_trade_price_24h"),
+            }
+            for r in resp.json()
+            if r.get("trade_price") is not None
+        }
+    except Exception:
+        return {}
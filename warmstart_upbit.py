@@ -0,0 +1,94 @@
+# warmstart_upbit.py - 빠른 재시작용 캐시 스냅샷 + import 시간 점검
+# created : 2026-10-19
+# 종료 시 마켓 목록/종목명 매핑/마지막 시세를 디스크에 저장하고, 시작 시 불러와
+# 첫 감시 주기를 API 응답 대기 없이 시작한다. (갱신은 백그라운드)
+#
+# import 점검: python warmstart_upbit.py --check-imports
+
+import os
+import sys
+import json
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DIR = os.getenv("STATE_DIR", "").strip() or SCRIPT_DIR  # 런타임 상태 파일 위치
+WARM_CACHE_PATH = os.path.join(STATE_DIR, "upbitMA_cache.json")
+
+# 엔트리 모듈 import 시점에 불러오면 안 되는 무거운 모듈 (필요한 함수 안에서 import)
+HEAVY_MODULES = ("numpy", "pandas", "pykrx", "exchange_calendars", "psutil", "openpyxl")
+ENTRY_MODULES = ("upbitMA", "upbitMA_list", "upbitMA_market")
+IMPORT_BUDGET_MS = 500  # 엔트리 모듈 import 허용 시간 (첫 평가 1초 이내 목표)
+
+
+def save_warm_cache(markets_raw, name_map, ticker_snapshot, path=WARM_CACHE_PATH):
+    """마켓 목록(원본)/종목명 매핑/마지막 시세 저장 (임시파일 → 교체로 원자적 기록)"""
+    if not markets_raw and not ticker_snapshot:
+        return
+    data = {
+        "saved_at": time.time(),
+        "markets": markets_raw or [],
+        "name_map": name_map or {},
+        "tickers": ticker_snapshot or {},
+    }
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"[캐시 저장 실패] {e}")
+
+
+def load_warm_cache(path=WARM_CACHE_PATH):
+    """저장된 캐시 로드. 없거나 손상 시 None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"[캐시 로드 실패] {e}")
+        return None
+    if not data.get("markets"):
+        return None
+    return data
+
+
+def check_import_budget(modules=ENTRY_MODULES, budget_ms=IMPORT_BUDGET_MS):
+    """엔트리 모듈별로 새 인터프리터에서 import 시간을 재고, 무거운 모듈이 끌려오는지 확인.
+    반환: 실패 메시지 목록 (빈 목록이면 통과)"""
+    import subprocess
+
+    env = dict(os.environ)
+    env.setdefault("TELEGRAM_BOT_TOKEN", "import-check")
+    env.setdefault("TELEGRAM_CHAT_ID", "import-check")
+    failures = []
+    for mod in modules:
+        code = (
+            "import sys, time; t = time.perf_counter(); "
+            f"import {mod}; ms = (time.perf_counter() - t) * 1000; "
+            f"print(ms); print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+        )
+        proc = subprocess.run(
+            [sys.executable, "-c", code], cwd=SCRIPT_DIR, env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            failures.append(f"{mod}: import 실패\n{proc.stderr.strip()[-500:]}")
+            continue
+        ms_line, heavy = proc.stdout.splitlines()[-2:]
+        ms = float(ms_line)
+        print(f"[import 점검] {mod}: {ms:.0f}ms" + (f" (무거운 모듈: {heavy})" if heavy else ""))
+        if heavy:
+            failures.append(f"{mod}: 무거운 모듈 즉시 import ({heavy})")
+        if ms > budget_ms:
+            failures.append(f"{mod}: import {ms:.0f}ms > 허용 {budget_ms}ms")
+    return failures
+
+
+if __name__ == "__main__":
+    if "--check-imports" in sys.argv:
+        problems = check_import_budget()
+        for p in problems:
+            print(f"[import 점검 실패] {p}")
+        sys.exit(1 if problems else 0)
+    print("사용법: python warmstart_upbit.py --check-imports")
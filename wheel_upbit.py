@@ -0,0 +1,97 @@
+# wheel_upbit.py - 계층형 타이밍 휠 (감시 규칙 시작/만료 예약)
+# created : 2026-10-19
+# 눈금(tick, 기본 60초) 단위로 4단계 × 64칸: 64분 / 68시간 / 182일 / 32년.
+# schedule/cancel은 O(1), advance(now)는 지나간 눈금 수 + 만기 항목 수만큼만 처리한다
+# (매 주기 전 규칙의 날짜를 확인하지 않음). 상위 단계 칸은 하위 단계가 한 바퀴 돌 때 아래로 내려 재배치.
+
+import math
+import time
+
+WHEEL_TICK = 60  # 눈금(초). 감시 주기보다 짧을 필요 없음
+WHEEL_BITS = 6  # 단계당 64칸
+WHEEL_LEVELS = 4
+
+
+class TimingWheel:
+    """key → 예약 시각. advance(now)는 시각이 지난 key 목록 반환 (key당 예약 1건, 다시 schedule하면 교체)"""
+
+    def __init__(self, tick=WHEEL_TICK, now=None):
+        self.tick = tick
+        self.size = 1 << WHEEL_BITS
+        self.mask = self.size - 1
+        self.slots = [[{} for _ in range(self.size)] for _ in range(WHEEL_LEVELS)]  # 칸: key → 만기 눈금
+        self.far = {}  # 최상위 단계 범위 밖 (32년 이후)
+        self.ready = {}  # 예약 시각이 이미 지난 항목 (다음 advance에서 반환)
+        self.where = {}  # key → 보관 중인 dict (취소/교체용)
+        self.current = int((time.time() if now is None else now) // tick)  # 처리한 마지막 눈금
+
+    def __len__(self):
+        return len(self.where)
+
+    def _place(self, key, due):
+        delta = due - self.current
+        if delta <= 0:
+            bucket = self.ready
+        else:
+            for level in range(WHEEL_LEVELS):
+                if delta < 1 << (WHEEL_BITS * (level + 1)):
+                    bucket = self.slots[level][(due >> (WHEEL_BITS * level)) & self.mask]
+                    break
+            else:
+                bucket = self.far
+        bucket[key] = due
+        self.where[key] = bucket
+
+    def schedule(self, key, ts):
+        """ts(초)에 만기. 눈금 올림이라 ts보다 일찍 반환되지 않음"""
+        self.cancel(key)
+        self._place(key, math.ceil(ts / self.tick))
+
+    def cancel(self, key):
+        bucket = self.where.pop(key, None)
+        if bucket is not None:
+            del bucket[key]
+
+    def _cascade(self, level):
+        """level 단계의 현재 칸을 비워 하위 단계로 재배치"""
+        bucket = self.slots[level][(self.current >> (WHEEL_BITS * level)) & self.mask]
+        if bucket:
+            items = list(bucket.items())
+            bucket.clear()
+            for key, due in items:
+                self._place(key, due)
+
+    def advance(self, now):
+        """now(초)까지 눈금 진행 → 만기 key 목록"""
+        target = int(now // self.tick)
+        due = list(self.ready)
+        for key in due:
+            del self.where[key]
+        self.ready.clear()
+        while self.current < target:
+            if not self.where:
+                self.current = target  # 예약 없음 → 건너뜀
+                break
+            self.current += 1
+            if not self.current & self.mask:
+                for level in range(1, WHEEL_LEVELS):
+                    self._cascade(level)
+                    if (self.current >> (WHEEL_BITS * level)) & self.mask:
+                        break
+                else:
+                    items = list(self.far.items())
+                    self.far.clear()
+                    for key, t in items:
+                        self._place(key, t)
+            bucket = self.slots[0][self.current & self.mask]
+            if bucket:
+                for key in bucket:
+                    del self.where[key]
+                due.extend(bucket)
+                bucket.clear()
+            if self.ready:  # 재배치 중 만기된 항목
+                for key in self.ready:
+                    del self.where[key]
+                due.extend(self.ready)
+                self.ready.clear()
+        return due